@@ -0,0 +1,247 @@
+"""
+Bulk import of a whole collection from one zip archive.
+
+The archive holds a manifest.json at its root, plus the pdfs and chapter files it points to:
+
+    {
+        "major_version": 1,
+        "minor_version": 1,
+        "localization": "en-US",
+        "release": true,
+        "workbooks": [
+            {"number": 1, "pdf": "pdfs/workbook-01.pdf", "chapters": "chapters/workbook-01.json"},
+            ...
+        ]
+    }
+
+Workbooks are checked, streamed to storage and hashed in parallel. The collection and its workbooks are then
+created in one transaction. If anything fails, nothing is created and the pdfs already stored are deleted.
+"""
+
+import hashlib
+import logging
+import os
+import posixpath
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.base import File
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from core import fastjson
+from core.manifests import publish_release
+from core.models import Workbook, delete_unreferenced_file
+from core.pdf import open_pdf
+from core.pipeline import schedule_processing
+from core.serializers import (
+    CollectionArchiveManifestSerializer,
+    CollectionCreateSerializer,
+)
+from core.validators import validate_chapters
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+
+MAX_MANIFEST_SIZE = 1024 * 1024
+MAX_CHAPTERS_SIZE = 10 * 1024 * 1024
+MAX_PDF_SIZE = 1024 * 1024 * 1024
+
+# Reading, inflating and hashing mostly release the GIL.
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+
+class HashingReader:
+    """
+    Wraps a file object, hashing everything read through it.
+    """
+
+    def __init__(self, file, size):
+        self.file = file
+        self.size = size
+        self.digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.digest.update(data)
+        return data
+
+
+def _member_errors(archive, name, max_size):
+    try:
+        info = archive.getinfo(name)
+    except KeyError:
+        return f"{name} is not in the archive."
+
+    if info.is_dir():
+        return f"{name} is a directory."
+    if info.file_size > max_size:
+        return f"{name} is larger than {max_size} bytes."
+
+    return None
+
+
+def read_manifest(archive):
+    error = _member_errors(archive, MANIFEST_NAME, MAX_MANIFEST_SIZE)
+    if error:
+        raise ValidationError({"archive": [error]})
+
+    try:
+        data = fastjson.loads(archive.read(MANIFEST_NAME))
+    except ValueError as e:
+        raise ValidationError({"archive": [f"{MANIFEST_NAME} is not valid JSON: {e}"]})
+
+    manifest_serializer = CollectionArchiveManifestSerializer(data=data)
+    if not manifest_serializer.is_valid():
+        raise ValidationError({"manifest": manifest_serializer.errors})
+
+    collection_serializer = CollectionCreateSerializer(data=data)
+    if not collection_serializer.is_valid():
+        raise ValidationError({"manifest": collection_serializer.errors})
+
+    return manifest_serializer.validated_data, collection_serializer
+
+
+def prepare_workbook(archive, entry, storage, pdf_field):
+    """
+    Checks one workbook of the archive and streams its pdf to storage.
+    Runs in a worker thread, does not touch the database.
+    Returns (result, errors), result holds the stored pdf name even when the pdf itself is invalid.
+    """
+    errors = {}
+    result = {"number": entry["number"], "pdf": None}
+
+    error = _member_errors(archive, entry["chapters"], MAX_CHAPTERS_SIZE)
+    if error:
+        errors["chapters"] = [error]
+    else:
+        try:
+            chapters = fastjson.loads(archive.read(entry["chapters"]))
+        except ValueError as e:
+            errors["chapters"] = [f"Not valid JSON: {e}"]
+        else:
+            validation = validate_chapters(chapters)
+            if validation.is_valid:
+                result["chapters"] = chapters
+                result["external_requires"] = validation.external_requires
+            else:
+                errors["chapters"] = validation.messages()
+
+    error = _member_errors(archive, entry["pdf"], MAX_PDF_SIZE)
+    if error:
+        errors["pdf"] = [error]
+        return result, errors
+
+    info = archive.getinfo(entry["pdf"])
+    with archive.open(info) as member:
+        reader = HashingReader(member, info.file_size)
+        name = pdf_field.generate_filename(None, posixpath.basename(entry["pdf"]))
+        result["pdf"] = storage.save(name, File(reader, name=name))
+
+    result["size"] = info.file_size
+    result["sha256"] = reader.digest.hexdigest()
+
+    try:
+        with storage.open(result["pdf"], "rb") as file:
+            result["pages"] = len(open_pdf(file).pages)
+    except Exception as e:
+        errors["pdf"] = [f"Not a readable pdf: {e}"]
+
+    return result, errors
+
+
+def import_collection_archive(file):
+    """
+    Creates (and optionally releases) a collection from an archive.
+    Raises ValidationError with every problem found, in which case nothing is created.
+    Returns (collection, [(workbook, sha256), ...]).
+    """
+    try:
+        archive = zipfile.ZipFile(file)
+    except zipfile.BadZipFile:
+        raise ValidationError({"archive": ["Not a zip archive."]})
+
+    with archive:
+        manifest, collection_serializer = read_manifest(archive)
+
+        pdf_field = Workbook._meta.get_field("pdf")
+        storage = pdf_field.storage
+
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            futures = [
+                executor.submit(prepare_workbook, archive, entry, storage, pdf_field)
+                for entry in manifest["workbooks"]
+            ]
+            outcomes = []
+            failure = None
+            for future in futures:
+                try:
+                    outcomes.append(future.result())
+                except Exception as e:
+                    failure = failure or e
+
+    stored = [result["pdf"] for result, _ in outcomes if result["pdf"]]
+
+    try:
+        if failure is not None:
+            raise failure
+
+        errors = {
+            str(result["number"]): workbook_errors
+            for result, workbook_errors in outcomes
+            if workbook_errors
+        }
+        if errors:
+            raise ValidationError({"workbooks": errors})
+
+        results = [result for result, _ in outcomes]
+
+        # The whole collection is in the archive, so this is where requires can be resolved.
+        known_ids = {
+            chapter["id"] for result in results for chapter in result["chapters"]
+        }
+        unknown_requires = (
+            set().union(*(result["external_requires"] for result in results))
+            - known_ids
+        )
+        if unknown_requires:
+            collection_data = collection_serializer.validated_data
+            logger.warning(
+                f"Archive for {collection_data['localization']} "
+                f"{collection_data['major_version']}.{collection_data['minor_version']} "
+                f"requires unknown chapters: {', '.join(sorted(unknown_requires))}"
+            )
+
+        with transaction.atomic():
+            collection = collection_serializer.save()
+
+            # Not bulk_create, the catalog signals (change log, cache) have to run.
+            workbooks = [
+                Workbook.objects.create(
+                    number=result["number"],
+                    collection=collection,
+                    chapters=result["chapters"],
+                    pdf=result["pdf"],
+                    sha256=result["sha256"],
+                )
+                for result in results
+            ]
+
+            if manifest["release"]:
+                collection.is_released = True
+                collection.save()
+                transaction.on_commit(lambda: publish_release(collection))
+
+            # Derived data (page hashes, search indexes) is only built for what was committed.
+            for workbook in workbooks:
+                schedule_processing(workbook)
+    except BaseException:
+        # Pdfs are content addressed, an identical pdf may already belong to another workbook.
+        for name in set(stored):
+            delete_unreferenced_file(name)
+        raise
+
+    return collection, [
+        (workbook, result["sha256"]) for workbook, result in zip(workbooks, results)
+    ]
@@ -0,0 +1,38 @@
+"""
+Files derived from workbook pdfs (search indexes, images, ...), see WorkbookArtifact.
+"""
+
+import hashlib
+
+from django.core.files.base import ContentFile
+
+from core.models import WorkbookArtifact, delete_unreferenced_file
+
+
+def save_artifact(workbook, kind, data, extension, metadata=None):
+    """
+    Stores data (bytes) as the artifact of the given kind, replacing the previous one.
+    """
+    artifact = WorkbookArtifact.objects.filter(workbook=workbook, kind=kind).first()
+    if artifact is None:
+        artifact = WorkbookArtifact(workbook=workbook, kind=kind)
+    previous_name = artifact.file.name
+
+    artifact.size = len(data)
+    artifact.sha256 = hashlib.sha256(data).hexdigest()
+    artifact.metadata = metadata
+    artifact.file.save(
+        f"workbook-{workbook.id}-{kind}.{extension}", ContentFile(data), save=False
+    )
+    artifact.save()
+
+    # Only once the row points at the new file, so downloads during a reprocess never miss it.
+    # Identical pdfs have identical artifacts, the previous file may be another workbook's too.
+    if previous_name != artifact.file.name:
+        delete_unreferenced_file(previous_name)
+
+    return artifact
+
+
+def get_artifact(workbook, kind):
+    return WorkbookArtifact.objects.filter(workbook=workbook, kind=kind).first()
@@ -0,0 +1,241 @@
+"""
+Offline provisioning bundles.
+
+A bundle is one tar download per released collection, holding its manifest (collection, workbooks and their
+chapters, see core/manifests.py) and every workbook pdf, so a tablet is provisioned with a single request
+instead of latest, retrieve and a download per workbook.
+
+Bundles are never written anywhere. An uncompressed tar is headers, file bytes and padding at offsets known
+from the file sizes alone, so the layout (headers, manifest and which stored file goes in between) is computed
+once per version of the collection and cached, and any byte range of the bundle is streamed straight from
+storage. Interrupted transfers resume with a Range request.
+
+    collection-<id>/manifest.json
+    collection-<id>/workbook-<number>.pdf     the standard variant (see core/lite.py)
+"""
+
+import hashlib
+import json
+import tarfile
+
+from django.core.cache import cache
+from django.core.files.storage import storages
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+from core.conditional import conditional_response
+from core.downloads import (
+    CHUNK_SIZE,
+    UnsatisfiableRange,
+    if_range_passes,
+    parse_range_header,
+)
+from core.manifests import build_manifest, served_pdf
+
+BUNDLE_LAYOUT_KEY_PREFIX = "bundles:layout"
+
+# Keys contain the collection version, stale layouts are never read again, this just bounds how long they linger.
+BUNDLE_LAYOUT_TIMEOUT = 60 * 60 * 24
+
+BLOCK_SIZE = tarfile.BLOCKSIZE
+
+
+def _tar_header(name, size, mtime):
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = mtime
+    info.mode = 0o644
+    # Nothing that depends on the machine building the layout, so every process agrees on it.
+    info.uid = info.gid = 0
+    info.uname = info.gname = ""
+    return info.tobuf(format=tarfile.USTAR_FORMAT)
+
+
+def _padding(size):
+    return b"\0" * (-size % BLOCK_SIZE)
+
+
+def _bundle_files(collection):
+    """
+    Returns [(workbook, storage alias, name, size, sha256)] of the pdfs of the collection.
+    """
+    files = []
+    for workbook in collection.workbooks.prefetch_related("artifacts").order_by(
+        "number"
+    ):
+        if not workbook.pdf:
+            continue
+
+        file, size, sha256 = served_pdf(workbook)
+        files.append((workbook, "workbooks", file.name, size, sha256))
+    return files
+
+
+def build_layout(collection):
+    """
+    Returns the layout of the collection's bundle:
+    {"size": ..., "etag": ..., "segments": [("data", bytes) or ("file", storage alias, name, size), ...]}
+    """
+    directory = f"collection-{collection.id}"
+    mtime = int(collection.updated_at.timestamp())
+
+    files = _bundle_files(collection)
+
+    paths = {
+        workbook.id: f"{directory}/workbook-{workbook.number}.pdf"
+        for workbook, _, _, _, _ in files
+    }
+
+    # Pdfs are referenced by their path in the bundle instead of their url.
+    pdfs = {
+        workbook.id: {"path": paths[workbook.id], "size": size, "sha256": sha256}
+        for workbook, _, _, size, sha256 in files
+    }
+    manifest = build_manifest(collection)
+    for entry in manifest["workbooks"]:
+        entry["pdf"] = pdfs.get(entry["id"])
+
+    manifest_data = json.dumps(manifest, sort_keys=True, separators=(",", ":")).encode()
+
+    segments = [
+        (
+            "data",
+            _tar_header(f"{directory}/manifest.json", len(manifest_data), mtime)
+            + manifest_data
+            + _padding(len(manifest_data)),
+        )
+    ]
+    for workbook, alias, name, size, _ in files:
+        segments.append(("data", _tar_header(paths[workbook.id], size, mtime)))
+        segments.append(("file", alias, name, size))
+        segments.append(("data", _padding(size)))
+    # The end of archive marker.
+    segments.append(("data", b"\0" * 2 * BLOCK_SIZE))
+
+    size = sum(
+        len(segment[1]) if segment[0] == "data" else segment[3] for segment in segments
+    )
+
+    # The manifest holds the hash of every pdf, with the headers it identifies the whole bundle.
+    digest = hashlib.sha256()
+    for segment in segments:
+        if segment[0] == "data":
+            digest.update(segment[1])
+
+    return {"size": size, "etag": f'"{digest.hexdigest()}"', "segments": segments}
+
+
+def get_layout(collection):
+    """
+    Returns the cached layout of the collection's bundle.
+    Any change to the collection or its workbooks (a release included) moves updated_at, hence the key.
+    """
+    key = ":".join(
+        [
+            BUNDLE_LAYOUT_KEY_PREFIX,
+            str(collection.id),
+            collection.updated_at.isoformat(),
+        ]
+    )
+
+    layout = cache.get(key)
+    if layout is None:
+        layout = build_layout(collection)
+        cache.set(key, layout, timeout=BUNDLE_LAYOUT_TIMEOUT)
+    return layout
+
+
+def _iter_file(storage, name, start, length):
+    # Storages that can stream a range (S3) would otherwise download the whole file first.
+    if hasattr(storage, "iter_range"):
+        yield from storage.iter_range(name, start, length, CHUNK_SIZE)
+        return
+
+    with storage.open(name, "rb") as file:
+        file.seek(start)
+        remaining = length
+        while remaining > 0:
+            data = file.read(min(CHUNK_SIZE, remaining))
+            if not data:
+                raise IOError(f"{name} is shorter than expected.")
+            remaining -= len(data)
+            yield data
+
+
+def iter_bundle(layout, start, end):
+    """
+    Yields bytes [start, end] (inclusive) of the bundle.
+    """
+    offset = 0
+    for segment in layout["segments"]:
+        size = len(segment[1]) if segment[0] == "data" else segment[3]
+        segment_start, segment_end = offset, offset + size - 1
+        offset += size
+
+        if segment_end < start or size == 0:
+            continue
+        if segment_start > end:
+            break
+
+        first = max(start, segment_start) - segment_start
+        last = min(end, segment_end) - segment_start
+
+        if segment[0] == "data":
+            yield segment[1][first : last + 1]
+        else:
+            _, alias, name, _ = segment
+            yield from _iter_file(storages[alias], name, first, last - first + 1)
+
+
+def serve_bundle(request, collection):
+    """
+    Streams the collection's bundle with support for HEAD, conditional requests and single Range requests
+    (a Range of several ranges is ignored, the whole bundle is sent).
+    """
+    layout = get_layout(collection)
+    size = layout["size"]
+    etag = layout["etag"]
+    last_modified = collection.updated_at
+
+    def build_response():
+        try:
+            ranges = parse_range_header(request.headers.get("Range"), size)
+        except UnsatisfiableRange:
+            response = HttpResponse(status=416)
+            response.headers["Content-Range"] = f"bytes */{size}"
+            return response
+
+        if ranges is not None and (
+            len(ranges) > 1 or not if_range_passes(request, etag, last_modified)
+        ):
+            ranges = None
+
+        if ranges is None:
+            start, end, status = 0, size - 1, 200
+        else:
+            (start, end), status = ranges[0], 206
+
+        if request.method == "HEAD":
+            response = HttpResponse(status=status, content_type="application/x-tar")
+        else:
+            response = StreamingHttpResponse(
+                iter_bundle(layout, start, end),
+                status=status,
+                content_type="application/x-tar",
+            )
+
+        response.headers["Content-Length"] = end - start + 1
+        response.headers["Accept-Ranges"] = "bytes"
+        response.headers["Content-Disposition"] = content_disposition_header(
+            True,
+            f"collection-{collection.major_version}.{collection.minor_version}"
+            f"-{collection.localization}.tar",
+        )
+        if status == 206:
+            response.headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+        return response
+
+    return conditional_response(
+        request, build_response, etag, last_modified=last_modified
+    )
@@ -0,0 +1,67 @@
+from django.core.cache import cache
+
+CATALOG_GENERATION_KEY = "catalog:generation"
+LATEST_COLLECTION_KEY_PREFIX = "collections:latest:expanded"
+
+# Stale generations are never read again, this just bounds how long they linger.
+LATEST_COLLECTION_TIMEOUT = 60 * 60 * 24
+
+# Used in place of a localization when the latest collection is requested without one.
+ANY_LOCALIZATION = "*"
+
+
+def get_catalog_generation():
+    """
+    Returns the current catalog generation.
+    Every write to a collection or workbook moves to a new generation, which orphans old cache entries.
+    """
+    generation = cache.get(CATALOG_GENERATION_KEY)
+    if generation is None:
+        cache.add(CATALOG_GENERATION_KEY, 0, timeout=None)
+        generation = cache.get(CATALOG_GENERATION_KEY, 0)
+    return generation
+
+
+def bump_catalog_generation():
+    try:
+        cache.incr(CATALOG_GENERATION_KEY)
+    except ValueError:
+        # Key was evicted or never set, anything cached under it is unreachable anyway.
+        cache.set(CATALOG_GENERATION_KEY, 1, timeout=None)
+
+
+def latest_collection_cache_key(request, localization):
+    """
+    Cache key for the expanded latest collection payload.
+    Authenticated users can see unreleased collections, so they get their own entry.
+    The host is part of the key since serialized pdf urls are absolute.
+    """
+    audience = "auth" if request.user.is_authenticated else "anon"
+    return ":".join(
+        [
+            LATEST_COLLECTION_KEY_PREFIX,
+            str(get_catalog_generation()),
+            localization or ANY_LOCALIZATION,
+            audience,
+            request.scheme,
+            request.get_host(),
+        ]
+    )
+
+
+def get_latest_collection_payload(request, localization, build):
+    """
+    Returns the cached expanded payload for the latest collection.
+    On a miss, build() is called and its result is cached, unless it is None (nothing to cache).
+    """
+    key = latest_collection_cache_key(request, localization)
+
+    payload = cache.get(key)
+    if payload is not None:
+        return payload
+
+    payload = build()
+    if payload is not None:
+        cache.set(key, payload, timeout=LATEST_COLLECTION_TIMEOUT)
+
+    return payload
@@ -0,0 +1,59 @@
+import hashlib
+
+from django.conf import settings
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(request, *parts):
+    """
+    Builds a strong ETag from everything that determines a representation.
+    Parts should be cheap to fetch (ids, change timestamps, query params) so no serialization is needed.
+    The api version and base url are always included, since serializers and absolute urls depend on them.
+    """
+    digest = hashlib.sha256()
+
+    for part in (settings.API_VERSION, request.build_absolute_uri("/"), *parts):
+        digest.update(repr(part).encode())
+        digest.update(b"\0")
+
+    return quote_etag(digest.hexdigest()[:32])
+
+
+def conditional_response(
+    request, build_response, etag, last_modified=None, vary_on_auth=False
+):
+    """
+    Answers a read with 304 Not Modified if the client already has the current representation.
+    Otherwise build_response() is called and the validators are attached to the response.
+
+    last_modified should only be given when a deletion can never make it go backwards,
+    as If-Modified-Since would otherwise 304 a stale representation.
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+    if response is None:
+        response = build_response()
+
+        # Never attach validators to errors.
+        if not 200 <= response.status_code < 300:
+            return response
+
+    response.headers["ETag"] = etag
+    if timestamp is not None:
+        response.headers["Last-Modified"] = http_date(timestamp)
+
+    # Clients may store the response, but have to revalidate before using it.
+    patch_cache_control(response, no_cache=True)
+
+    # Authenticated users can see unreleased collections.
+    if vary_on_auth:
+        patch_vary_headers(response, ["Authorization"])
+
+    return response
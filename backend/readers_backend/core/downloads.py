@@ -0,0 +1,356 @@
+import hashlib
+import os
+import re
+import uuid
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
+from django.utils.http import (
+    content_disposition_header,
+    parse_etags,
+    parse_http_date_safe,
+    quote_etag,
+)
+
+from core.conditional import conditional_response
+from core.hotcache import iter_mapped, mapped_file
+
+RANGE_HEADER_RE = re.compile(r"^\s*bytes\s*=\s*(.+)$", re.IGNORECASE)
+RANGE_SPEC_RE = re.compile(r"^\s*(\d*)\s*-\s*(\d*)\s*$")
+
+# Beyond this a Range header is ignored and the whole file is sent.
+# Clients resuming a download only ever need one range, lots of tiny ones is abuse.
+MAX_RANGES = 16
+
+# Headers handing the transfer of a file to the front proxy, by DOWNLOAD_OFFLOAD mode.
+OFFLOAD_HEADERS = {
+    "x-accel-redirect": "X-Accel-Redirect",
+    "x-sendfile": "X-Sendfile",
+}
+
+# Used when bytes have to go through python (multipart ranges, storages without a file descriptor).
+CHUNK_SIZE = 64 * 1024
+
+
+class UnsatisfiableRange(Exception):
+    pass
+
+
+def parse_range_header(header, size):
+    """
+    Parses a Range header into a sorted list of inclusive (start, end) byte ranges.
+    Overlapping and adjacent ranges are merged.
+
+    Returns None when the header should be ignored (missing, malformed, not bytes, too many ranges),
+    which means the full file is sent, as RFC 9110 requires.
+    Raises UnsatisfiableRange when no range overlaps the file (416).
+    """
+    if not header:
+        return None
+
+    match = RANGE_HEADER_RE.match(header)
+    if not match:
+        return None
+
+    specs = match.group(1).split(",")
+    if len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for spec in specs:
+        spec_match = RANGE_SPEC_RE.match(spec)
+        if not spec_match:
+            return None
+
+        first, last = spec_match.groups()
+
+        if first == "" and last == "":
+            return None
+
+        if first == "":
+            # Suffix range, the last n bytes.
+            length = int(last)
+            if length == 0:
+                continue
+            ranges.append((max(size - length, 0), size - 1))
+            continue
+
+        start = int(first)
+        end = int(last) if last != "" else None
+
+        if end is not None and end < start:
+            return None
+
+        if start >= size:
+            continue
+
+        ranges.append((start, size - 1 if end is None else min(end, size - 1)))
+
+    if not ranges:
+        raise UnsatisfiableRange()
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        previous_start, previous_end = merged[-1]
+        if start <= previous_end + 1:
+            merged[-1] = (previous_start, max(previous_end, end))
+        else:
+            merged.append((start, end))
+
+    return merged
+
+
+def if_range_passes(request, etag, last_modified):
+    """
+    If-Range makes a Range conditional: when the validator doesn't match, the full file is sent.
+    Only strong comparison is allowed, so weak ETags never match.
+    """
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return not if_range.startswith("W/") and etag in parse_etags(if_range)
+
+    timestamp = parse_http_date_safe(if_range)
+    return (
+        timestamp is not None
+        and last_modified is not None
+        and timestamp == int(last_modified.timestamp())
+    )
+
+
+def file_etag(name, size, modified):
+    """
+    A strong ETag for a stored file, from its identity (name, size, modification time).
+    """
+    timestamp = modified.timestamp() if modified else ""
+    digest = hashlib.sha256(f"{name}:{size}:{timestamp}".encode())
+    return quote_etag(digest.hexdigest()[:32])
+
+
+class FileSlice:
+    """
+    A read only view of [start, start + length) of an open file.
+
+    Exposes the file descriptor, positioned at start, so wsgi.file_wrapper (gunicorn)
+    can hand the transfer to os.sendfile. Content-Length bounds how much is sent.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b""
+
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def _iter_multipart_ranges(storage, name, ranges, part_headers, closing):
+    with storage.open(name, "rb") as file:
+        for (start, end), part_header in zip(ranges, part_headers):
+            yield part_header
+
+            file.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                data = file.read(min(CHUNK_SIZE, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+
+    yield closing
+
+
+def _multipart_response(storage, name, ranges, size, content_type):
+    boundary = uuid.uuid4().hex
+
+    part_headers = [
+        (
+            f"\r\n--{boundary}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+        ).encode()
+        for start, end in ranges
+    ]
+    closing = f"\r\n--{boundary}--\r\n".encode()
+
+    content_length = (
+        sum(len(part_header) for part_header in part_headers)
+        + sum(end - start + 1 for start, end in ranges)
+        + len(closing)
+    )
+
+    # The generator only opens the file once iterated, so a HEAD never touches it.
+    response = StreamingHttpResponse(
+        _iter_multipart_ranges(storage, name, ranges, part_headers, closing),
+        status=206,
+        content_type=f"multipart/byteranges; boundary={boundary}",
+    )
+    response.headers["Content-Length"] = content_length
+    return response
+
+
+def offload_target(storage, name):
+    """
+    Returns what the DOWNLOAD_OFFLOAD header should point at for a stored file:
+    the internal nginx uri (X-Accel-Redirect) or the absolute path (X-Sendfile).
+
+    None when downloads aren't offloaded, or the file can't be: it isn't on the local disk,
+    or for nginx, it isn't under MEDIA_ROOT (what DOWNLOAD_OFFLOAD_LOCATION serves).
+    """
+    if not settings.DOWNLOAD_OFFLOAD:
+        return None
+
+    try:
+        path = os.path.realpath(storage.path(name))
+    except (AttributeError, NotImplementedError):
+        return None
+
+    if settings.DOWNLOAD_OFFLOAD == "x-sendfile":
+        return path
+
+    root = os.path.realpath(settings.MEDIA_ROOT)
+    if os.path.commonpath([root, path]) != root:
+        return None
+
+    relative_path = os.path.relpath(path, root).replace(os.sep, "/")
+    return f"{settings.DOWNLOAD_OFFLOAD_LOCATION.rstrip('/')}/{quote(relative_path)}"
+
+
+def offload_response(target, content_type, filename=None):
+    """
+    An empty response the front proxy replaces with the file, keeping its Content-Type, Content-Disposition
+    and cache headers. The proxy answers Range requests and sets Content-Length.
+    """
+    response = HttpResponse(content_type=content_type)
+    response.headers[OFFLOAD_HEADERS[settings.DOWNLOAD_OFFLOAD]] = target
+    response.headers["Accept-Ranges"] = "bytes"
+
+    if filename:
+        response.headers["Content-Disposition"] = content_disposition_header(
+            False, filename
+        )
+
+    return response
+
+
+def redirect_response(storage, name, content_type, filename=None):
+    response = HttpResponseRedirect(
+        storage.download_url(name, content_type=content_type, filename=filename)
+    )
+    # The url expires, clients must come back for a new one.
+    response.headers["Cache-Control"] = "private, no-store"
+    return response
+
+
+def serve_file(request, storage, name, content_type, filename=None, etag=None):
+    """
+    Serves a stored file with support for HEAD, conditional requests and (multi) Range requests.
+
+    Single ranges and full downloads are sent with a FileResponse over the real file, so
+    gunicorn can use os.sendfile and file bytes never go through python.
+    Multiple ranges need multipart framing and are streamed in chunks.
+
+    Storages that can hand out download urls (S3) get a redirect instead, the bucket serves the bytes.
+    With DOWNLOAD_OFFLOAD, files on the local disk are sent by the front proxy (X-Accel-Redirect, X-Sendfile)
+    once access was checked and conditional requests answered here.
+    Without, hot files are sliced out of memory mappings (see core/hotcache.py).
+    """
+    if hasattr(storage, "download_url"):
+        return redirect_response(storage, name, content_type, filename)
+
+    target = offload_target(storage, name)
+
+    size = storage.size(name)
+    try:
+        last_modified = storage.get_modified_time(name)
+    except NotImplementedError:
+        last_modified = None
+
+    if etag is None:
+        etag = file_etag(name, size, last_modified)
+
+    def build_response():
+        if target is not None:
+            return offload_response(target, content_type, filename)
+
+        try:
+            ranges = parse_range_header(request.headers.get("Range"), size)
+        except UnsatisfiableRange:
+            response = HttpResponse(status=416)
+            response.headers["Content-Range"] = f"bytes */{size}"
+            return response
+
+        if ranges is not None and not if_range_passes(request, etag, last_modified):
+            ranges = None
+
+        if ranges is None:
+            start, length, status = 0, size, 200
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            length, status = end - start + 1, 206
+        else:
+            response = _multipart_response(storage, name, ranges, size, content_type)
+            response.headers["Accept-Ranges"] = "bytes"
+            return response
+
+        # Hot files are served from memory, the size check skips a file replaced since it was measured.
+        mapping = mapped_file(storage, name) if request.method != "HEAD" else None
+
+        if request.method == "HEAD":
+            # No need to touch the file for a HEAD.
+            response = HttpResponse(status=status, content_type=content_type)
+        elif mapping is not None and len(mapping) == size:
+            response = StreamingHttpResponse(
+                iter_mapped(mapping, start, length),
+                status=status,
+                content_type=content_type,
+            )
+        else:
+            response = FileResponse(
+                FileSlice(storage.open(name, "rb"), start, length),
+                status=status,
+                content_type=content_type,
+            )
+
+        response.headers["Content-Length"] = length
+        response.headers["Accept-Ranges"] = "bytes"
+
+        if filename:
+            response.headers["Content-Disposition"] = content_disposition_header(
+                False, filename
+            )
+
+        if status == 206:
+            response.headers["Content-Range"] = (
+                f"bytes {start}-{start + length - 1}/{size}"
+            )
+
+        return response
+
+    return conditional_response(
+        request, build_response, etag, last_modified=last_modified
+    )
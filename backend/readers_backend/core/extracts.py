@@ -0,0 +1,119 @@
+"""
+Standalone pdfs of a chapter or a page range of a workbook, so a student who needs one chapter doesn't download
+the whole workbook.
+
+A chapter runs from its start_page to the page before the next chapter (the last page for the last chapter).
+Extracts are linearized like the workbook pdf (see core/linearize.py) and cached on local disk, so only the first
+request for a range pays for building it. Extracts are stored under the sha256 of their bytes, which is their ETag,
+and a small cache maps (workbook sha256, pages) to it. An extract built again after an eviction gets the ETag of
+its own bytes, should they differ (another qpdf), resumed downloads never mix two builds.
+"""
+
+import hashlib
+import io
+
+import pikepdf
+from django.conf import settings
+
+from core.filecache import cache_directory, get_cache
+from core.ingest import compute_sha256
+from core.pdf import open_pdf
+from core.storage import open_stored
+
+
+class InvalidPageRange(Exception):
+    pass
+
+
+# The digests are 64 bytes, this holds those of more extracts than the extracts cache can.
+DIGESTS_CACHE_MAX_SIZE = 16 * 1024 * 1024
+
+
+def extracts_cache():
+    return get_cache(
+        cache_directory("extracts"), settings.EXTRACTS_CACHE_MAX_SIZE, extension=".pdf"
+    )
+
+
+def extract_digests_cache():
+    return get_cache(cache_directory("extract-digests"), DIGESTS_CACHE_MAX_SIZE)
+
+
+def page_count(workbook):
+    if workbook.page_hashes is not None:
+        return len(workbook.page_hashes)
+
+    with open_stored(workbook.pdf) as file:
+        return len(open_pdf(file).pages)
+
+
+def chapter_pages(workbook, chapter_id):
+    """
+    Returns the (1 based, inclusive) first and last pages of the chapter, None for an unknown chapter.
+    """
+    chapters = sorted(
+        workbook.chapters or [], key=lambda chapter: chapter["start_page"]
+    )
+
+    for index, chapter in enumerate(chapters):
+        if chapter["id"] != chapter_id:
+            continue
+
+        if index + 1 < len(chapters):
+            last = chapters[index + 1]["start_page"] - 1
+        else:
+            last = page_count(workbook)
+        return chapter["start_page"], last
+
+    return None
+
+
+def extract_pages(file, first, last):
+    """
+    Returns a linearized pdf (bytes) of pages first to last (1 based, inclusive) of a pdf.
+    """
+    output = io.BytesIO()
+    with pikepdf.open(file) as pdf, pikepdf.new() as extract:
+        extract.pages.extend(pdf.pages[first - 1 : last])
+        # No random document id, so building an extract again gives the same bytes.
+        extract.save(output, linearize=True, deterministic_id=True)
+    return output.getvalue()
+
+
+def get_extract(workbook, first, last):
+    """
+    Returns (cache, name of the cached extract, sha256 of the extract) for pages first to last of the workbook.
+    Raises InvalidPageRange when the pages aren't in the workbook.
+    """
+    count = page_count(workbook)
+    if not 1 <= first <= last <= count:
+        raise InvalidPageRange(
+            f"Pages {first} to {last} are not within the {count} pages of the workbook."
+        )
+
+    if not workbook.sha256:
+        compute_sha256(workbook)
+
+    cache = extracts_cache()
+    digests = extract_digests_cache()
+    key = f"{workbook.sha256}:{first}-{last}"
+
+    def build(file):
+        with open_stored(workbook.pdf) as pdf:
+            data = extract_pages(pdf, first, last)
+        digest = hashlib.sha256(data).hexdigest()
+        cache.put(digest, data)
+        file.write(digest.encode())
+
+    for _ in range(2):
+        with digests.storage.open(digests.get_or_fill(key, build), "rb") as file:
+            digest = file.read().decode()
+
+        name = cache.get(digest)
+        if name is not None:
+            return cache, name, digest
+
+        # The extract was evicted, its digest wasn't. Built again, with whatever bytes that gives.
+        digests.delete(key)
+
+    raise RuntimeError(f"Extract {key} was evicted as soon as it was built.")
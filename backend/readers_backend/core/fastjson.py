@@ -0,0 +1,45 @@
+"""
+JSON encoding and decoding through orjson when it is installed, the standard library otherwise.
+
+Both backends produce the same documents: compact, utf-8, non ascii characters kept as is.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+if orjson is not None:
+    # Datetimes go through default, so the caller decides how they look (DRF has its own format).
+    DUMPS_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def dumps(data, default=None):
+    """
+    Returns data encoded as JSON (bytes).
+    default is called for objects the backend can't encode, like json.dumps.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, default=default, option=DUMPS_OPTIONS)
+
+    return json.dumps(
+        data, default=default, ensure_ascii=False, separators=(",", ":")
+    ).encode()
+
+
+def loads(data):
+    """
+    Decodes JSON from str or bytes.
+    Raises json.JSONDecodeError (orjson's error is a subclass) on invalid input.
+    """
+    if orjson is not None:
+        # orjson only takes exact str, not subclasses (like DRF's form values).
+        if isinstance(data, str) and type(data) is not str:
+            data = str(data)
+        return orjson.loads(data)
+
+    return json.loads(data)
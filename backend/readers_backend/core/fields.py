@@ -0,0 +1,40 @@
+from django.db import models
+from django.db.models.fields.files import FieldFile
+from django.urls import reverse
+
+from core import fastjson
+
+
+class JSONField(models.JSONField):
+    """
+    A JSONField decoding database values with core.fastjson.
+    Chapters are loaded on every workbook read, this is where most of the JSON decoding happens.
+    """
+
+    def from_db_value(self, value, expression, connection):
+        # Custom decoders and values the database already decoded are left to django.
+        if self.decoder is not None or not isinstance(value, (str, bytes)):
+            return super().from_db_value(value, expression, connection)
+
+        try:
+            return fastjson.loads(value)
+        except ValueError:
+            return value
+
+
+class WorkbookPdfFieldFile(FieldFile):
+    @property
+    def url(self):
+        # Downloads go through the endpoint of the workbook: it checks access (unreleased collections) before
+        # offloading the file to the front proxy, and with S3 redirects to a fresh presigned url.
+        # Storage urls would be public, or expire while cached responses still hold them.
+        path = reverse("workbook-pdf", args=[self.instance.pk])
+        return f"{path}?original=true"
+
+
+class WorkbookPdfField(models.FileField):
+    """
+    The pdf of a workbook, see WorkbookPdfFieldFile for its url.
+    """
+
+    attr_class = WorkbookPdfFieldFile
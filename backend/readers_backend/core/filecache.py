@@ -0,0 +1,224 @@
+"""
+Size capped, least recently used caches of files on local disk.
+
+Entries are files named after a hash of their key. They are written to a temporary file and renamed
+into place, so readers (other processes included) only ever see complete files.
+Recency is the modification time, bumped on every hit, and once a cache grows over its size cap
+the least recently used entries are deleted.
+
+Processes and threads sharing a cache directory fill an entry once: fills take an exclusive flock on a lock
+file next to the entry, and whoever waited on it finds the entry there when it gets the lock.
+An entry can be evicted while a reader has it open, which POSIX allows (the reader keeps its file until it closes it).
+
+Every cache counts its hits, misses (fills) and evictions, see stats(). Admins read those of the caches
+of the process answering at /api/cache-stats/ (see CacheStatsView in core/views.py).
+"""
+
+import fcntl
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+
+logger = logging.getLogger(__name__)
+
+TEMP_PREFIX = ".tmp-"
+LOCK_PREFIX = ".lock-"
+
+
+def cache_directory(name):
+    """
+    Directory of the named cache, under FILE_CACHE_DIR (MEDIA_ROOT/cache unless set).
+    """
+    root = settings.FILE_CACHE_DIR or os.path.join(settings.MEDIA_ROOT, "cache")
+    return os.path.join(root, name)
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(directory, max_size, extension=""):
+    """
+    Returns the cache of the directory, one instance per process so its counters add up.
+    """
+    with _caches_lock:
+        cache = _caches.get(directory)
+        if cache is None:
+            cache = _caches[directory] = DiskLRUCache(directory, max_size, extension)
+        return cache
+
+
+def cache_stats():
+    """
+    Returns {directory: stats()} of the caches this process has used.
+    """
+    with _caches_lock:
+        caches = list(_caches.values())
+    return {cache.directory: cache.stats() for cache in caches}
+
+
+class DiskLRUCache:
+
+    def __init__(self, directory, max_size, extension=""):
+        self.directory = directory
+        self.max_size = max_size
+        self.extension = extension
+        # Lets entries be served like any stored file (see core/downloads.py).
+        self.storage = FileSystemStorage(location=directory)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._stats_lock = threading.Lock()
+
+    def name(self, key):
+        return hashlib.sha256(key.encode()).hexdigest() + self.extension
+
+    def path(self, key):
+        return os.path.join(self.directory, self.name(key))
+
+    def _count(self, counter, count=1):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + count)
+
+    def stats(self):
+        """
+        Counters of this process since it started, and the current size of the cache.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": self.size(),
+            "max_size": self.max_size,
+        }
+
+    def get(self, key):
+        """
+        Returns the name of the entry in storage, None on a miss.
+        """
+        try:
+            # Touching it makes it the most recently used entry.
+            os.utime(self.path(key))
+        except FileNotFoundError:
+            return None
+        return self.name(key)
+
+    def _write(self, key, write):
+        os.makedirs(self.directory, exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=TEMP_PREFIX)
+        try:
+            with os.fdopen(fd, "wb") as file:
+                write(file)
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, self.path(key))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+        self.evict(keep=self.name(key))
+        return self.name(key)
+
+    def put(self, key, data):
+        """
+        Stores data (bytes) under key, evicts what is over the size cap and returns the name of the entry.
+        """
+        return self._write(key, lambda file: file.write(data))
+
+    def get_or_fill(self, key, write):
+        """
+        Returns the name of the entry, on a miss calling write(file) to write its bytes to a file object first.
+        Concurrent misses on the same key (any process or thread) wait for a single fill.
+        """
+        name = self.get(key)
+        if name is not None:
+            self._count("hits")
+            return name
+
+        os.makedirs(self.directory, exist_ok=True)
+        with open(
+            os.path.join(self.directory, LOCK_PREFIX + self.name(key)), "a"
+        ) as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                name = self.get(key)
+                if name is not None:
+                    # Filled while we waited.
+                    self._count("hits")
+                    return name
+
+                self._count("misses")
+                return self._write(key, write)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def get_or_create(self, key, build):
+        """
+        Returns the name of the entry, calling build() for its bytes on a miss.
+        """
+        return self.get_or_fill(key, lambda file: file.write(build()))
+
+    def delete(self, key):
+        for name in (self.name(key), LOCK_PREFIX + self.name(key)):
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def entries(self):
+        """
+        Returns [(modification time, size, name)] of the entries, least recently used first.
+        """
+        try:
+            with os.scandir(self.directory) as iterator:
+                entries = []
+                for entry in iterator:
+                    if entry.name.startswith(".") or not entry.is_file():
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        # Evicted by another process meanwhile.
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.name))
+        except FileNotFoundError:
+            return []
+
+        entries.sort()
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep=None):
+        """
+        Deletes the least recently used entries until the cache is within its size cap.
+        The keep entry is never deleted, even when it alone is over the cap.
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+
+        evicted = 0
+        for _, size, name in entries:
+            if total <= self.max_size:
+                break
+            if name == keep:
+                continue
+            # Lock files go with their entry, a fill waiting on one still completes.
+            for path in (name, LOCK_PREFIX + name):
+                try:
+                    os.unlink(os.path.join(self.directory, path))
+                except FileNotFoundError:
+                    pass
+            total -= size
+            evicted += 1
+
+        if evicted:
+            self._count("evictions", evicted)
+            logger.info(f"Evicted {evicted} entries from {self.directory}")
@@ -0,0 +1,179 @@
+"""
+Hot files for single box installs, where gunicorn sends downloads itself (no DOWNLOAD_OFFLOAD, see core/downloads.py).
+
+The most recently downloaded local files (workbook pdfs, derived files) stay memory mapped in the process,
+up to HOT_FILE_CACHE_MAX_SIZE bytes, least recently used first out. A download is sliced out of the mapping:
+no open or read per request, and the pages of hot files stay resident. Entries are checked against the file
+(inode, size, modification time) on every use, a replaced file is mapped again.
+Evicted mappings aren't closed, responses still streaming from one keep it alive until they are done.
+
+When a collection is released its files are read ahead into the page cache (posix_fadvise), so the first
+downloads of a release don't wait on the disk.
+"""
+
+import logging
+import mmap
+import os
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Larger than regular download chunks, slicing a mapping costs no system call.
+MAPPED_CHUNK_SIZE = 256 * 1024
+
+
+def _identity(stat):
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class HotFileCache:
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # path -> (identity, mapping), least recently used first.
+        self._files = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remove(self, path):
+        _, mapping = self._files.pop(path)
+        self.size -= len(mapping)
+
+    def get(self, path):
+        """
+        Returns a read only mapping of the file, None when it can't be mapped (missing, empty, over the cap).
+        """
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is not None and entry[0] == _identity(stat):
+                self._files.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+
+        if not 0 < stat.st_size <= self.max_size:
+            return None
+
+        with open(path, "rb") as file:
+            # The identity of what is mapped, the file may have been replaced since the stat.
+            identity = _identity(os.fstat(file.fileno()))
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(mapping, "madvise"):
+            mapping.madvise(mmap.MADV_WILLNEED)
+
+        with self._lock:
+            if path in self._files:
+                self._remove(path)
+            self._files[path] = (identity, mapping)
+            self.size += len(mapping)
+            self.misses += 1
+
+            while self.size > self.max_size:
+                self._remove(next(iter(self._files)))
+                self.evictions += 1
+
+        return mapping
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": self.size,
+            "max_size": self.max_size,
+            "files": len(self._files),
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def hot_file_cache():
+    """
+    The cache of this process, None unless HOT_FILE_CACHE_MAX_SIZE is set.
+    """
+    global _cache
+
+    max_size = settings.HOT_FILE_CACHE_MAX_SIZE
+    if not max_size:
+        return None
+
+    with _cache_lock:
+        if _cache is None or _cache.max_size != max_size:
+            _cache = HotFileCache(max_size)
+        return _cache
+
+
+def mapped_file(storage, name):
+    """
+    Returns a mapping of the stored file, None when hot files are off or the file isn't on the local disk.
+    """
+    cache = hot_file_cache()
+    if cache is None:
+        return None
+
+    try:
+        path = storage.path(name)
+    except (AttributeError, NotImplementedError):
+        return None
+
+    return cache.get(path)
+
+
+def iter_mapped(mapping, start, length):
+    """
+    Yields bytes [start, start + length) of a mapping.
+    WSGI servers only write bytes, each chunk is a slice of the mapping.
+    """
+    end = start + length
+    for offset in range(start, end, MAPPED_CHUNK_SIZE):
+        yield mapping[offset : min(offset + MAPPED_CHUNK_SIZE, end)]
+
+
+def warm_files(paths):
+    """
+    Starts reading the files into the page cache and returns right away, the kernel reads them in the background.
+    """
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        except (AttributeError, OSError) as e:
+            # Not available on every platform (macOS).
+            logger.debug(f"Could not read ahead {path}: {e}")
+        finally:
+            os.close(fd)
+
+
+def warm_collection(collection):
+    """
+    Reads ahead the files of a collection's workbooks that are on the local disk: pdfs and derived files.
+    Returns their paths.
+    """
+    paths = []
+    for workbook in collection.workbooks.prefetch_related("artifacts"):
+        for field_file in [workbook.pdf, *(a.file for a in workbook.artifacts.all())]:
+            if not field_file:
+                continue
+            try:
+                paths.append(field_file.path)
+            except (AttributeError, NotImplementedError):
+                # Not on the local disk (S3).
+                continue
+
+    warm_files(paths)
+    return paths
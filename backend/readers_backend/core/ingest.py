@@ -0,0 +1,27 @@
+from core.models import Workbook
+from core.pdf import page_hashes
+from core.storage import hash_content, open_stored, sha256_from_name
+
+
+def compute_page_hashes(workbook):
+    with open_stored(workbook.pdf) as file:
+        hashes = page_hashes(file)
+
+    # Derived data, not a change clients need to hear about, so signals are skipped.
+    Workbook.objects.filter(pk=workbook.pk).update(page_hashes=hashes)
+    workbook.page_hashes = hashes
+
+    return hashes
+
+
+def compute_sha256(workbook):
+    # Known from the name for pdfs in the content addressed storage, only older pdfs are hashed.
+    sha256 = sha256_from_name(workbook.pdf.name)
+    if sha256 is None:
+        with open_stored(workbook.pdf) as file:
+            sha256 = hash_content(file)
+
+    Workbook.objects.filter(pk=workbook.pk).update(sha256=sha256)
+    workbook.sha256 = sha256
+
+    return sha256
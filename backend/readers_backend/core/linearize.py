@@ -0,0 +1,47 @@
+"""
+Linearized ("fast web view") copies of workbook pdfs.
+
+A linearized pdf starts with everything needed to show its first page, so PDFKit can render page 1
+before the rest of the file arrived. Uploads rarely are, so a linearized copy is made after upload and
+served by default, the uploaded pdf is kept untouched for audit (and is what hashes and patches are based on).
+"""
+
+import io
+
+import pikepdf
+
+from core.artifacts import save_artifact
+from core.models import WorkbookArtifact
+from core.storage import open_stored
+
+
+def is_linearized(file):
+    with pikepdf.open(file) as pdf:
+        return pdf.is_linearized
+
+
+def linearize(file):
+    """
+    Returns the linearized copy (bytes) of a pdf, file is a path or a file object.
+    """
+    output = io.BytesIO()
+    with pikepdf.open(file) as pdf:
+        # Object streams are kept as they are, linearizing shouldn't make the file larger than it has to.
+        # No random document id, identical pdfs get identical copies and share them (see core/storage.py).
+        pdf.save(
+            output,
+            linearize=True,
+            object_stream_mode=pikepdf.ObjectStreamMode.preserve,
+            deterministic_id=True,
+        )
+    return output.getvalue()
+
+
+def linearize_workbook(workbook):
+    """
+    Stores the linearized copy of the workbook pdf as an artifact, served instead of the upload.
+    """
+    with open_stored(workbook.pdf) as file:
+        data = linearize(file)
+
+    return save_artifact(workbook, WorkbookArtifact.Kind.LINEARIZED_PDF, data, "pdf")
@@ -0,0 +1,119 @@
+"""
+"Lite" variants of workbook pdfs, for clients on metered or slow connections.
+
+The lite variant is the workbook pdf with
+    - images larger than LITE_MAX_IMAGE_SIZE pixels downsampled and re-encoded as JPEG (when that is smaller)
+    - document metadata (info dictionary, XMP) stripped
+    - streams recompressed and objects packed in object streams
+and is linearized like the standard variant (see core/linearize.py).
+
+Fonts are kept as they are: pdfs exported for print already embed font subsets, and re-subsetting
+embedded fonts isn't something pdf libraries can do reliably.
+"""
+
+import io
+
+import pikepdf
+from PIL import Image
+
+from core.artifacts import save_artifact
+from core.models import WorkbookArtifact
+from core.storage import open_stored
+
+# Variants of a workbook pdf clients can download, standard is the default.
+PDF_VARIANTS = {
+    "standard": WorkbookArtifact.Kind.LINEARIZED_PDF,
+    "lite": WorkbookArtifact.Kind.LITE_PDF,
+}
+
+# Longest side in pixels, about 150 dpi for a full page image.
+LITE_MAX_IMAGE_SIZE = 1600
+LITE_JPEG_QUALITY = 60
+
+# Modes that can be written as JPEG, anything else (CMYK, masks, ...) is left alone.
+JPEG_COLOR_SPACES = {"RGB": pikepdf.Name.DeviceRGB, "L": pikepdf.Name.DeviceGray}
+
+
+def _downsample_image(stream):
+    """
+    Replaces the image with a smaller JPEG when it's larger than LITE_MAX_IMAGE_SIZE.
+    Returns True if the image was replaced.
+    """
+    if stream.get("/ImageMask") or "/SMask" in stream or "/Mask" in stream:
+        # Masks are sized to match the image, downsampling one without the other breaks the page.
+        return False
+
+    image = pikepdf.PdfImage(stream)
+    if max(image.width, image.height) <= LITE_MAX_IMAGE_SIZE:
+        return False
+
+    try:
+        pil_image = image.as_pil_image()
+    except (pikepdf.PdfError, NotImplementedError, ValueError):
+        # Encodings Pillow can't decode (JBIG2, unusual color spaces, ...).
+        return False
+
+    if pil_image.mode == "P":
+        pil_image = pil_image.convert("RGB")
+    if pil_image.mode not in JPEG_COLOR_SPACES:
+        return False
+
+    pil_image.thumbnail(
+        (LITE_MAX_IMAGE_SIZE, LITE_MAX_IMAGE_SIZE), Image.Resampling.LANCZOS
+    )
+
+    output = io.BytesIO()
+    pil_image.save(output, "JPEG", quality=LITE_JPEG_QUALITY, optimize=True)
+    data = output.getvalue()
+
+    if len(data) >= len(stream.read_raw_bytes()):
+        return False
+
+    stream.write(data, filter=pikepdf.Name.DCTDecode)
+    stream.Width = pil_image.width
+    stream.Height = pil_image.height
+    stream.ColorSpace = JPEG_COLOR_SPACES[pil_image.mode]
+    stream.BitsPerComponent = 8
+    for key in ("/Decode", "/DecodeParms"):
+        if key in stream:
+            del stream[key]
+
+    return True
+
+
+def make_lite_pdf(file):
+    """
+    Returns the lite variant (bytes) of a pdf, file is a path or a file object.
+    """
+    output = io.BytesIO()
+    with pikepdf.open(file) as pdf:
+        # Every object once, so images shared between pages (or inside forms) are downsampled once.
+        for obj in pdf.objects:
+            if isinstance(obj, pikepdf.Stream) and obj.get("/Subtype") == "/Image":
+                _downsample_image(obj)
+
+        if "/Metadata" in pdf.Root:
+            del pdf.Root.Metadata
+        if "/Info" in pdf.trailer:
+            del pdf.trailer.Info
+
+        pdf.remove_unreferenced_resources()
+        pdf.save(
+            output,
+            linearize=True,
+            deterministic_id=True,
+            compress_streams=True,
+            recompress_flate=True,
+            object_stream_mode=pikepdf.ObjectStreamMode.generate,
+        )
+    return output.getvalue()
+
+
+def make_lite_workbook(workbook):
+    """
+    Stores the lite variant of the workbook pdf as an artifact.
+    """
+    with open_stored(workbook.pdf) as file:
+        data = make_lite_pdf(file)
+
+    return save_artifact(workbook, WorkbookArtifact.Kind.LITE_PDF, data, "pdf")
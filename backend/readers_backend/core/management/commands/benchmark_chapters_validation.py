@@ -0,0 +1,125 @@
+import random
+import time
+
+import jsonschema
+from django.core.management import BaseCommand
+
+from core.validators import CHAPTERS_SCHEMA, ChaptersValidator, validate_chapters
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the compiled chapters validator with jsonschema.validate (what uploads used before) "
+        "on large synthetic chapter lists."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chapters",
+            type=int,
+            default=500,
+            help="How many chapters every synthetic workbook has.",
+        )
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def make_chapters(self, count, rng):
+        chapters = []
+        start_page = 1
+        for number in range(1, count + 1):
+            covers = []
+            for cover in range(rng.randint(1, 4)):
+                covers.append(
+                    {
+                        "id": f"cover-{number}-{cover}",
+                        "desc": f"Cover {cover} of chapter {number}",
+                        "videos": [
+                            {
+                                "link": f"https://youtu.be/{number}-{cover}-{video}",
+                                "title": f"Video {video}",
+                            }
+                            for video in range(rng.randint(0, 3))
+                        ],
+                        "references": [
+                            {
+                                "link": f"https://example.org/{number}/{cover}/{reference}",
+                                "title": f"Reference {reference}",
+                            }
+                            for reference in range(rng.randint(0, 3))
+                        ],
+                    }
+                )
+
+            chapters.append(
+                {
+                    "requires": [
+                        f"chapter-{required}"
+                        for required in rng.sample(
+                            range(1, number), min(number - 1, rng.randint(0, 3))
+                        )
+                    ],
+                    "title": f"Chapter {number}",
+                    "id": f"chapter-{number}",
+                    "chap_num": number,
+                    "start_page": start_page,
+                    "covers": covers,
+                }
+            )
+            start_page += rng.randint(1, 10)
+
+        return chapters
+
+    def measure(self, function, chapters, iterations):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            function(chapters)
+        return (time.perf_counter() - start) / iterations * 1000
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        chapters = self.make_chapters(options["chapters"], rng)
+        iterations = options["iterations"]
+
+        invalid = [dict(chapter) for chapter in chapters]
+        for index in rng.sample(range(len(invalid)), max(len(invalid) // 20, 1)):
+            invalid[index]["title"] = ""
+
+        cases = [
+            (
+                "jsonschema.validate",
+                lambda data: jsonschema.validate(data, CHAPTERS_SCHEMA),
+            ),
+            (
+                "jsonschema, all errors",
+                lambda data: list(
+                    jsonschema.Draft7Validator(CHAPTERS_SCHEMA).iter_errors(data)
+                ),
+            ),
+            (
+                "compiled, first use",
+                lambda data: ChaptersValidator(CHAPTERS_SCHEMA).validate(data),
+            ),
+            ("compiled, cached", validate_chapters),
+        ]
+
+        self.stdout.write(
+            f"{len(chapters)} chapters, {iterations} iterations, "
+            f"{len(validate_chapters(invalid).errors)} errors in the invalid list\n"
+        )
+
+        for name, function in cases:
+            valid_time = self.measure(function, chapters, iterations)
+
+            def invalid_function(data, function=function):
+                try:
+                    function(data)
+                except jsonschema.ValidationError:
+                    pass
+
+            invalid_time = self.measure(invalid_function, invalid, iterations)
+
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{name:>24}: {valid_time:8.2f} ms valid, {invalid_time:8.2f} ms invalid"
+                )
+            )
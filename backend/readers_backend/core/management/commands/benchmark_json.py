@@ -0,0 +1,87 @@
+import glob
+import io
+import json
+import os
+import time
+
+from django.core.management import BaseCommand
+from rest_framework import parsers, renderers
+
+from core import fastjson
+from core.renderers import JSONParser, JSONRenderer
+
+CHAPTERS_DIR = "development_data/chapters"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the throughput of DRF's JSON renderer and parser with the core.fastjson ones "
+        "on the development chapters."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=2000,
+            help="How many times every payload is rendered and parsed.",
+        )
+
+    def measure(self, function, payloads, iterations):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for payload in payloads:
+                function(payload)
+        return time.perf_counter() - start
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        paths = sorted(glob.glob(os.path.join(CHAPTERS_DIR, "*.json")))
+
+        if not paths:
+            self.stdout.write(self.style.ERROR(f"No chapters found in {CHAPTERS_DIR}."))
+            return
+
+        chapters = []
+        for path in paths:
+            with open(path) as file:
+                chapters.append(json.load(file))
+
+        encoded = [renderers.JSONRenderer().render(payload) for payload in chapters]
+        size = sum(len(payload) for payload in encoded)
+
+        self.stdout.write(
+            f"{len(chapters)} payloads, {size} bytes, {iterations} iterations, "
+            f"fast backend: {fastjson.BACKEND}\n"
+        )
+
+        drf_parser = parsers.JSONParser()
+        fast_parser = JSONParser()
+
+        cases = [
+            (
+                "render",
+                renderers.JSONRenderer().render,
+                JSONRenderer().render,
+                chapters,
+            ),
+            (
+                "parse",
+                lambda payload: drf_parser.parse(io.BytesIO(payload)),
+                lambda payload: fast_parser.parse(io.BytesIO(payload)),
+                encoded,
+            ),
+        ]
+
+        for name, drf_function, fast_function, payloads in cases:
+            drf_time = self.measure(drf_function, payloads, iterations)
+            fast_time = self.measure(fast_function, payloads, iterations)
+
+            megabytes = size * iterations / 1024 / 1024
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{name:>6}: drf {megabytes / drf_time:8.1f} MB/s, "
+                    f"fast {megabytes / fast_time:8.1f} MB/s "
+                    f"({drf_time / fast_time:.1f}x)"
+                )
+            )
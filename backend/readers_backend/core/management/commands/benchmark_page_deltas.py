@@ -0,0 +1,94 @@
+import glob
+import io
+import os
+import random
+import time
+
+from django.core.management import BaseCommand
+from pypdf import PdfReader, PdfWriter
+
+from core.pdf import build_patch, page_hashes
+
+PDFS_DIR = "development_data/pdfs"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures how many bytes page level patches save on the development pdfs. "
+        "Each workbook gets a simulated new version where a few pages are replaced by pages of another workbook."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--changed-pages",
+            type=int,
+            default=3,
+            help="How many pages change between versions.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def make_new_version(self, base_path, donor_path, changed_pages, rng):
+        base = PdfReader(base_path)
+        donor = PdfReader(donor_path)
+
+        changed = set(
+            rng.sample(range(len(base.pages)), min(changed_pages, len(base.pages)))
+        )
+
+        writer = PdfWriter()
+        for index, page in enumerate(base.pages):
+            if index in changed:
+                page = donor.pages[index % len(donor.pages)]
+            writer.add_page(page)
+
+        output = io.BytesIO()
+        writer.write(output)
+        return output.getvalue()
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        paths = sorted(glob.glob(os.path.join(PDFS_DIR, "*.pdf")))
+
+        if len(paths) < 2:
+            self.stdout.write(self.style.ERROR(f"Need at least 2 pdfs in {PDFS_DIR}."))
+            return
+
+        total_full = 0
+        total_patch = 0
+        hashing_time = 0
+        patching_time = 0
+
+        for index, base_path in enumerate(paths):
+            donor_path = paths[(index + 1) % len(paths)]
+            target = self.make_new_version(
+                base_path, donor_path, options["changed_pages"], rng
+            )
+
+            start = time.perf_counter()
+            base_hashes = page_hashes(base_path)
+            hashing_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            recipe, patch = build_patch(base_hashes, io.BytesIO(target))
+            patching_time += time.perf_counter() - start
+
+            patch_size = len(patch) if patch else 0
+            total_full += len(target)
+            total_patch += patch_size
+
+            self.stdout.write(
+                f"{os.path.basename(base_path)}: {len(target):>10} bytes full, "
+                f"{patch_size:>10} bytes patch, {len(recipe)} recipe runs"
+            )
+
+        saved = total_full - total_patch
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"\n{len(paths)} workbooks, {options['changed_pages']} changed pages each\n"
+                f"Full downloads:  {total_full} bytes\n"
+                f"Patch downloads: {total_patch} bytes\n"
+                f"Saved:           {saved} bytes ({saved / total_full:.1%})\n"
+                f"Page hashing:    {hashing_time / len(paths) * 1000:.0f} ms per workbook\n"
+                f"Patch building:  {patching_time / len(paths) * 1000:.0f} ms per workbook"
+            )
+        )
@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand
+
+from core.artifacts import get_artifact
+from core.linearize import is_linearized
+from core.models import Workbook, WorkbookArtifact
+from core.pipeline import process_workbook
+from core.storage import open_stored
+
+
+class Command(BaseCommand):
+    help = (
+        "Checks that the pdf served for every workbook is linearized (see core/linearize.py). "
+        "Reports whether the uploaded pdf and the served copy are linearized."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "workbook_ids", nargs="*", type=int, help="Only check these workbooks."
+        )
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Linearize the workbooks whose served pdf isn't.",
+        )
+
+    def check(self, workbook):
+        """
+        Returns (original linearized, served linearized), None for a pdf that can't be read.
+        """
+
+        def check_file(field_file):
+            try:
+                with open_stored(field_file) as file:
+                    return is_linearized(file)
+            except Exception as e:
+                self.stdout.write(
+                    self.style.WARNING(f"Can't read {field_file.name}: {e}")
+                )
+                return None
+
+        original = check_file(workbook.pdf)
+
+        artifact = get_artifact(workbook, WorkbookArtifact.Kind.LINEARIZED_PDF)
+        if artifact is None:
+            return original, original
+        return original, check_file(artifact.file)
+
+    def handle(self, *args, **options):
+        workbooks = Workbook.objects.exclude(pdf="").order_by("id")
+        if options["workbook_ids"]:
+            workbooks = workbooks.filter(id__in=options["workbook_ids"])
+
+        not_linearized = 0
+        for workbook in workbooks:
+            original, served = self.check(workbook)
+
+            if not served and options["fix"]:
+                process_workbook(workbook.id, force=True, stages=["linearized_pdf"])
+                _, served = self.check(workbook)
+                if served:
+                    self.stdout.write(f"Workbook {workbook.id} fixed")
+                    continue
+
+            if served:
+                uploaded = "linearized" if original else "not linearized"
+                self.stdout.write(
+                    f"Workbook {workbook.id} linearized (uploaded pdf {uploaded})"
+                )
+            else:
+                not_linearized += 1
+                self.stdout.write(
+                    self.style.ERROR(f"Workbook {workbook.id} not linearized")
+                )
+
+        if not_linearized:
+            self.stdout.write(
+                self.style.ERROR(f"{not_linearized} workbook(s) not linearized")
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS("Done"))
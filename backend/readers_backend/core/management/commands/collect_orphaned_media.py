@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.mediagc import BATCH_SIZE, GRACE_PERIOD, collect_orphaned_media
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes the files under MEDIA_ROOT no workbook, artifact or upload references anymore "
+        "(see core/mediagc.py). Meant to be run periodically, e.g. daily from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="List the orphaned files without deleting them.",
+        )
+        parser.add_argument(
+            "--grace-period",
+            type=float,
+            default=GRACE_PERIOD.total_seconds() / 3600,
+            help="Only collect files older than this many hours (default %(default)s).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="Files looked up in the database per query (default %(default)s).",
+        )
+
+    def handle(self, *args, **options):
+        if options["grace_period"] < 0:
+            raise CommandError("--grace-period can't be negative")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        dry_run = options["dry_run"]
+        verb = "Would delete" if dry_run else "Deleted"
+
+        count = size = 0
+        for orphan in collect_orphaned_media(
+            grace_period=timedelta(hours=options["grace_period"]),
+            batch_size=options["batch_size"],
+            dry_run=dry_run,
+        ):
+            count += 1
+            size += orphan.size
+            self.stdout.write(f"{verb} {orphan.name} ({orphan.size} bytes)")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{verb} {count} orphaned file(s), {size} bytes")
+        )
@@ -2,6 +2,8 @@ import json
 
 from django.core.management import BaseCommand
 
+from core.pipeline import process_workbook
+from core.manifests import publish_release
 from core.models import Collection
 from core.serializers import CollectionCreateSerializer, WorkbookCreateSerializer
 from django.core.files.base import File
@@ -55,7 +57,7 @@ class Command(BaseCommand):
 
                 workbook_serializer = WorkbookCreateSerializer(data=workbook)
                 if workbook_serializer.is_valid():
-                    workbook_serializer.save()
+                    process_workbook(workbook_serializer.save().id)
                     self.stdout.write(
                         self.style.SUCCESS(f"Successfully created workbook {i}")
                     )
@@ -69,3 +71,5 @@ class Command(BaseCommand):
 
         collection_obj.is_released = True
         collection_obj.save()
+
+        publish_release(collection_obj)
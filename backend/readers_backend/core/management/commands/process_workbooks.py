@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Workbook
+from core.pipeline import STAGES, claim_stale_workbooks, process_workbook
+
+
+class Command(BaseCommand):
+    help = (
+        "Computes the derived data of workbooks (see core/pipeline.py), skipping stages already done. "
+        "By default processes every workbook that isn't ready, which backfills existing workbooks. "
+        "With --stale, only those whose processing was lost (a restart), meant to be run from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "workbook_ids", nargs="*", type=int, help="Only process these workbooks."
+        )
+        parser.add_argument(
+            "--all", action="store_true", help="Process ready workbooks too."
+        )
+        parser.add_argument(
+            "--stale",
+            action="store_true",
+            help="Only process workbooks pending or processing for longer than PIPELINE_STALE_AFTER.",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Run stages again even when their output exists.",
+        )
+        parser.add_argument(
+            "--stage",
+            action="append",
+            choices=[name for name, _, _ in STAGES],
+            help="Only run this stage (can be repeated).",
+        )
+
+    def handle(self, *args, **options):
+        workbooks = Workbook.objects.order_by("id")
+        if options["stale"]:
+            workbooks = workbooks.filter(id__in=claim_stale_workbooks())
+        elif options["workbook_ids"]:
+            workbooks = workbooks.filter(id__in=options["workbook_ids"])
+        elif not options["all"] and not options["force"]:
+            workbooks = workbooks.exclude(
+                processing_state=Workbook.ProcessingState.READY
+            )
+
+        failed = 0
+        for workbook_id in workbooks.values_list("id", flat=True):
+            state = process_workbook(
+                workbook_id, force=options["force"], stages=options["stage"]
+            )
+
+            if state == Workbook.ProcessingState.FAILED:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f"Workbook {workbook_id} failed"))
+            else:
+                self.stdout.write(f"Workbook {workbook_id} {state}")
+
+        if failed:
+            self.stdout.write(self.style.ERROR(f"{failed} workbook(s) failed"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Done"))
@@ -0,0 +1,189 @@
+"""
+Static release manifests.
+
+When a collection is released we write everything a client needs to know about it
+(collection metadata, workbooks, chapters, pdf urls, sizes and hashes) to an immutable json file under MEDIA_ROOT.
+A small latest-<localization>.json pointer references the manifest of the latest released collection.
+
+Both live next to the media, so nginx (or a CDN) can serve the catalog without Django or Postgres.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.urls import reverse
+
+from core.lite import PDF_VARIANTS
+from core.models import Collection
+
+MANIFESTS_DIR = "manifests"
+MANIFEST_FORMAT_VERSION = 1
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def _media_path(relative_path):
+    # Localizations are part of the paths, they are validated (see Collection) but nothing is written elsewhere.
+    root = os.path.realpath(os.path.join(settings.MEDIA_ROOT, MANIFESTS_DIR))
+    path = os.path.realpath(os.path.join(settings.MEDIA_ROOT, relative_path))
+    if os.path.commonpath([root, path]) != root:
+        raise SuspiciousFileOperation(f"{relative_path} is not under {MANIFESTS_DIR}/.")
+    return path
+
+
+def _media_url(relative_path):
+    return settings.MEDIA_URL + relative_path.replace(os.sep, "/")
+
+
+def _atomic_write(relative_path, data):
+    """
+    Writes the file next to its final location, then renames it over, so readers never see a partial file.
+    """
+    path = _media_path(relative_path)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def _hash_file(field_file):
+    digest = hashlib.sha256()
+    with field_file.storage.open(field_file.name, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _encode(data):
+    return json.dumps(data, sort_keys=True, separators=(",", ":")).encode()
+
+
+def pointer_path(localization):
+    return os.path.join(MANIFESTS_DIR, f"latest-{localization}.json")
+
+
+def served_pdf(workbook):
+    """
+    Returns (file, size, sha256) of the pdf downloads of the workbook serve (the standard variant, see core/lite.py):
+    the linearized copy once it's built, the pdf as uploaded until then. Uses prefetched artifacts.
+    """
+    artifacts = {artifact.kind: artifact for artifact in workbook.artifacts.all()}
+    artifact = artifacts.get(PDF_VARIANTS["standard"])
+    if artifact is not None:
+        return artifact.file, artifact.size, artifact.sha256
+    return workbook.pdf, workbook.pdf.size, workbook.sha256
+
+
+def build_manifest(collection):
+    workbooks = []
+    for workbook in collection.workbooks.prefetch_related("artifacts").order_by(
+        "number"
+    ):
+        pdf = None
+        if workbook.pdf:
+            file, size, sha256 = served_pdf(workbook)
+            # Only manifests are public media (see nginx/readers.conf), pdfs are downloaded from the api.
+            # The variant is explicit, Save-Data clients would get the lite one otherwise.
+            url = reverse("workbook-pdf", args=[workbook.id])
+            pdf = {
+                "url": f"{url}?variant=standard",
+                "size": size,
+                "sha256": sha256 or _hash_file(file),
+            }
+
+        workbooks.append(
+            {
+                "id": workbook.id,
+                "number": workbook.number,
+                "chapters": workbook.chapters,
+                "pdf": pdf,
+            }
+        )
+
+    return {
+        "format": MANIFEST_FORMAT_VERSION,
+        "collection": {
+            "id": collection.id,
+            "major_version": collection.major_version,
+            "minor_version": collection.minor_version,
+            "localization": collection.localization,
+            "creation_date": collection.creation_date.isoformat(),
+        },
+        "workbooks": workbooks,
+    }
+
+
+def write_manifest(collection):
+    """
+    Writes the manifest of a collection and returns (relative path, sha256).
+    The path contains the content hash, so an existing file is never rewritten.
+    """
+    data = _encode(build_manifest(collection))
+    sha256 = hashlib.sha256(data).hexdigest()
+
+    relative_path = os.path.join(
+        MANIFESTS_DIR,
+        collection.localization,
+        f"{collection.major_version}.{collection.minor_version}-{sha256[:16]}.json",
+    )
+
+    if not os.path.exists(_media_path(relative_path)):
+        _atomic_write(relative_path, data)
+
+    return relative_path, sha256
+
+
+def update_latest_pointer(localization, written=None):
+    """
+    Points latest-<localization>.json at the manifest of the latest released collection.
+    Removes the pointer when nothing is released anymore.
+
+    written maps collection ids to manifests (path, sha256) that were just written, to avoid building them twice.
+    Returns the collection pointed to, or None.
+    """
+    try:
+        latest = Collection.objects.filter(
+            localization=localization, is_released=True
+        ).latest()
+    except Collection.DoesNotExist:
+        try:
+            os.unlink(_media_path(pointer_path(localization)))
+        except FileNotFoundError:
+            pass
+        return None
+
+    manifest_path, sha256 = (written or {}).get(latest.id) or write_manifest(latest)
+
+    pointer = {
+        "collection_id": latest.id,
+        "major_version": latest.major_version,
+        "minor_version": latest.minor_version,
+        "localization": latest.localization,
+        "manifest": _media_url(manifest_path),
+        "sha256": sha256,
+    }
+    _atomic_write(pointer_path(localization), _encode(pointer))
+
+    return latest
+
+
+def publish_release(collection):
+    """
+    Called when a collection is released.
+    Writes its manifest and moves the pointer if it is now the latest released collection of its localization.
+    """
+    manifest = write_manifest(collection)
+    update_latest_pointer(collection.localization, written={collection.id: manifest})
+    return manifest
@@ -0,0 +1,215 @@
+"""
+Collection of orphaned media: files under MEDIA_ROOT no row points at anymore.
+
+Per instance deletes clean up after themselves (see core/signals.py), but failed uploads, rolled back transactions
+and queryset deletes (delete_all_collections) leave files behind. This is a mark and sweep run from cron
+(see the collect_orphaned_media command): the directories we own are walked with os.scandir and the files
+found are looked up in the database batch_size at a time, so memory stays bounded whatever the number of files.
+
+    blobs/              workbook pdfs and artifacts, Workbook.pdf and WorkbookArtifact.file
+    top level *.pdf     workbook pdfs stored before content addressing, Workbook.pdf
+    artifacts/          artifacts stored before they were content addressed, WorkbookArtifact.file
+    patches/            referenced while both workbooks exist and their pages are those the patch was built from,
+                        the lock files of their builds are never referenced
+    uploads/            partial files of upload sessions that haven't expired
+
+Anything else (manifests, file caches, ...) has its own lifecycle and is left alone.
+
+Files younger than the grace period are never collected: rows are committed after their file is written,
+and a reused blob gets its modification time refreshed (see core/storage.py), so a file in use is either
+referenced or recent. The time is checked again right before a delete.
+"""
+
+import os
+import re
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+
+from core.models import UploadSession, Workbook, WorkbookArtifact
+from core.patches import PATCHES_DIR, patch_name
+from core.storage import BLOBS_DIR, workbook_storage
+from core.uploads import UPLOADS_DIR, delete_expired_sessions
+
+ARTIFACTS_DIR = "artifacts"
+
+GRACE_PERIOD = timedelta(days=1)
+
+BATCH_SIZE = 1000
+
+PATCH_NAME_RE = re.compile(
+    rf"^{PATCHES_DIR}/(?P<base>\d+)-(?P<target>\d+)-[0-9a-f]{{16}}\.(pdf|json)$"
+)
+
+UPLOAD_NAME_RE = re.compile(rf"^{UPLOADS_DIR}/(?P<session>[0-9a-f-]{{36}})\.part$")
+
+
+@dataclass
+class OrphanedFile:
+    name: str
+    size: int
+
+
+def _walk(path, name, recursive):
+    """
+    Yields (name, entry) of the files under path. Names are relative to MEDIA_ROOT, with /.
+    """
+    try:
+        iterator = os.scandir(path)
+    except FileNotFoundError:
+        return
+
+    with iterator:
+        for entry in iterator:
+            entry_name = f"{name}/{entry.name}" if name else entry.name
+            if recursive and entry.is_dir(follow_symlinks=False):
+                yield from _walk(entry.path, entry_name, recursive)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry_name, entry
+
+
+def _referenced_media(names):
+    return {
+        *Workbook.objects.filter(pdf__in=names).values_list("pdf", flat=True),
+        *WorkbookArtifact.objects.filter(file__in=names).values_list("file", flat=True),
+    }
+
+
+def _referenced_patches(names):
+    matches = {name: PATCH_NAME_RE.match(name) for name in names}
+    ids = {
+        int(match.group(key))
+        for match in matches.values()
+        if match
+        for key in ("base", "target")
+    }
+    workbooks = Workbook.objects.only("id", "page_hashes").in_bulk(ids)
+
+    referenced = set()
+    for name, match in matches.items():
+        if match is None:
+            continue
+
+        base = workbooks.get(int(match.group("base")))
+        target = workbooks.get(int(match.group("target")))
+        if base is None or target is None:
+            continue
+        if base.page_hashes is None or target.page_hashes is None:
+            # Can't tell which pages the patch was built from, it stays until the workbooks are processed.
+            referenced.add(name)
+        elif name.startswith(patch_name(base, target) + "."):
+            referenced.add(name)
+
+    return referenced
+
+
+def _referenced_uploads(names):
+    matches = [UPLOAD_NAME_RE.match(name) for name in names]
+    sessions = {
+        str(session_id)
+        for session_id in UploadSession.objects.filter(
+            id__in=[match.group("session") for match in matches if match],
+            expires_at__gt=timezone.now(),
+        ).values_list("id", flat=True)
+    }
+    return {
+        match.group(0)
+        for match in matches
+        if match and match.group("session") in sessions
+    }
+
+
+def _is_legacy_pdf(name):
+    # Whatever else an operator keeps at the top of MEDIA_ROOT isn't ours.
+    return name.lower().endswith(".pdf")
+
+
+def _sweeps():
+    """
+    Returns the (directory relative to MEDIA_ROOT, recursive, owned, referenced) to walk,
+    owned(name) telling which files are ours to collect (None for all of them)
+    and referenced(names) returning which of the names are still in use.
+    """
+    sweeps = [
+        (ARTIFACTS_DIR, True, None, _referenced_media),
+        (PATCHES_DIR, True, None, _referenced_patches),
+        (UPLOADS_DIR, True, None, _referenced_uploads),
+    ]
+
+    # With S3, workbook pdfs and artifacts aren't on this disk.
+    if isinstance(workbook_storage(), FileSystemStorage):
+        sweeps += [
+            (BLOBS_DIR, True, None, _referenced_media),
+            ("", False, _is_legacy_pdf, _referenced_media),
+        ]
+
+    return sweeps
+
+
+def _candidates(directory, recursive, owned, cutoff):
+    """
+    Yields (name, size) of the files of directory that are ours, last modified before cutoff.
+    """
+    root = os.path.join(settings.MEDIA_ROOT, directory)
+
+    for name, entry in _walk(root, directory, recursive):
+        if owned is not None and not owned(name):
+            continue
+        try:
+            stat = entry.stat(follow_symlinks=False)
+        except FileNotFoundError:
+            continue
+        if stat.st_mtime < cutoff:
+            yield name, stat.st_size
+
+
+def _delete(name, cutoff):
+    path = os.path.join(settings.MEDIA_ROOT, name)
+    try:
+        # Reused (or written again) since it was found.
+        if os.stat(path).st_mtime >= cutoff:
+            return False
+        os.unlink(path)
+    except FileNotFoundError:
+        return False
+
+    return True
+
+
+def _sweep_batch(batch, referenced, cutoff, dry_run):
+    in_use = referenced(list(batch))
+    for name, size in batch.items():
+        if name in in_use:
+            continue
+        if dry_run or _delete(name, cutoff):
+            yield OrphanedFile(name, size)
+
+
+def collect_orphaned_media(
+    grace_period=GRACE_PERIOD, batch_size=BATCH_SIZE, dry_run=False
+):
+    """
+    Deletes the files under MEDIA_ROOT that nothing references and that are older than grace_period.
+    Yields an OrphanedFile for each of them as it goes, nothing is deleted in a dry run.
+    """
+    if not os.path.isdir(settings.MEDIA_ROOT):
+        return
+
+    if not dry_run:
+        delete_expired_sessions()
+
+    cutoff = time.time() - grace_period.total_seconds()
+
+    for directory, recursive, owned, referenced in _sweeps():
+        batch = {}
+        for name, size in _candidates(directory, recursive, owned, cutoff):
+            batch[name] = size
+            if len(batch) >= batch_size:
+                yield from _sweep_batch(batch, referenced, cutoff, dry_run)
+                batch = {}
+        if batch:
+            yield from _sweep_batch(batch, referenced, cutoff, dry_run)
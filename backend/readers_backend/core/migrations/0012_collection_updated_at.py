@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_feedback_logs"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="collection",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0013_catalogchange"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="workbook",
+            name="page_hashes",
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
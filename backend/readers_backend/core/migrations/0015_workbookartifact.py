@@ -0,0 +1,49 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0014_workbook_page_hashes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WorkbookArtifact",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("search_index", "Search Index")], max_length=32
+                    ),
+                ),
+                ("file", models.FileField(upload_to="artifacts/")),
+                ("size", models.BigIntegerField()),
+                ("sha256", models.CharField(max_length=64)),
+                ("created_at", models.DateTimeField(auto_now=True)),
+                (
+                    "workbook",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="artifacts",
+                        to="core.workbook",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("workbook", "kind")},
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0015_workbookartifact"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="workbookartifact",
+            name="kind",
+            field=models.CharField(
+                choices=[
+                    ("search_index", "Search Index"),
+                    ("word_index", "Word Index"),
+                ],
+                max_length=32,
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:31
+
+import core.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0016_alter_workbookartifact_kind"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="feedback",
+            name="logs",
+            field=core.fields.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="workbook",
+            name="chapters",
+            field=core.fields.JSONField(),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:44
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0017_fast_json_fields"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="workbook",
+            name="sha256",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=64
+            ),
+        ),
+        migrations.AlterField(
+            model_name="workbook",
+            name="pdf",
+            field=models.FileField(storage=core.storage.workbook_storage, upload_to=""),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0019_uploadsession"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="workbook",
+            name="processing_state",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("processing", "Processing"),
+                    ("ready", "Ready"),
+                    ("failed", "Failed"),
+                ],
+                default="pending",
+                editable=False,
+                max_length=16,
+            ),
+        ),
+    ]
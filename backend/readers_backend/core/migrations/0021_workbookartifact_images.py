@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2026-10-18 20:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0020_workbook_processing_state"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="workbookartifact",
+            name="metadata",
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="workbookartifact",
+            name="kind",
+            field=models.CharField(
+                choices=[
+                    ("search_index", "Search Index"),
+                    ("word_index", "Word Index"),
+                    ("cover_small", "Cover Small"),
+                    ("cover_medium", "Cover Medium"),
+                    ("cover_large", "Cover Large"),
+                    ("page_thumbnails", "Page Thumbnails"),
+                ],
+                max_length=32,
+            ),
+        ),
+    ]
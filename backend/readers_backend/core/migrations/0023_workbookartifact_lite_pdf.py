@@ -0,0 +1,30 @@
+# Generated by Django 5.1.6 on 2026-10-18 20:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0022_workbookartifact_linearized_pdf"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="workbookartifact",
+            name="kind",
+            field=models.CharField(
+                choices=[
+                    ("search_index", "Search Index"),
+                    ("word_index", "Word Index"),
+                    ("cover_small", "Cover Small"),
+                    ("cover_medium", "Cover Medium"),
+                    ("cover_large", "Cover Large"),
+                    ("page_thumbnails", "Page Thumbnails"),
+                    ("linearized_pdf", "Linearized Pdf"),
+                    ("lite_pdf", "Lite Pdf"),
+                ],
+                max_length=32,
+            ),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.6 on 2026-10-18 20:54
+
+import core.storage
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+
+def copy_artifacts_to_workbook_storage(apps, schema_editor):
+    # Artifacts were in the default storage. On the local disk both storages are MEDIA_ROOT and nothing moves,
+    # with S3 the files are copied to the bucket (under their content hash).
+    WorkbookArtifact = apps.get_model("core", "WorkbookArtifact")
+    storage = core.storage.workbook_storage()
+
+    for artifact in WorkbookArtifact.objects.exclude(file="").iterator():
+        name = artifact.file.name
+        if storage.exists(name) or not default_storage.exists(name):
+            continue
+
+        with default_storage.open(name, "rb") as file:
+            artifact.file.name = storage.save(name, file)
+        artifact.save(update_fields=["file"])
+        default_storage.delete(name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0023_workbookartifact_lite_pdf"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="workbookartifact",
+            name="file",
+            field=models.FileField(
+                storage=core.storage.workbook_storage, upload_to="artifacts/"
+            ),
+        ),
+        migrations.RunPython(
+            copy_artifacts_to_workbook_storage, migrations.RunPython.noop
+        ),
+    ]
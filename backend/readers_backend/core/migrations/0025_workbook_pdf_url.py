@@ -0,0 +1,22 @@
+# Generated by Django 5.1.6 on 2026-10-18 21:07
+
+import core.fields
+import core.storage
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0024_workbookartifact_workbook_storage"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="workbook",
+            name="pdf",
+            field=core.fields.WorkbookPdfField(
+                storage=core.storage.workbook_storage, upload_to=""
+            ),
+        ),
+    ]
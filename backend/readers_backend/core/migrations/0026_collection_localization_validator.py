@@ -0,0 +1,27 @@
+# Generated by Django 5.1.6 on 2026-10-18 21:36
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0025_workbook_pdf_url"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="collection",
+            name="localization",
+            field=models.TextField(
+                max_length=5,
+                validators=[
+                    django.core.validators.RegexValidator(
+                        "^[a-z]{2}[-_][A-Z]{2}$",
+                        "Must be a language and a country code, e.g. en-US.",
+                    )
+                ],
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+def reset_page_hashes(apps, schema_editor):
+    # Page hashes now cover the decoded content of streams, stored ones wouldn't match new ones.
+    # They are computed again when a patch needs them, or by the process_workbooks command.
+    Workbook = apps.get_model("core", "Workbook")
+    Workbook.objects.update(page_hashes=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0026_collection_localization_validator"),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_page_hashes, migrations.RunPython.noop),
+    ]
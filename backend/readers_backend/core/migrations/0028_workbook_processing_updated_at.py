@@ -0,0 +1,21 @@
+# Generated by Django 5.1.6 on 2026-10-18 21:43
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0027_reset_page_hashes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="workbook",
+            name="processing_updated_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, editable=False
+            ),
+        ),
+    ]
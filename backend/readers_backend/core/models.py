@@ -1,12 +1,25 @@
+import uuid
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+from core.fields import JSONField, WorkbookPdfField
+from core.storage import sha256_from_name, workbook_storage
+from core.validators import validate_localization
 
 
 class Collection(models.Model):
     major_version = models.IntegerField(blank=False, null=False)
     minor_version = models.IntegerField(blank=False, null=False)
-    localization = models.TextField(blank=False, null=False, max_length=5)
+    localization = models.TextField(
+        blank=False, null=False, max_length=5, validators=[validate_localization]
+    )
     is_released = models.BooleanField(default=False)
     creation_date = models.DateTimeField(auto_now_add=True, blank=False, null=False)
+    # Bumped whenever the collection or one of its workbooks changes.
+    # Used for conditional requests (ETag / Last-Modified).
+    updated_at = models.DateTimeField(auto_now=True, blank=False, null=False)
 
     class Meta:
         unique_together = ("major_version", "minor_version", "localization")
@@ -19,15 +32,42 @@ class Collection(models.Model):
     def __str__(self):
         return f"{self.localization} {self.major_version}.{self.minor_version}"
 
+    @classmethod
+    def touch(cls, pk):
+        """
+        Marks a collection as changed without running save() (and its signals) again.
+        """
+        cls.objects.filter(pk=pk).update(updated_at=timezone.now())
+
 
 # Create your models here.
 class Workbook(models.Model):
+    class ProcessingState(models.TextChoices):
+        # Derived data (hashes, indexes, ...) is computed after upload, see core/pipeline.py.
+        PENDING = "pending"
+        PROCESSING = "processing"
+        READY = "ready"
+        FAILED = "failed"
+
     number = models.IntegerField(blank=False, null=False)
     collection = models.ForeignKey(
         Collection, on_delete=models.CASCADE, related_name="workbooks"
     )
-    chapters = models.JSONField(blank=False, null=False)
-    pdf = models.FileField(blank=False, null=False)
+    chapters = JSONField(blank=False, null=False)
+    # Content addressed, workbooks with the same pdf share one file.
+    pdf = WorkbookPdfField(blank=False, null=False, storage=workbook_storage)
+    sha256 = models.CharField(max_length=64, blank=True, editable=False, db_index=True)
+    # Content hash of every page of the pdf, computed after upload (see core/pipeline.py).
+    # Used to build page level patches between workbook versions.
+    page_hashes = models.JSONField(blank=True, null=True, editable=False)
+    processing_state = models.CharField(
+        max_length=16,
+        choices=ProcessingState.choices,
+        default=ProcessingState.PENDING,
+        editable=False,
+    )
+    # When the processing state last changed, finds workbooks whose processing was lost (see core/pipeline.py).
+    processing_updated_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         unique_together = ("number", "collection")
@@ -36,6 +76,95 @@ class Workbook(models.Model):
     def __str__(self):
         return f"Workbook {self.number} of {self.collection}"
 
+    def save(self, *args, **kwargs):
+        # Stored now rather than in pre_save, the hash is known from the blob name (see core/storage.py).
+        if self.pdf and not self.pdf._committed:
+            self.pdf.save(self.pdf.name, self.pdf.file, save=False)
+
+        sha256 = sha256_from_name(self.pdf.name)
+        if sha256 and sha256 != self.sha256:
+            self.sha256 = sha256
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "sha256"}
+
+        super().save(*args, **kwargs)
+
+
+class WorkbookArtifact(models.Model):
+    """
+    A file derived from a workbook pdf after upload (see core/pipeline.py), one per kind and workbook.
+    """
+
+    class Kind(models.TextChoices):
+        SEARCH_INDEX = "search_index"
+        WORD_INDEX = "word_index"
+        # Images, see core/thumbnails.py.
+        COVER_SMALL = "cover_small"
+        COVER_MEDIUM = "cover_medium"
+        COVER_LARGE = "cover_large"
+        PAGE_THUMBNAILS = "page_thumbnails"
+        # Served instead of the uploaded pdf, see core/linearize.py.
+        LINEARIZED_PDF = "linearized_pdf"
+        # Smaller variant for slow connections, see core/lite.py.
+        LITE_PDF = "lite_pdf"
+
+    workbook = models.ForeignKey(
+        Workbook, on_delete=models.CASCADE, related_name="artifacts"
+    )
+    kind = models.CharField(max_length=32, choices=Kind.choices)
+    # Next to the pdfs, content addressed too: served the same way (redirects with S3) and shared by identical pdfs.
+    file = models.FileField(upload_to="artifacts/", storage=workbook_storage)
+    size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    # Whatever clients need to use the file (e.g. image sizes), depends on the kind.
+    metadata = models.JSONField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("workbook", "kind")
+
+    def __str__(self):
+        return f"{self.kind} of {self.workbook}"
+
+
+def delete_unreferenced_file(name):
+    """
+    Deletes a workbook pdf or artifact file unless a workbook or artifact still uses it
+    (files are shared, see core/storage.py).
+    """
+    if not name:
+        return
+
+    if (
+        not Workbook.objects.filter(pdf=name).exists()
+        and not WorkbookArtifact.objects.filter(file=name).exists()
+    ):
+        workbook_storage().delete(name)
+
+
+class UploadSession(models.Model):
+    """
+    A resumable workbook upload (see core/uploads.py).
+    Holds the workbook until its pdf is complete, the received bytes are in a partial file on disk.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    collection = models.ForeignKey(
+        Collection, on_delete=models.CASCADE, related_name="upload_sessions"
+    )
+    number = models.IntegerField()
+    chapters = JSONField()
+    filename = models.CharField(max_length=255)
+    # Size of the whole pdf, and how much of it was received.
+    length = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Upload of workbook {self.number} of {self.collection}"
+
 
 # Feedback Model
 class Feedback(models.Model):
@@ -48,7 +177,38 @@ class Feedback(models.Model):
     major_version = models.IntegerField(blank=False, null=False)
     minor_version = models.IntegerField(blank=False, null=False)
     localization = models.CharField(max_length=5, blank=False, null=False)
-    logs = models.JSONField(blank=True, null=True)
+    logs = JSONField(blank=True, null=True)
 
     def __str__(self):
         return f"Feedback on Workbook {self.workbook.number} v{self.major_version}.{self.minor_version} - Chapter {self.chapter_number} - Page {self.page_number}"
+
+
+class CatalogChange(models.Model):
+    """
+    Append only log of changes to collections and workbooks, filled by signals (see core/signals.py).
+    Backs the sync endpoint, the id doubles as the sync token handed to clients.
+    """
+
+    class Kind(models.TextChoices):
+        COLLECTION = "collection"
+        WORKBOOK = "workbook"
+
+    class Action(models.TextChoices):
+        CREATED = "created"
+        UPDATED = "updated"
+        RELEASED = "released"
+        UNRELEASED = "unreleased"
+        DELETED = "deleted"
+
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    action = models.CharField(max_length=10, choices=Action.choices)
+    # Not foreign keys, deleted objects keep their log entries.
+    object_id = models.BigIntegerField()
+    collection_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["id"]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} {self.action}"
@@ -0,0 +1,92 @@
+"""
+Page level patches between two versions of a workbook.
+
+A patch is a pdf holding only the pages of the target workbook that are not in the base workbook,
+plus a recipe to reassemble the target from the base and the patch (see core.pdf.build_patch).
+Patches are built on first request and kept in storage, named after the page hashes of both pdfs.
+Concurrent first requests for the same patch build it once: builds take an exclusive flock on a lock file
+next to it (as core/filecache.py fills do), stale lock files are collected with orphaned media (see core/mediagc.py).
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from core.filecache import LOCK_PREFIX
+from core.ingest import compute_page_hashes
+from core.pdf import build_patch
+from core.storage import open_stored
+
+PATCHES_DIR = "patches"
+
+
+def _pages_digest(workbook):
+    if workbook.page_hashes is None:
+        compute_page_hashes(workbook)
+    return hashlib.sha256("".join(workbook.page_hashes).encode()).hexdigest()
+
+
+def patch_name(base, target):
+    digest = hashlib.sha256(
+        (_pages_digest(base) + _pages_digest(target)).encode()
+    ).hexdigest()
+    return f"{PATCHES_DIR}/{base.id}-{target.id}-{digest[:16]}"
+
+
+def get_or_create_patch(base, target):
+    """
+    Returns the patch description to go from base to target:
+    {"recipe": [...], "pdf": name of the patch pdf in storage (None if no page changed), "size": ..., "sha256": ...}
+    """
+    # Not the workbook storage, patches are looked up by name.
+    storage = default_storage
+    name = patch_name(base, target)
+    description_name = f"{name}.json"
+
+    if storage.exists(description_name):
+        return _read_description(storage, description_name)
+
+    lock_path = storage.path(
+        os.path.join(PATCHES_DIR, LOCK_PREFIX + name.split("/")[-1])
+    )
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            # Built while we waited.
+            if storage.exists(description_name):
+                return _read_description(storage, description_name)
+
+            # Recently used, so it isn't collected as stale.
+            os.utime(lock_path)
+            return _build(storage, name, base, target)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _read_description(storage, description_name):
+    with storage.open(description_name, "rb") as file:
+        return json.load(file)
+
+
+def _build(storage, name, base, target):
+    with open_stored(target.pdf) as file:
+        recipe, patch = build_patch(base.page_hashes, file)
+
+    description = {"recipe": recipe, "pdf": None, "size": 0, "sha256": None}
+
+    if patch is not None:
+        # Left by a build that didn't finish, saving next to it would get another name.
+        storage.delete(f"{name}.pdf")
+        description["pdf"] = storage.save(f"{name}.pdf", ContentFile(patch))
+        description["size"] = len(patch)
+        description["sha256"] = hashlib.sha256(patch).hexdigest()
+
+    # Written last, its presence means the patch is complete.
+    storage.save(f"{name}.json", ContentFile(json.dumps(description).encode()))
+
+    return description
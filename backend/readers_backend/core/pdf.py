@@ -0,0 +1,137 @@
+"""
+Helpers for working with workbook pdfs (built on pypdf).
+"""
+
+import hashlib
+import io
+
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import (
+    ArrayObject,
+    DictionaryObject,
+    IndirectObject,
+    StreamObject,
+)
+
+# Keys that point back up the document tree (or are otherwise not part of what a page looks like).
+# Following them would hash the whole document into every page.
+IGNORED_PAGE_KEYS = {"/Parent", "/P", "/StructParents", "/Dest"}
+
+
+def open_pdf(file):
+    """
+    Opens a pdf from a path, a file like object or a django File.
+    """
+    if hasattr(file, "seek"):
+        file.seek(0)
+    return PdfReader(file)
+
+
+def _digest_object(obj, digest, seen):
+    if isinstance(obj, IndirectObject):
+        key = (obj.idnum, obj.generation)
+
+        # Shared objects (fonts, images) are hashed once per page, cycles are cut short.
+        if key in seen:
+            digest.update(b"@%d" % seen[key])
+            return
+
+        seen[key] = len(seen)
+        obj = obj.get_object()
+
+    if isinstance(obj, StreamObject):
+        digest.update(b"S")
+        _digest_dictionary(obj, digest, seen)
+        digest.update(_stream_data(obj))
+    elif isinstance(obj, DictionaryObject):
+        _digest_dictionary(obj, digest, seen)
+    elif isinstance(obj, ArrayObject):
+        digest.update(b"[")
+        for item in obj:
+            _digest_object(item, digest, seen)
+        digest.update(b"]")
+    else:
+        digest.update(type(obj).__name__.encode())
+        digest.update(repr(obj).encode())
+
+    digest.update(b";")
+
+
+def _stream_data(obj):
+    try:
+        return obj.get_data()
+    except Exception:
+        # Filters pypdf can't decode (e.g. JBIG2 without jbig2dec): the stream as written, object numbers included.
+        # At worst the page doesn't match the same page of another file, it never matches a different one.
+        buffer = io.BytesIO()
+        obj.write_to_stream(buffer)
+        return buffer.getvalue()
+
+
+def _digest_dictionary(obj, digest, seen):
+    digest.update(b"{")
+    for key in sorted(obj.keys()):
+        if key in IGNORED_PAGE_KEYS:
+            continue
+        digest.update(key.encode())
+        _digest_object(obj.raw_get(key), digest, seen)
+    digest.update(b"}")
+
+
+def page_hash(page):
+    """
+    A content hash of a single page: its content streams and everything they use (fonts, images, ...).
+    It does not depend on object numbers, so the same page in two different files hashes the same.
+    """
+    digest = hashlib.sha256()
+    _digest_object(page, digest, {})
+    return digest.hexdigest()
+
+
+def page_hashes(file):
+    return [page_hash(page) for page in open_pdf(file).pages]
+
+
+def build_patch(base_hashes, target_file):
+    """
+    Builds the patch to go from a base pdf to the target pdf.
+
+    Returns (recipe, patch_pdf_bytes). The patch pdf only holds the pages of the target
+    that are not in the base. The recipe lists runs of pages to take in order, either
+    from the base or from the patch, to reassemble the target:
+        [{"source": "base", "start": 0, "count": 12}, {"source": "patch", "start": 0, "count": 1}, ...]
+    """
+    base_index = {}
+    for index, digest in enumerate(base_hashes):
+        base_index.setdefault(digest, index)
+
+    reader = open_pdf(target_file)
+    writer = PdfWriter()
+
+    recipe = []
+    for page in reader.pages:
+        digest = page_hash(page)
+
+        if digest in base_index:
+            source, start = "base", base_index[digest]
+        else:
+            source, start = "patch", len(writer.pages)
+            writer.add_page(page)
+
+        previous = recipe[-1] if recipe else None
+        if (
+            previous
+            and previous["source"] == source
+            and previous["start"] + previous["count"] == start
+        ):
+            previous["count"] += 1
+        else:
+            recipe.append({"source": source, "start": start, "count": 1})
+
+    if not writer.pages:
+        return recipe, None
+
+    writer.compress_identical_objects()
+    output = io.BytesIO()
+    writer.write(output)
+    return recipe, output.getvalue()
@@ -0,0 +1,222 @@
+"""
+Processing of uploaded workbooks.
+
+Everything we derive from a workbook pdf (hash, page hashes, search and word indexes, ...) is computed once the
+workbook is committed, in a local process pool, so uploads don't wait for it and pdf parsing doesn't hold the GIL
+of the web process. Workbook.processing_state tells clients where it's at.
+
+Stages are idempotent: a stage whose output already exists is skipped unless forced, so processing can be
+re-run at any time (see the process_workbooks command, which also backfills existing workbooks).
+
+Jobs only live in the pool of the web process, a restart drops those queued or running. Workbooks left pending
+or processing for longer than PIPELINE_STALE_AFTER are picked up again by process_workbooks --stale, run from cron.
+"""
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from functools import partial
+
+import django
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from core.cache import bump_catalog_generation
+from core.ingest import compute_page_hashes, compute_sha256
+from core.linearize import linearize_workbook
+from core.lite import make_lite_workbook
+from core.manifests import publish_release
+from core.models import CatalogChange, Collection, Workbook, WorkbookArtifact
+from core.search import index_workbook
+from core.signals import log_catalog_change
+from core.thumbnails import COVER_WIDTHS, render_covers, render_page_thumbnails
+from core.wordindex import index_workbook_words
+
+logger = logging.getLogger(__name__)
+
+
+def _has_artifacts(*kinds):
+    def is_done(workbook):
+        return workbook.artifacts.filter(kind__in=kinds).count() == len(kinds)
+
+    return is_done
+
+
+# (name, is done, run), in order.
+STAGES = [
+    ("sha256", lambda workbook: bool(workbook.sha256), compute_sha256),
+    (
+        "page_hashes",
+        lambda workbook: workbook.page_hashes is not None,
+        compute_page_hashes,
+    ),
+    (
+        "search_index",
+        _has_artifacts(WorkbookArtifact.Kind.SEARCH_INDEX),
+        index_workbook,
+    ),
+    (
+        "word_index",
+        _has_artifacts(WorkbookArtifact.Kind.WORD_INDEX),
+        index_workbook_words,
+    ),
+    (
+        "linearized_pdf",
+        _has_artifacts(WorkbookArtifact.Kind.LINEARIZED_PDF),
+        linearize_workbook,
+    ),
+    ("lite_pdf", _has_artifacts(WorkbookArtifact.Kind.LITE_PDF), make_lite_workbook),
+    ("covers", _has_artifacts(*COVER_WIDTHS), render_covers),
+    (
+        "page_thumbnails",
+        _has_artifacts(WorkbookArtifact.Kind.PAGE_THUMBNAILS),
+        render_page_thumbnails,
+    ),
+]
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _set_state(workbook, state):
+    # Derived data, not a change clients need to hear about, so signals are skipped.
+    Workbook.objects.filter(pk=workbook.pk).update(
+        processing_state=state, processing_updated_at=timezone.now()
+    )
+    workbook.processing_state = state
+
+
+def process_workbook(workbook_id, force=False, stages=None):
+    """
+    Runs the stages (all by default) that aren't done yet, or all of them when forced.
+    A stage that fails is logged and doesn't stop the others, the workbook then ends up failed.
+    Returns the final processing state, None if the workbook is gone.
+    """
+    workbook = Workbook.objects.filter(pk=workbook_id).first()
+    if workbook is None or not workbook.pdf:
+        return None
+
+    _set_state(workbook, Workbook.ProcessingState.PROCESSING)
+
+    state = Workbook.ProcessingState.READY
+    for name, is_done, run in STAGES:
+        if stages is not None and name not in stages:
+            continue
+        if not force and is_done(workbook):
+            continue
+
+        try:
+            run(workbook)
+        except Exception as e:
+            logger.warning(f"Processing stage {name} failed for {workbook}: {e}")
+            state = Workbook.ProcessingState.FAILED
+
+    _set_state(workbook, state)
+    # The workbook (state, artifacts) changed, clients revalidate against its collection and pick it up on sync.
+    Collection.touch(workbook.collection_id)
+    log_catalog_change(
+        CatalogChange.Kind.WORKBOOK,
+        CatalogChange.Action.UPDATED,
+        workbook.id,
+        workbook.collection_id,
+    )
+    # The manifest of a released collection describes the pdfs downloads serve, which may have just been built.
+    collection = Collection.objects.get(id=workbook.collection_id)
+    if collection.is_released:
+        publish_release(collection)
+
+    return state
+
+
+def _process_in_worker(workbook_id):
+    close_old_connections()
+    try:
+        return process_workbook(workbook_id)
+    finally:
+        close_old_connections()
+
+
+def get_executor():
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            # Workers are spawned, not forked, they share nothing (connections, locks) with the web process.
+            # They set django up before importing this module, which needs the models.
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.PIPELINE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=django.setup,
+            )
+        return _executor
+
+
+def _reset_executor():
+    global _executor
+
+    with _executor_lock:
+        _executor = None
+
+
+def _on_done(workbook_id, future):
+    try:
+        future.result()
+    except BrokenProcessPool as e:
+        # A crashed worker breaks the whole pool, the next submit starts a new one.
+        logger.error(f"Processing workbook {workbook_id} failed: {e}")
+        _reset_executor()
+        return
+    except Exception as e:
+        logger.error(f"Processing workbook {workbook_id} failed: {e}")
+        return
+
+    # Back in the web process, whose catalog cache (per process) may hold the workbook.
+    bump_catalog_generation()
+
+
+def _submit(workbook_id):
+    if settings.PIPELINE_WORKERS == 0:
+        process_workbook(workbook_id)
+        bump_catalog_generation()
+        return
+
+    try:
+        future = get_executor().submit(_process_in_worker, workbook_id)
+    except BrokenProcessPool:
+        _reset_executor()
+        future = get_executor().submit(_process_in_worker, workbook_id)
+    future.add_done_callback(partial(_on_done, workbook_id))
+
+
+def claim_stale_workbooks():
+    """
+    Returns the ids of the workbooks left pending or processing for longer than PIPELINE_STALE_AFTER,
+    their processing was lost with the process running it. Each is claimed (its time bumped) by a single caller.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.PIPELINE_STALE_AFTER)
+    stale = Workbook.objects.filter(
+        processing_state__in=[
+            Workbook.ProcessingState.PENDING,
+            Workbook.ProcessingState.PROCESSING,
+        ],
+        processing_updated_at__lt=cutoff,
+    )
+
+    claimed = []
+    for workbook_id in stale.order_by("id").values_list("id", flat=True):
+        if Workbook.objects.filter(
+            pk=workbook_id, processing_updated_at__lt=cutoff
+        ).update(processing_updated_at=timezone.now()):
+            claimed.append(workbook_id)
+    return claimed
+
+
+def schedule_processing(workbook):
+    """
+    Processes the workbook once the current transaction commits (right away outside of one).
+    """
+    transaction.on_commit(partial(_submit, workbook.pk), robust=True)
@@ -0,0 +1,37 @@
+from rest_framework import parsers, renderers
+from rest_framework.exceptions import ParseError
+
+from core import fastjson
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """
+    Renders with core.fastjson (orjson when installed).
+    Output matches DRF's compact, unicode JSON. Types orjson doesn't know (and datetimes) go through DRF's encoder.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        # Indented output (application/json; indent=4) is rare, DRF handles it.
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if fastjson.orjson is None or indent:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        return fastjson.dumps(data, default=self.encoder_class().default)
+
+
+class JSONParser(parsers.JSONParser):
+    """
+    Parses request bodies with core.fastjson (orjson when installed).
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if fastjson.orjson is None:
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return fastjson.loads(stream.read())
+        except ValueError as exc:
+            raise ParseError("JSON parse error - %s" % str(exc))
@@ -0,0 +1,432 @@
+"""
+Server side full text search over workbook pdfs.
+
+At ingest the text of every page is extracted and turned into a compact inverted index (term -> page postings),
+stored as a workbook artifact. Queries memory map the index and binary search its sorted term table,
+so nothing is parsed or loaded up front and a query only touches the pages of the file it needs.
+
+Index layout (little endian, version 1):
+
+    header      magic "KRSI", version u16, reserved u16, page count u32, term count u32,
+                page table offset u64, term table offset u64, term blob offset u64
+    page table  per page: text offset u64, text length u32 (bytes), token count u32
+    term table  per term, sorted by utf-8 bytes: blob offset u32, length u16, page count u32,
+                postings offset u64, postings length u32
+    term blob   utf-8 terms
+    postings    per page: page delta, term frequency, then per occurrence: start delta, length (all varints,
+                offsets are characters in the page text)
+    texts       utf-8 page texts, used for snippets
+"""
+
+import math
+import mmap
+import re
+import struct
+import threading
+from bisect import bisect_right
+from collections import OrderedDict, defaultdict
+
+from core.artifacts import get_artifact, save_artifact
+from core.models import WorkbookArtifact
+from core.pdf import open_pdf
+from core.storage import open_stored
+
+MAGIC = b"KRSI"
+VERSION = 1
+
+HEADER = struct.Struct("<4sHHIIQQQ")
+PAGE_ENTRY = struct.Struct("<QII")
+TERM_ENTRY = struct.Struct("<IHIQI")
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# BM25 parameters.
+K1 = 1.2
+B = 0.75
+
+SNIPPET_CONTEXT = 60
+
+# Opened (memory mapped) indexes kept around per process.
+MAX_OPEN_INDEXES = 64
+
+
+def normalize(token):
+    return token.casefold()
+
+
+def tokenize(text):
+    """
+    Yields (term, start, length) for every word in the text, offsets are in characters.
+    """
+    for match in TOKEN_RE.finditer(text):
+        yield normalize(match.group()), match.start(), match.end() - match.start()
+
+
+def encode_varint(value, output):
+    while value >= 0x80:
+        output.append((value & 0x7F) | 0x80)
+        value >>= 7
+    output.append(value)
+
+
+def decode_varint(buffer, position):
+    result = 0
+    shift = 0
+    while True:
+        byte = buffer[position]
+        position += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, position
+        shift += 7
+
+
+def extract_page_texts(file):
+    return [page.extract_text() or "" for page in open_pdf(file).pages]
+
+
+def build_index(page_texts):
+    """
+    Builds the binary index (bytes) for a list of page texts.
+    """
+    # term -> page -> [(start, length)]
+    postings = defaultdict(lambda: defaultdict(list))
+    token_counts = []
+
+    for page, text in enumerate(page_texts):
+        count = 0
+        for term, start, length in tokenize(text):
+            postings[term][page].append((start, length))
+            count += 1
+        token_counts.append(count)
+
+    encoded_texts = [text.encode() for text in page_texts]
+    terms = sorted(postings, key=lambda term: term.encode())
+
+    term_blob = bytearray()
+    postings_blob = bytearray()
+    term_entries = []
+
+    for term in terms:
+        encoded = term.encode()
+        pages = postings[term]
+
+        encoded_postings = bytearray()
+        previous_page = 0
+        for page in sorted(pages):
+            occurrences = pages[page]
+            encode_varint(page - previous_page, encoded_postings)
+            encode_varint(len(occurrences), encoded_postings)
+            previous_page = page
+
+            previous_start = 0
+            for start, length in occurrences:
+                encode_varint(start - previous_start, encoded_postings)
+                encode_varint(length, encoded_postings)
+                previous_start = start
+
+        term_entries.append(
+            (
+                len(term_blob),
+                len(encoded),
+                len(pages),
+                len(postings_blob),
+                len(encoded_postings),
+            )
+        )
+        term_blob += encoded
+        postings_blob += encoded_postings
+
+    page_table_offset = HEADER.size
+    term_table_offset = page_table_offset + PAGE_ENTRY.size * len(page_texts)
+    term_blob_offset = term_table_offset + TERM_ENTRY.size * len(terms)
+    postings_offset = term_blob_offset + len(term_blob)
+    texts_offset = postings_offset + len(postings_blob)
+
+    output = bytearray(
+        HEADER.pack(
+            MAGIC,
+            VERSION,
+            0,
+            len(page_texts),
+            len(terms),
+            page_table_offset,
+            term_table_offset,
+            term_blob_offset,
+        )
+    )
+
+    text_offset = texts_offset
+    for encoded, count in zip(encoded_texts, token_counts):
+        output += PAGE_ENTRY.pack(text_offset, len(encoded), count)
+        text_offset += len(encoded)
+
+    for (
+        blob_offset,
+        length,
+        page_count,
+        relative_offset,
+        postings_length,
+    ) in term_entries:
+        output += TERM_ENTRY.pack(
+            blob_offset,
+            length,
+            page_count,
+            postings_offset + relative_offset,
+            postings_length,
+        )
+
+    output += term_blob
+    output += postings_blob
+    for encoded in encoded_texts:
+        output += encoded
+
+    return bytes(output)
+
+
+class SearchIndex:
+    """
+    Read only view over an index file (or bytes).
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+        (
+            magic,
+            version,
+            _,
+            self.page_count,
+            self.term_count,
+            self.page_table_offset,
+            self.term_table_offset,
+            self.term_blob_offset,
+        ) = HEADER.unpack_from(buffer, 0)
+
+        if magic != MAGIC:
+            raise ValueError("Not a search index.")
+        if version != VERSION:
+            raise ValueError(f"Unsupported search index version {version}.")
+
+        self.pages = [
+            PAGE_ENTRY.unpack_from(
+                buffer, self.page_table_offset + PAGE_ENTRY.size * page
+            )
+            for page in range(self.page_count)
+        ]
+        total_tokens = sum(token_count for _, _, token_count in self.pages)
+        self.average_page_length = (
+            total_tokens / self.page_count if self.page_count else 0
+        )
+
+    @classmethod
+    def open(cls, path):
+        with open(path, "rb") as file:
+            return cls(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def _term_entry(self, index):
+        return TERM_ENTRY.unpack_from(
+            self.buffer, self.term_table_offset + TERM_ENTRY.size * index
+        )
+
+    def _term_at(self, index):
+        blob_offset, length, *_ = self._term_entry(index)
+        start = self.term_blob_offset + blob_offset
+        return self.buffer[start : start + length]
+
+    def lookup(self, term):
+        """
+        Returns {page: [(start, length), ...]} for a normalized term.
+        """
+        encoded = term.encode()
+
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._term_at(middle) < encoded:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low == self.term_count or self._term_at(low) != encoded:
+            return {}
+
+        _, _, page_count, postings_offset, postings_length = self._term_entry(low)
+
+        postings = {}
+        position = postings_offset
+        page = 0
+        for _ in range(page_count):
+            page_delta, position = decode_varint(self.buffer, position)
+            frequency, position = decode_varint(self.buffer, position)
+            page += page_delta
+
+            occurrences = []
+            start = 0
+            for _ in range(frequency):
+                start_delta, position = decode_varint(self.buffer, position)
+                length, position = decode_varint(self.buffer, position)
+                start += start_delta
+                occurrences.append((start, length))
+
+            postings[page] = occurrences
+
+        return postings
+
+    def page_text(self, page):
+        offset, length, _ = self.pages[page]
+        return bytes(self.buffer[offset : offset + length]).decode()
+
+    def search(self, query, limit=20):
+        """
+        Ranks pages with BM25 over the query terms.
+        Returns [(page, score, [(start, length), ...])] best first, pages are 0 based.
+        """
+        terms = list(dict.fromkeys(term for term, _, _ in tokenize(query)))
+
+        scores = defaultdict(float)
+        matches = defaultdict(list)
+
+        for term in terms:
+            postings = self.lookup(term)
+            if not postings:
+                continue
+
+            idf = math.log(
+                1 + (self.page_count - len(postings) + 0.5) / (len(postings) + 0.5)
+            )
+
+            for page, occurrences in postings.items():
+                frequency = len(occurrences)
+                page_length = self.pages[page][2]
+                normalization = (
+                    1 - B + B * page_length / (self.average_page_length or 1)
+                )
+                scores[page] += (
+                    idf * frequency * (K1 + 1) / (frequency + K1 * normalization)
+                )
+                matches[page].extend(occurrences)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [(page, score, sorted(matches[page])) for page, score in ranked]
+
+    def snippet(self, page, occurrences):
+        """
+        Returns (snippet, [(start, length), ...]) around the first match, highlight offsets are relative to the snippet.
+        """
+        text = self.page_text(page)
+        first_start = occurrences[0][0]
+
+        start = max(first_start - SNIPPET_CONTEXT, 0)
+        end = min(first_start + SNIPPET_CONTEXT, len(text))
+
+        highlights = [
+            (occurrence_start - start, length)
+            for occurrence_start, length in occurrences
+            if occurrence_start >= start and occurrence_start + length <= end
+        ]
+
+        return text[start:end], highlights
+
+
+_open_indexes = OrderedDict()
+_open_indexes_lock = threading.Lock()
+
+
+def open_index(path, version):
+    """
+    Returns a memory mapped index, reusing it between requests.
+    version (e.g. the artifact hash) makes sure a rebuilt index is reopened.
+    """
+    key = (path, version)
+
+    with _open_indexes_lock:
+        index = _open_indexes.get(key)
+        if index is not None:
+            _open_indexes.move_to_end(key)
+            return index
+
+    index = SearchIndex.open(path)
+
+    with _open_indexes_lock:
+        _open_indexes[key] = index
+        while len(_open_indexes) > MAX_OPEN_INDEXES:
+            _open_indexes.popitem(last=False)
+
+    return index
+
+
+def index_workbook(workbook):
+    """
+    Extracts the text of the workbook pdf and stores its search index.
+    """
+    with open_stored(workbook.pdf) as file:
+        data = build_index(extract_page_texts(file))
+
+    return save_artifact(workbook, WorkbookArtifact.Kind.SEARCH_INDEX, data, "idx")
+
+
+def load_workbook_index(workbook):
+    artifact = get_artifact(workbook, WorkbookArtifact.Kind.SEARCH_INDEX)
+
+    # Workbooks uploaded before search existed are indexed on first use.
+    if artifact is None:
+        artifact = index_workbook(workbook)
+
+    try:
+        path = artifact.file.path
+    except NotImplementedError:
+        # Storage without local files, read the index into memory instead.
+        with open_stored(artifact.file) as file:
+            return SearchIndex(file.read())
+
+    return open_index(path, artifact.sha256)
+
+
+def find_chapter(chapters, page_number):
+    """
+    Returns the chapter a (1 based) page number belongs to, chapters start at their start_page.
+    """
+    chapters = sorted(chapters or [], key=lambda chapter: chapter["start_page"])
+    start_pages = [chapter["start_page"] for chapter in chapters]
+
+    position = bisect_right(start_pages, page_number)
+    if position == 0:
+        return None
+    return chapters[position - 1]
+
+
+def search_workbook(workbook, query, limit=20):
+    """
+    Returns the ranked page hits of the query in the workbook.
+    Page numbers are 1 based like chapter start pages, snippet offsets are characters into the snippet.
+    """
+    index = load_workbook_index(workbook)
+
+    hits = []
+    for page, score, occurrences in index.search(query, limit):
+        snippet, highlights = index.snippet(page, occurrences)
+        chapter = find_chapter(workbook.chapters, page + 1)
+
+        hits.append(
+            {
+                "page": page + 1,
+                "score": round(score, 4),
+                "matches": len(occurrences),
+                "chapter": (
+                    {
+                        "id": chapter["id"],
+                        "chap_num": chapter["chap_num"],
+                        "title": chapter["title"],
+                    }
+                    if chapter
+                    else None
+                ),
+                "snippet": snippet,
+                "highlights": [
+                    {"start": start, "length": length} for start, length in highlights
+                ],
+            }
+        )
+
+    return hits
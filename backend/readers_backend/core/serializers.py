@@ -1,96 +1,243 @@
-import jsonschema
-from jsonschema import validate
 from rest_framework import serializers
-from .models import Collection, Workbook, Feedback
+from rest_framework.reverse import reverse
+from .models import Collection, Workbook, WorkbookArtifact, Feedback, UploadSession
+from core import fastjson
+from core.lite import PDF_VARIANTS
+from core.thumbnails import COVER_WIDTHS
+from core.uploads import MAX_UPLOAD_LENGTH
+from core.validators import validate_chapters
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+class JSONField(serializers.JSONField):
+    """
+    A JSONField parsing (multipart uploads send chapters as a JSON string) and checking values with core.fastjson.
+    """
+
+    def to_internal_value(self, data):
+        if self.decoder is not None or self.encoder is not None:
+            return super().to_internal_value(data)
+
+        try:
+            if self.binary or getattr(data, "is_json_string", False):
+                return fastjson.loads(data)
+            fastjson.dumps(data)
+        except (TypeError, ValueError):
+            self.fail("invalid")
+        return data
+
+
 """
 All serializers pertaining to actions performed on Workbook resource.
 """
 
 
 class WorkbookCreateSerializer(serializers.ModelSerializer):
+    chapters = JSONField()
+
     class Meta:
         model = Workbook
-        fields = "__all__"
+        # Page hashes are only used to build patches, hundreds of them would bloat every response.
+        # processing_updated_at is bookkeeping of the pipeline.
+        exclude = ["page_hashes", "processing_updated_at"]
 
     def validate_chapters(self, data):
-        schema = {
-            "type": "array",
-            "minItems": 1,
-            "items": {
-                "type": "object",
-                "required": ["title", "id", "chap_num", "start_page", "covers"],
-                "properties": {
-                    "requires": {"type": "array", "items": {"type": "string"}},
-                    "title": {"type": "string", "minLength": 1},
-                    "id": {"type": "string", "minLength": 1},
-                    "chap_num": {"type": "integer"},
-                    "start_page": {"type": "integer"},
-                    "covers": {
-                        "type": "array",
-                        "minItems": 0,
-                        "items": {
-                            "type": "object",
-                            "required": ["id", "desc"],
-                            "properties": {
-                                "id": {"type": "string", "minLength": 1},
-                                "desc": {"type": "string", "minLength": 1},
-                                "videos": {
-                                    "type": "array",
-                                    "items": {
-                                        "type": "object",
-                                        "required": ["link", "title"],
-                                        "properties": {
-                                            "link": {"type": "string", "minLength": 1},
-                                            "title": {"type": "string", "minLength": 1},
-                                        },
-                                        "additionalProperties": False,
-                                    },
-                                },
-                                "references": {
-                                    "type": "array",
-                                    "items": {
-                                        "type": "object",
-                                        "required": ["link", "title"],
-                                        "properties": {
-                                            "link": {"type": "string", "minLength": 1},
-                                            "title": {"type": "string", "minLength": 1},
-                                        },
-                                        "additionalProperties": False,
-                                    },
-                                },
-                            },
-                            "additionalProperties": False,
-                        },
-                    },
-                },
-                "additionalProperties": False,
-            },
-        }
+        result = validate_chapters(data)
+        if not result.is_valid:
+            raise serializers.ValidationError(result.messages())
 
-        try:
-            validate(instance=data, schema=schema)
-        except jsonschema.exceptions.ValidationError as e:
-            raise serializers.ValidationError(str(e))
+        self._external_requires = result.external_requires
+        return data
+
+    def validate(self, data):
+        # Chapters may require chapters of the other workbooks of the collection.
+        external_requires = getattr(self, "_external_requires", set())
+        if external_requires:
+            known_ids = set()
+            for chapters in (
+                Workbook.objects.filter(collection=data["collection"])
+                .exclude(number=data["number"])
+                .values_list("chapters", flat=True)
+            ):
+                known_ids.update(
+                    chapter.get("id")
+                    for chapter in chapters or []
+                    if isinstance(chapter, dict)
+                )
+
+            # Prerequisites can live in workbooks that aren't uploaded yet, so these are only logged.
+            unknown_requires = external_requires - known_ids
+            if unknown_requires:
+                logger.warning(
+                    f"Workbook {data['number']} of {data['collection']} requires unknown chapters: "
+                    f"{', '.join(sorted(unknown_requires))}"
+                )
 
         return data
 
 
+def workbook_images(workbook, request):
+    """
+    Cover and page thumbnail urls of a workbook (see core/thumbnails.py), None until they were rendered.
+    Iterates over all artifacts so a prefetch_related("artifacts") is used.
+    """
+    artifacts = {artifact.kind: artifact for artifact in workbook.artifacts.all()}
+
+    def url(kind):
+        return reverse("workbook-image", args=[workbook.id, kind], request=request)
+
+    covers = [
+        {
+            "url": url(kind),
+            "width": artifacts[kind].metadata["width"],
+            "height": artifacts[kind].metadata["height"],
+            "size": artifacts[kind].size,
+        }
+        for kind in COVER_WIDTHS
+        if kind in artifacts
+    ]
+
+    pages = None
+    sprite = artifacts.get(WorkbookArtifact.Kind.PAGE_THUMBNAILS)
+    if sprite is not None:
+        pages = {
+            "url": url(WorkbookArtifact.Kind.PAGE_THUMBNAILS),
+            "size": sprite.size,
+            **sprite.metadata,
+        }
+
+    if not covers and pages is None:
+        return None
+
+    return {"covers": covers, "pages": pages}
+
+
 class WorkbookRetrieveSerializer(serializers.ModelSerializer):
+    # The api download endpoint, supports Range requests unlike the plain media url in pdf.
+    pdf_download = serializers.HyperlinkedIdentityField(
+        view_name="workbook-pdf", read_only=True
+    )
+    # The pdf variants pdf_download serves (see core/lite.py), with what clients need to check their download.
+    pdf_variants = serializers.SerializerMethodField()
+    # Precomputed word index for offline search, None until the pdf was indexed.
+    word_index = serializers.SerializerMethodField()
+    images = serializers.SerializerMethodField()
+
     class Meta:
         model = Workbook
-        fields = "__all__"
+        # Page hashes are only used to build patches (see core/patches.py),
+        # processing_updated_at is bookkeeping of the pipeline.
+        exclude = ["page_hashes", "processing_updated_at"]
+
+    def get_pdf_variants(self, workbook):
+        if not workbook.pdf:
+            return None
+
+        # Iterates over all artifacts so a prefetch_related("artifacts") is used.
+        artifacts = {artifact.kind: artifact for artifact in workbook.artifacts.all()}
+        url = reverse(
+            "workbook-pdf", args=[workbook.id], request=self.context.get("request")
+        )
+
+        variants = {}
+        for variant, kind in PDF_VARIANTS.items():
+            artifact = artifacts.get(kind)
+            if artifact is not None:
+                variants[variant] = {
+                    "url": f"{url}?variant={variant}",
+                    "size": artifact.size,
+                    "sha256": artifact.sha256,
+                }
+
+        # Served as uploaded until the standard variant is built.
+        variants.setdefault(
+            "standard",
+            {
+                "url": f"{url}?variant=standard",
+                "size": workbook.pdf.size,
+                "sha256": workbook.sha256,
+            },
+        )
+        return variants
+
+    def get_word_index(self, workbook):
+        # Iterates over all artifacts so a prefetch_related("artifacts") is used.
+        for artifact in workbook.artifacts.all():
+            if artifact.kind == WorkbookArtifact.Kind.WORD_INDEX:
+                return {
+                    "url": reverse(
+                        "workbook-words",
+                        args=[workbook.id],
+                        request=self.context.get("request"),
+                    ),
+                    "size": artifact.size,
+                    "sha256": artifact.sha256,
+                }
+        return None
+
+    def get_images(self, workbook):
+        return workbook_images(workbook, self.context.get("request"))
+
+
+class WorkbookPdfQueryParamsSerializer(serializers.Serializer):
+    # The pdf as uploaded instead of its linearized copy, for audits.
+    original = serializers.BooleanField(required=False, default=False)
+    # Defaults to lite for clients sending Save-Data: on, standard otherwise.
+    variant = serializers.ChoiceField(
+        choices=list(PDF_VARIANTS), required=False, default=None, allow_null=True
+    )
+
+
+class WorkbookExtractQueryParamsSerializer(serializers.Serializer):
+    # Either a chapter (its id) or a page range (1 based, inclusive).
+    chapter = serializers.CharField(required=False)
+    first = serializers.IntegerField(required=False, min_value=1)
+    last = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, data):
+        has_range = "first" in data or "last" in data
+
+        if "chapter" in data and has_range:
+            raise serializers.ValidationError(
+                "Give either a chapter or a page range, not both."
+            )
+        if "chapter" not in data and not has_range:
+            raise serializers.ValidationError("Give a chapter or a page range.")
+        if has_range:
+            if "first" not in data or "last" not in data:
+                raise serializers.ValidationError(
+                    "A page range needs both first and last."
+                )
+            if data["first"] > data["last"]:
+                raise serializers.ValidationError({"last": "Must not be before first."})
+        return data
+
+
+# For validating query params when requesting a patch between two workbooks.
+class WorkbookPatchQueryParamsSerializer(serializers.Serializer):
+    # The workbook the client already has.
+    base = serializers.IntegerField()
+
+
+class WorkbookSearchQueryParamsSerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
 
 
 # This is only used when viewing detailed view of collection
 # Should not have direct access to an endpoint.
 class WorkbooksListSerializer(serializers.ModelSerializer):
+    # Lets catalogs show covers without a request per workbook.
+    images = serializers.SerializerMethodField()
+
     class Meta:
         model = Workbook
-        fields = ["id", "number"]
+        fields = ["id", "number", "images"]
+
+    def get_images(self, workbook):
+        return workbook_images(workbook, self.context.get("request"))
 
 
 """
@@ -151,6 +298,96 @@ class CollectionRetrieveSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+# Used by the latest endpoint when the client asks for everything in one request.
+# Inlines each workbook, chapters included, so no follow up requests are needed.
+class CollectionExpandedSerializer(serializers.ModelSerializer):
+    workbooks = WorkbookRetrieveSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Collection
+        fields = "__all__"
+
+
+class UploadSessionCreateSerializer(serializers.ModelSerializer):
+    """
+    Starts a resumable upload (see core/uploads.py), the workbook is checked now rather than after the whole pdf.
+    """
+
+    chapters = JSONField()
+
+    class Meta:
+        model = UploadSession
+        fields = ["id", "collection", "number", "chapters", "filename", "length"]
+
+    def validate_chapters(self, data):
+        result = validate_chapters(data)
+        if not result.is_valid:
+            raise serializers.ValidationError(result.messages())
+        return data
+
+    def validate_length(self, length):
+        if not 0 < length <= MAX_UPLOAD_LENGTH:
+            raise serializers.ValidationError(
+                f"Must be between 1 and {MAX_UPLOAD_LENGTH} bytes."
+            )
+        return length
+
+    def validate(self, data):
+        if Workbook.objects.filter(
+            collection=data["collection"], number=data["number"]
+        ).exists():
+            raise serializers.ValidationError(
+                "The fields number, collection must make a unique set."
+            )
+        return data
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = [
+            "id",
+            "collection",
+            "number",
+            "filename",
+            "length",
+            "offset",
+            "expires_at",
+        ]
+
+
+class UploadSessionFinalizeSerializer(serializers.Serializer):
+    # Checked against the hash computed while receiving the chunks.
+    sha256 = serializers.RegexField(r"^[0-9a-f]{64}$", required=False)
+
+
+class CollectionArchiveUploadSerializer(serializers.Serializer):
+    # A zip archive, see core/archives.py for its layout.
+    archive = serializers.FileField()
+
+
+class CollectionArchiveWorkbookSerializer(serializers.Serializer):
+    number = serializers.IntegerField()
+    # Paths inside the archive.
+    pdf = serializers.CharField()
+    chapters = serializers.CharField()
+
+
+# The manifest of a collection archive, the collection itself is validated by CollectionCreateSerializer.
+class CollectionArchiveManifestSerializer(serializers.Serializer):
+    workbooks = CollectionArchiveWorkbookSerializer(many=True, allow_empty=False)
+    release = serializers.BooleanField(default=False)
+
+    def validate_workbooks(self, workbooks):
+        numbers = [workbook["number"] for workbook in workbooks]
+        duplicates = sorted({number for number in numbers if numbers.count(number) > 1})
+        if duplicates:
+            raise serializers.ValidationError(
+                f"Workbook numbers must be unique, found duplicates: {duplicates}."
+            )
+        return workbooks
+
+
 # For validation query params when retrieving a collection.
 class CollectionRetrieveQueryParamsSerializer(serializers.Serializer):
     major_version = serializers.IntegerField(required=False)
@@ -159,11 +396,23 @@ class CollectionRetrieveQueryParamsSerializer(serializers.Serializer):
     is_released = serializers.BooleanField(
         required=False, default=None, allow_null=True
     )
+    # Only used by the latest endpoint, inlines workbooks and their chapters.
+    expand = serializers.BooleanField(required=False, default=False)
+
+
+"""
+All serializers pertaining to the sync endpoint.
+"""
+
+
+class SyncQueryParamsSerializer(serializers.Serializer):
+    # The token returned by the previous sync, omitted on the first sync.
+    since = serializers.IntegerField(required=False, min_value=0)
 
 
 class FeedbackSerializer(serializers.ModelSerializer):
 
-    logs = serializers.JSONField(required=False, allow_null=True)
+    logs = JSONField(required=False, allow_null=True)
 
     # Validate the fields in the feedback object
     class Meta:
@@ -1,11 +1,104 @@
-from django.db.models.signals import post_delete, pre_delete
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
 from django.dispatch import receiver
-from core.models import Workbook
+from core.cache import bump_catalog_generation
+from core.models import (
+    CatalogChange,
+    Collection,
+    Workbook,
+    WorkbookArtifact,
+    delete_unreferenced_file,
+)
 
 
 # By default, django does not delete file when objects with a file field are deleted...
-@receiver(pre_delete, sender=Workbook)
+# Files are shared (see core/storage.py), they are deleted once the rows are gone, if no other row uses them.
+# A workbook's artifacts are deleted before it, so a pdf and an artifact with the same content go too.
+@receiver(post_delete, sender=Workbook)
 def delete_workbook_pdf_individual(sender, instance, **kwargs):
     """Handle individual workbook deletes"""
-    if instance.pdf:
-        instance.pdf.delete(False)
+    delete_unreferenced_file(instance.pdf.name)
+
+
+@receiver(pre_delete, sender=Workbook)
+def log_workbook_delete(sender, instance, **kwargs):
+    log_catalog_change(
+        CatalogChange.Kind.WORKBOOK,
+        CatalogChange.Action.DELETED,
+        instance.id,
+        instance.collection_id,
+    )
+
+
+@receiver(post_delete, sender=WorkbookArtifact)
+def delete_workbook_artifact_file(sender, instance, **kwargs):
+    delete_unreferenced_file(instance.file.name)
+
+
+def log_catalog_change(kind, action, object_id, collection_id):
+    CatalogChange.objects.create(
+        kind=kind, action=action, object_id=object_id, collection_id=collection_id
+    )
+
+
+# Remember the release state a collection was loaded with, so a save can tell a release from an edit.
+@receiver(post_init, sender=Collection)
+def remember_collection_release_state(sender, instance, **kwargs):
+    instance._loaded_is_released = instance.__dict__.get("is_released")
+
+
+@receiver(post_save, sender=Collection)
+def log_collection_save(sender, instance, created, **kwargs):
+    if created:
+        action = CatalogChange.Action.CREATED
+    elif instance.is_released != instance._loaded_is_released:
+        if instance.is_released:
+            action = CatalogChange.Action.RELEASED
+        else:
+            action = CatalogChange.Action.UNRELEASED
+    else:
+        action = CatalogChange.Action.UPDATED
+
+    instance._loaded_is_released = instance.is_released
+
+    log_catalog_change(CatalogChange.Kind.COLLECTION, action, instance.id, instance.id)
+
+
+@receiver(pre_delete, sender=Collection)
+def log_collection_delete(sender, instance, **kwargs):
+    log_catalog_change(
+        CatalogChange.Kind.COLLECTION,
+        CatalogChange.Action.DELETED,
+        instance.id,
+        instance.id,
+    )
+
+
+@receiver(post_save, sender=Workbook)
+def log_workbook_save(sender, instance, created, **kwargs):
+    log_catalog_change(
+        CatalogChange.Kind.WORKBOOK,
+        CatalogChange.Action.CREATED if created else CatalogChange.Action.UPDATED,
+        instance.id,
+        instance.collection_id,
+    )
+
+
+@receiver(post_save, sender=Collection)
+@receiver(post_delete, sender=Collection)
+@receiver(post_save, sender=Workbook)
+@receiver(post_delete, sender=Workbook)
+def invalidate_catalog_cache(sender, instance, **kwargs):
+    """
+    Cached catalog payloads (e.g. the expanded latest collection) are keyed by generation.
+    We bump it right away and again on commit, so a payload rebuilt mid-transaction is not kept.
+    """
+    bump_catalog_generation()
+    transaction.on_commit(bump_catalog_generation)
+
+
+@receiver(post_save, sender=Workbook)
+@receiver(post_delete, sender=Workbook)
+def touch_workbook_collection(sender, instance, **kwargs):
+    """A workbook changing is a change of its collection as far as clients are concerned."""
+    Collection.touch(instance.collection_id)
@@ -0,0 +1,470 @@
+"""
+Storages for workbook pdfs, and the files derived from them (see WorkbookArtifact).
+
+Files are stored under their sha256 (blobs/ab/abcdef....pdf), whatever name they were uploaded with.
+The same pdf uploaded for another version or localization ends up in the same blob instead of a new copy.
+Blobs are shared between workbooks (and their artifacts), see delete_unreferenced_file in core/models.py for deletes.
+
+Blobs live either on the local disk (development, single server) or in an S3 compatible bucket.
+With S3, uploads are parallel multipart and downloads are redirects to short lived presigned urls,
+so file bytes never go through gunicorn. What the server itself reads (pipeline stages, bundles) goes
+through a local disk cache, see CachedStorage.
+"""
+
+import hashlib
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+from functools import partial
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from boto3.s3.transfer import TransferConfig
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage, Storage, storages
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import cached_property
+from django.utils.http import content_disposition_header
+from django.utils.module_loading import import_string
+
+from core.filecache import cache_directory, get_cache
+
+BLOBS_DIR = "blobs"
+
+BLOB_NAME_RE = re.compile(r"^blobs/[0-9a-f]{2}/(?P<sha256>[0-9a-f]{64})(\.\w+)?$")
+
+
+def hash_content(content, copy_to=None):
+    """
+    Returns the sha256 of a django File, optionally copying it to the file object copy_to on the way.
+    """
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+        if copy_to is not None:
+            copy_to.write(chunk)
+
+    return digest.hexdigest()
+
+
+def _is_seekable(content):
+    try:
+        return content.seekable()
+    except AttributeError:
+        return False
+
+
+def blob_name(sha256, name):
+    extension = posixpath.splitext(name)[1].lower()
+    return f"{BLOBS_DIR}/{sha256[:2]}/{sha256}{extension}"
+
+
+def sha256_from_name(name):
+    """
+    Returns the sha256 of a blob from its name, None for files stored before content addressing.
+    """
+    match = BLOB_NAME_RE.match(name or "")
+    return match.group("sha256") if match else None
+
+
+def open_stored(field_file):
+    """
+    Opens the stored file of a FileField anew.
+    FieldFile.open reopens the file it already holds, which S3 (and cached) files can't do once closed,
+    so files read more than once from the same instance (the pdf, by every pipeline stage) are opened with this.
+    """
+    return field_file.storage.open(field_file.name, "rb")
+
+
+class ContentAddressedStorageMixin:
+    """
+    Makes a storage save files under their content hash.
+    Saving content that is already stored returns the existing name without writing anything.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The name is derived from the content, an existing file is the same file.
+        return name
+
+    def _save(self, name, content):
+        # Uploads hashed as they were received come with their hash (see core/uploads.py).
+        sha256 = getattr(content, "sha256", None)
+        if sha256 is not None:
+            return self._save_if_missing(blob_name(sha256, name), content)
+
+        if _is_seekable(content):
+            name = blob_name(hash_content(content), name)
+            content.seek(0)
+            return self._save_if_missing(name, content)
+
+        # Streams (e.g. a zip member) can only be read once, they are spooled while hashing.
+        with tempfile.TemporaryFile() as spool:
+            name = blob_name(hash_content(content, copy_to=spool), name)
+            spool.seek(0)
+            return self._save_if_missing(name, File(spool))
+
+    def _save_if_missing(self, name, content):
+        if not self.exists(name):
+            name = self._save_blob(name, content)
+
+        return name
+
+    def _save_blob(self, name, content):
+        return super()._save(name, content)
+
+
+class ContentAddressedFileSystemStorage(
+    ContentAddressedStorageMixin, FileSystemStorage
+):
+
+    def _save_if_missing(self, name, content):
+        # A reused blob is as good as a new one for the orphaned media grace period (see core/mediagc.py),
+        # and one collected in the meantime is written again.
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return self._save_blob(name, content)
+
+        return name
+
+    def _save_blob(self, name, content):
+        # Written next to its final location then renamed over,
+        # so concurrent uploads of the same pdf never clash and readers never see a partial file.
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            os.chmod(temp_path, self.file_permissions_mode or 0o644)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+        return name
+
+
+MEGABYTE = 1024 * 1024
+
+CACHE_COPY_CHUNK_SIZE = MEGABYTE
+
+# Opened objects are downloaded to a temporary file (readers like pypdf need to seek), in memory up to this size.
+S3_SPOOL_SIZE = 16 * MEGABYTE
+
+
+@deconstructible
+class S3Storage(Storage):
+    """
+    Minimal storage on an S3 compatible bucket (AWS, MinIO, ...), credentials come from the usual boto3 sources
+    unless given.
+    """
+
+    def __init__(
+        self,
+        bucket_name,
+        location="",
+        endpoint_url=None,
+        region_name=None,
+        access_key=None,
+        secret_key=None,
+        presigned_url_expiry=300,
+        multipart_threshold=8 * MEGABYTE,
+        multipart_chunksize=8 * MEGABYTE,
+        max_concurrency=4,
+    ):
+        self.bucket_name = bucket_name
+        self.location = location.strip("/")
+        self.endpoint_url = endpoint_url
+        self.region_name = region_name
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.presigned_url_expiry = presigned_url_expiry
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_chunksize,
+            max_concurrency=max_concurrency,
+        )
+
+    @cached_property
+    def client(self):
+        # boto3 clients are thread safe, one is shared by every request thread.
+        return boto3.session.Session().client(
+            "s3",
+            endpoint_url=self.endpoint_url,
+            region_name=self.region_name,
+            aws_access_key_id=self.access_key,
+            aws_secret_access_key=self.secret_key,
+            config=Config(signature_version="s3v4"),
+        )
+
+    def key(self, name):
+        return posixpath.join(self.location, name) if self.location else name
+
+    def _head(self, name):
+        try:
+            return self.client.head_object(Bucket=self.bucket_name, Key=self.key(name))
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                raise FileNotFoundError(name)
+            raise
+
+    def _open(self, name, mode="rb"):
+        if "w" in mode or "a" in mode or "+" in mode:
+            raise ValueError("S3 objects can only be opened for reading.")
+
+        spool = tempfile.SpooledTemporaryFile(max_size=S3_SPOOL_SIZE)
+        try:
+            self.download(name, spool)
+        except BaseException:
+            spool.close()
+            raise
+        spool.seek(0)
+
+        return File(spool, name=name)
+
+    def download(self, name, file):
+        """
+        Writes the object to a (binary, writable) file object, in parallel ranges for large objects.
+        """
+        try:
+            self.client.download_fileobj(
+                self.bucket_name, self.key(name), file, Config=self.transfer_config
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                raise FileNotFoundError(name)
+            raise
+
+    def _save(self, name, content):
+        content_type = getattr(content, "content_type", None)
+        if name.endswith(".pdf"):
+            content_type = "application/pdf"
+
+        # Above multipart_threshold the upload is split in parts sent by max_concurrency threads.
+        self.client.upload_fileobj(
+            content,
+            self.bucket_name,
+            self.key(name),
+            ExtraArgs={"ContentType": content_type} if content_type else None,
+            Config=self.transfer_config,
+        )
+
+        return name
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket_name, Key=self.key(name))
+
+    def exists(self, name):
+        try:
+            self._head(name)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def size(self, name):
+        return self._head(name)["ContentLength"]
+
+    def get_modified_time(self, name):
+        return self._head(name)["LastModified"]
+
+    def iter_range(self, name, start, length, chunk_size):
+        """
+        Streams bytes [start, start + length) of an object, without downloading all of it like open() does.
+        """
+        if length <= 0:
+            return
+
+        response = self.client.get_object(
+            Bucket=self.bucket_name,
+            Key=self.key(name),
+            Range=f"bytes={start}-{start + length - 1}",
+        )
+        body = response["Body"]
+        try:
+            yield from body.iter_chunks(chunk_size)
+        finally:
+            body.close()
+
+    def listdir(self, path):
+        prefix = self.key(path).rstrip("/")
+        prefix = f"{prefix}/" if prefix else ""
+
+        directories, files = [], []
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(
+            Bucket=self.bucket_name, Prefix=prefix, Delimiter="/"
+        ):
+            for common_prefix in page.get("CommonPrefixes", []):
+                directories.append(common_prefix["Prefix"][len(prefix) :].rstrip("/"))
+            for item in page.get("Contents", []):
+                files.append(item["Key"][len(prefix) :])
+
+        return directories, files
+
+    def url(self, name):
+        # Presigned urls expire, they are only handed out for downloads (see download_url).
+        raise NotImplementedError("Objects have no lasting url, use download_url.")
+
+    def download_url(self, name, content_type=None, filename=None):
+        """
+        Returns a presigned url to download the file straight from the bucket, valid presigned_url_expiry seconds.
+        The bucket answers Range and conditional requests itself.
+        """
+        params = {"Bucket": self.bucket_name, "Key": self.key(name)}
+        if content_type:
+            params["ResponseContentType"] = content_type
+        if filename:
+            params["ResponseContentDisposition"] = content_disposition_header(
+                False, filename
+            )
+
+        return self.client.generate_presigned_url(
+            "get_object", Params=params, ExpiresIn=self.presigned_url_expiry
+        )
+
+
+class ContentAddressedS3Storage(ContentAddressedStorageMixin, S3Storage):
+    # Objects are only visible once fully uploaded, the mixin's default _save_blob is already atomic.
+    pass
+
+
+@deconstructible
+class CachedStorage(Storage):
+    """
+    A read through cache on local disk in front of another storage (see core/filecache.py), for remote storages:
+    downloads and pipeline stages read a blob from the network once, then from disk until it is evicted.
+
+    Only content addressed names (blobs/ab/abcdef....pdf) are cached, keyed by their hash, so an entry is never
+    stale. Anything else goes straight to the backend, as do writes.
+    Extras of the backend (download_url, ...) are exposed as they are, see __getattr__.
+
+        STORAGES["workbooks"] = {
+            "BACKEND": "core.storage.CachedStorage",
+            "OPTIONS": {
+                "backend": "core.storage.ContentAddressedS3Storage",
+                "options": {"bucket_name": ...},
+                "max_size": 10 * 1024 ** 3,
+            },
+        }
+    """
+
+    def __init__(self, backend, options=None, cache_dir=None, max_size=None):
+        self.backend = import_string(backend)(**(options or {}))
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    def __getattr__(self, name):
+        # Only called for attributes this class doesn't have.
+        if name == "backend":
+            raise AttributeError(name)
+        return getattr(self.backend, name)
+
+    @property
+    def cache(self):
+        # Resolved on use, the default directory depends on settings.
+        return get_cache(
+            self.cache_dir or cache_directory("storage"),
+            self.max_size or settings.STORAGE_CACHE_MAX_SIZE,
+        )
+
+    def _fill(self, name, file):
+        if hasattr(self.backend, "download"):
+            self.backend.download(name, file)
+            return
+
+        with self.backend.open(name, "rb") as source:
+            shutil.copyfileobj(source, file, CACHE_COPY_CHUNK_SIZE)
+
+    def cached_path(self, name):
+        """
+        Returns the path of the local copy of the file, filling the cache on a miss.
+        None for names that aren't cached.
+        """
+        sha256 = sha256_from_name(name)
+        if sha256 is None:
+            return None
+
+        cache = self.cache
+        return os.path.join(
+            cache.directory, cache.get_or_fill(sha256, partial(self._fill, name))
+        )
+
+    def _open(self, name, mode="rb"):
+        if "w" in mode or "a" in mode or "+" in mode:
+            return self.backend.open(name, mode)
+
+        # An entry can be evicted between filling and opening it, the second try fills it again.
+        for attempt in range(2):
+            path = self.cached_path(name)
+            if path is None:
+                return self.backend.open(name, mode)
+            try:
+                return File(open(path, "rb"), name=name)
+            except FileNotFoundError:
+                if attempt:
+                    raise
+
+    def iter_range(self, name, start, length, chunk_size):
+        """
+        Streams bytes [start, start + length) of a file, from the local copy when there is one.
+        """
+        sha256 = sha256_from_name(name)
+        if (
+            sha256 is not None
+            and self.cache.get(sha256) is None
+            and hasattr(self.backend, "iter_range")
+        ):
+            # Not worth downloading the whole file for a range.
+            yield from self.backend.iter_range(name, start, length, chunk_size)
+            return
+
+        with self.open(name, "rb") as file:
+            file.seek(start)
+            remaining = length
+            while remaining > 0:
+                data = file.read(min(chunk_size, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+
+    def get_available_name(self, name, max_length=None):
+        return self.backend.get_available_name(name, max_length)
+
+    def _save(self, name, content):
+        return self.backend._save(name, content)
+
+    def delete(self, name):
+        self.backend.delete(name)
+
+        sha256 = sha256_from_name(name)
+        if sha256 is not None:
+            self.cache.delete(sha256)
+
+    def exists(self, name):
+        return self.backend.exists(name)
+
+    def size(self, name):
+        return self.backend.size(name)
+
+    def get_modified_time(self, name):
+        return self.backend.get_modified_time(name)
+
+    def listdir(self, path):
+        return self.backend.listdir(path)
+
+    def url(self, name):
+        return self.backend.url(name)
+
+
+def workbook_storage():
+    return storages["workbooks"]
@@ -0,0 +1,18 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Processes workbooks in the test process (see core/pipeline.py).
+    Tests run the on_commit callbacks that schedule it with captureOnCommitCallbacks(execute=True).
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._pipeline_override = override_settings(PIPELINE_WORKERS=0)
+        self._pipeline_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._pipeline_override.disable()
+        super().teardown_test_environment(**kwargs)
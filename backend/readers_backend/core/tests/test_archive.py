@@ -0,0 +1,185 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from core.models import Collection, Workbook
+from .constants import GOOD_CHAPTERS
+from .test_delta import make_pdf
+
+
+def make_archive(manifest, files):
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive:
+        if manifest is not None:
+            archive.writestr("manifest.json", json.dumps(manifest))
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return output.getvalue()
+
+
+class CollectionArchiveTestCase(APITestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username="testuser", password="testpass123")
+        token = Token.objects.create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+        # Imported pdfs are written to storage, keep them out of the development media root.
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        self.url = reverse("collection-import-archive")
+        self.pdfs = {number: make_pdf([100 + number] * number) for number in (1, 2)}
+        self.manifest = {
+            "major_version": 1,
+            "minor_version": 0,
+            "localization": "en-US",
+            "release": True,
+            "workbooks": [
+                {
+                    "number": number,
+                    "pdf": f"pdfs/workbook-{number}.pdf",
+                    "chapters": f"chapters/workbook-{number}.json",
+                }
+                for number in self.pdfs
+            ],
+        }
+        self.files = {}
+        for number, pdf in self.pdfs.items():
+            self.files[f"pdfs/workbook-{number}.pdf"] = pdf
+            self.files[f"chapters/workbook-{number}.json"] = json.dumps(GOOD_CHAPTERS)
+
+    def tearDown(self):
+        """Ensure uploaded files are deleted after tests"""
+        Workbook.objects.all().delete()
+
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def upload(self, content):
+        return self.client.post(
+            self.url,
+            {"archive": SimpleUploadedFile(name="collection.zip", content=content)},
+            format="multipart",
+        )
+
+    def stored_files(self):
+        return [
+            name
+            for _, _, names in os.walk(self.media_root)
+            for name in names
+            if name.endswith(".pdf")
+        ]
+
+    def test_import_collection(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload(make_archive(self.manifest, self.files))
+
+        self.assertEqual(201, response.status_code, response.content)
+
+        collection = Collection.objects.get(pk=response.data["collection"]["id"])
+        self.assertTrue(collection.is_released)
+        self.assertEqual(
+            [1, 2], [workbook["number"] for workbook in response.data["workbooks"]]
+        )
+
+        for workbook_data in response.data["workbooks"]:
+            workbook = Workbook.objects.get(pk=workbook_data["id"])
+            pdf = self.pdfs[workbook.number]
+
+            self.assertEqual(collection, workbook.collection)
+            self.assertEqual(GOOD_CHAPTERS, workbook.chapters)
+            self.assertEqual(hashlib.sha256(pdf).hexdigest(), workbook_data["sha256"])
+            with workbook.pdf.open("rb") as file:
+                self.assertEqual(pdf, file.read())
+
+            # Ingest ran once the transaction committed.
+            self.assertEqual(workbook.number, len(workbook.page_hashes))
+
+    def test_import_without_release(self):
+        self.manifest["release"] = False
+
+        response = self.upload(make_archive(self.manifest, self.files))
+
+        self.assertEqual(201, response.status_code, response.content)
+        self.assertFalse(Collection.objects.get().is_released)
+
+    def test_bad_workbook_leaves_nothing(self):
+        self.files["pdfs/workbook-2.pdf"] = b"not a pdf"
+        self.files["chapters/workbook-1.json"] = json.dumps(
+            [{**GOOD_CHAPTERS[0], "title": ""}]
+        )
+
+        response = self.upload(make_archive(self.manifest, self.files))
+
+        self.assertEqual(400, response.status_code)
+        errors = response.json()["workbooks"]
+        self.assertEqual(["chapters"], list(errors["1"]))
+        self.assertEqual(["pdf"], list(errors["2"]))
+
+        self.assertFalse(Collection.objects.exists())
+        self.assertFalse(Workbook.objects.exists())
+        self.assertEqual([], self.stored_files())
+
+    def test_missing_file(self):
+        del self.files["pdfs/workbook-2.pdf"]
+
+        response = self.upload(make_archive(self.manifest, self.files))
+
+        self.assertEqual(400, response.status_code)
+        self.assertEqual(
+            {"2": {"pdf": ["pdfs/workbook-2.pdf is not in the archive."]}},
+            response.json()["workbooks"],
+        )
+        self.assertEqual([], self.stored_files())
+
+    def test_existing_version(self):
+        Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US"
+        )
+
+        response = self.upload(make_archive(self.manifest, self.files))
+
+        self.assertEqual(400, response.status_code)
+        self.assertIn("manifest", response.json())
+        self.assertEqual(1, Collection.objects.count())
+
+    def test_duplicate_workbook_numbers(self):
+        self.manifest["workbooks"][1]["number"] = 1
+
+        response = self.upload(make_archive(self.manifest, self.files))
+
+        self.assertEqual(400, response.status_code)
+        self.assertIn("workbooks", response.json()["manifest"])
+
+    def test_missing_manifest(self):
+        response = self.upload(make_archive(None, self.files))
+
+        self.assertEqual(400, response.status_code)
+        self.assertEqual(
+            {"archive": ["manifest.json is not in the archive."]}, response.json()
+        )
+
+    def test_not_an_archive(self):
+        response = self.upload(b"%PDF-1.4")
+
+        self.assertEqual(400, response.status_code)
+        self.assertEqual({"archive": ["Not a zip archive."]}, response.json())
+
+    def test_import_requires_auth(self):
+        self.client.credentials()
+
+        response = self.upload(make_archive(self.manifest, self.files))
+
+        self.assertEqual(401, response.status_code)
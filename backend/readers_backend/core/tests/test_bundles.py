@@ -0,0 +1,143 @@
+import hashlib
+import io
+import json
+import shutil
+import tarfile
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from core.models import Collection, Workbook, WorkbookArtifact
+from core.pipeline import process_workbook
+from core.views import CollectionViewSet
+from .constants import GOOD_CHAPTERS
+from .test_delta import make_pdf
+
+
+class CollectionBundleTestCase(APITestCase):
+
+    def setUp(self):
+        self._original_throttle_classes = CollectionViewSet.throttle_classes
+        CollectionViewSet.throttle_classes = []
+
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        self.collection = Collection.objects.create(
+            major_version=1, minor_version=2, localization="en_US", is_released=True
+        )
+        self.pdfs = {number: make_pdf([100 * number, 50]) for number in (1, 2)}
+        for number, pdf in self.pdfs.items():
+            Workbook.objects.create(
+                number=number,
+                collection=self.collection,
+                chapters=GOOD_CHAPTERS,
+                pdf=ContentFile(pdf, name="test.pdf"),
+            )
+        self.url = reverse("collection-bundle", args=[self.collection.id])
+
+    def tearDown(self):
+        """Ensure uploaded files are deleted after tests"""
+        Workbook.objects.all().delete()
+
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+        CollectionViewSet.throttle_classes = self._original_throttle_classes
+
+    def download(self, **headers):
+        response = self.client.get(self.url, headers=headers)
+        return response, b"".join(response.streaming_content)
+
+    def test_bundle(self):
+        response, body = self.download()
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("application/x-tar", response["Content-Type"])
+        self.assertEqual(str(len(body)), response["Content-Length"])
+
+        directory = f"collection-{self.collection.id}"
+        with tarfile.open(fileobj=io.BytesIO(body)) as tar:
+            self.assertEqual(
+                [
+                    f"{directory}/manifest.json",
+                    f"{directory}/workbook-1.pdf",
+                    f"{directory}/workbook-2.pdf",
+                ],
+                tar.getnames(),
+            )
+            manifest = json.load(tar.extractfile(f"{directory}/manifest.json"))
+
+            for workbook in manifest["workbooks"]:
+                self.assertEqual(GOOD_CHAPTERS, workbook["chapters"])
+                data = tar.extractfile(workbook["pdf"]["path"]).read()
+                self.assertEqual(self.pdfs[workbook["number"]], data)
+                self.assertEqual(
+                    workbook["pdf"]["sha256"], hashlib.sha256(data).hexdigest()
+                )
+
+    def test_bundles_standard_variant(self):
+        for workbook in Workbook.objects.all():
+            process_workbook(workbook.id)
+
+        _, body = self.download()
+
+        artifact = WorkbookArtifact.objects.get(
+            workbook__number=1, kind=WorkbookArtifact.Kind.LINEARIZED_PDF
+        )
+        with tarfile.open(fileobj=io.BytesIO(body)) as tar:
+            data = tar.extractfile(f"collection-{self.collection.id}/workbook-1.pdf")
+            self.assertEqual(artifact.sha256, hashlib.sha256(data.read()).hexdigest())
+
+    def test_resume(self):
+        response, body = self.download()
+        etag = response["ETag"]
+
+        # Starting in the middle of the first pdf, until the end.
+        start = 1500
+        response, rest = self.download(range=f"bytes={start}-", if_range=etag)
+        self.assertEqual(206, response.status_code)
+        self.assertEqual(
+            f"bytes {start}-{len(body) - 1}/{len(body)}", response["Content-Range"]
+        )
+        self.assertEqual(body[start:], rest)
+
+        response, part = self.download(range="bytes=10-20")
+        self.assertEqual(body[10:21], part)
+
+        # The bundle changed, the whole new one is sent.
+        Workbook.objects.get(number=2).delete()
+        response, _ = self.download(range=f"bytes={start}-", if_range=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response["ETag"])
+
+    def test_conditional(self):
+        response, _ = self.download()
+
+        response = self.client.get(
+            self.url, headers={"if_none_match": response["ETag"]}
+        )
+        self.assertEqual(304, response.status_code)
+
+    def test_head(self):
+        _, body = self.download()
+
+        response = self.client.head(self.url)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(str(len(body)), response["Content-Length"])
+
+    def test_unreleased(self):
+        self.collection.is_released = False
+        self.collection.save()
+
+        self.assertEqual(404, self.client.get(self.url).status_code)
+
+        user = User.objects.create_user(username="testuser", password="testpass123")
+        token = Token.objects.create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        self.assertEqual(404, self.client.get(self.url).status_code)
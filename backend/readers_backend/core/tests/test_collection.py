@@ -1,5 +1,9 @@
+import shutil
+import tempfile
+
 from django.contrib.auth.models import User
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APITestCase
@@ -18,11 +22,19 @@ class CollectionTestCase(APITestCase):
         self._original_throttle_classes = CollectionViewSet.throttle_classes
         CollectionViewSet.throttle_classes = []
 
+        # Releasing writes manifests, keep them out of the development media root.
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
     def tearDown(self):
         """Ensure uploaded files are deleted after tests"""
         for workbook in Workbook.objects.all():
             Workbook.objects.all().delete()
 
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
         # Restore throttles.
         # Probably not necessary, but good to retain state between tests.
         CollectionViewSet.throttle_classes = self._original_throttle_classes
@@ -96,6 +108,27 @@ class CollectionTestCase(APITestCase):
             msg="Collection should not have been created without authorization.",
         )
 
+    def test_cant_create_with_invalid_localization(self):
+        url = reverse("collection-list")
+
+        for localization in ["../..", "en", "EN-us"]:
+            body = {
+                "major_version": 1,
+                "minor_version": 0,
+                "localization": localization,
+            }
+
+            response = self.client.post(url, body)
+
+            self.assertEqual(
+                response.status_code,
+                400,
+                msg=f"Expected status code 400 for {localization!r}, but got {response.status_code}.",
+            )
+            self.assertIn("localization", response.data)
+
+        self.assertFalse(Collection.objects.exists())
+
     def test_cant_create_duplicate_major_minor_local(self):
         body = {"major_version": 1, "minor_version": 0, "localization": "en-US"}
 
@@ -844,3 +877,205 @@ class CollectionTestCase(APITestCase):
 
         self.assertEqual(response.status_code, 400)
         self.assertEqual(response.data["is_released"], ["Must be a valid boolean."])
+
+    def test_retrieve_latest_collection_expanded(self):
+        self.client.credentials()
+
+        collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US", is_released=True
+        )
+
+        pdf_content = b"%PDF-1.4 fake pdf content"
+        for i in range(3):
+            pdf_file = SimpleUploadedFile(
+                name="test.pdf", content=pdf_content, content_type="application/pdf"
+            )
+            Workbook.objects.create(
+                number=i + 1,
+                collection=collection,
+                chapters=[{"id": f"chapter-{i}"}],
+                pdf=pdf_file,
+            )
+
+        url = reverse("collection-latest")
+        response = self.client.get(f"{url}?expand=true")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["id"], collection.id)
+        self.assertEqual(
+            len(response.data["workbooks"]),
+            3,
+            msg=f"Expected 3 inlined workbooks, but got {len(response.data['workbooks'])}.",
+        )
+
+        for i, workbook_response in enumerate(response.data["workbooks"]):
+            self.assertEqual(i + 1, workbook_response["number"])
+            self.assertEqual(
+                [{"id": f"chapter-{i}"}],
+                workbook_response["chapters"],
+                msg=f"Expected chapters to be inlined, but got {workbook_response}.",
+            )
+            self.assertIn("pdf", workbook_response)
+
+    def test_retrieve_latest_collection_expanded_is_cached(self):
+        self.client.credentials()
+
+        Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US", is_released=True
+        )
+
+        url = reverse("collection-latest")
+
+        # Prime the cache.
+        self.client.get(f"{url}?expand=true")
+
+        # Only the latest collection row is fetched (for the ETag), the payload comes from the cache.
+        with self.assertNumQueries(1):
+            response = self.client.get(f"{url}?expand=true")
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_retrieve_latest_collection_expanded_rebuilt_after_release(self):
+        self.client.credentials()
+
+        old = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US", is_released=True
+        )
+        new = Collection.objects.create(
+            major_version=1, minor_version=1, localization="en-US"
+        )
+
+        url = reverse("collection-latest")
+
+        response = self.client.get(f"{url}?expand=true&localization=en-US")
+        self.assertEqual(response.data["id"], old.id)
+
+        new.is_released = True
+        new.save()
+
+        response = self.client.get(f"{url}?expand=true&localization=en-US")
+        self.assertEqual(
+            response.data["id"],
+            new.id,
+            msg="Expected the cached payload to be rebuilt after a release.",
+        )
+
+        new.delete()
+
+        response = self.client.get(f"{url}?expand=true&localization=en-US")
+        self.assertEqual(
+            response.data["id"],
+            old.id,
+            msg="Expected the cached payload to be rebuilt after a delete.",
+        )
+
+    def test_retrieve_latest_collection_expanded_unreleased_only_with_auth(self):
+        Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US", is_released=True
+        )
+        unreleased = Collection.objects.create(
+            major_version=2, minor_version=0, localization="en-US"
+        )
+
+        url = reverse("collection-latest")
+
+        response = self.client.get(f"{url}?expand=true")
+        self.assertEqual(response.data["id"], unreleased.id)
+
+        self.client.credentials()
+
+        response = self.client.get(f"{url}?expand=true")
+        self.assertNotEqual(
+            response.data["id"],
+            unreleased.id,
+            msg="Unauthenticated users should never get a cached unreleased collection.",
+        )
+
+    def test_retrieve_collection_not_modified(self):
+        self.client.credentials()
+
+        collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US", is_released=True
+        )
+        url = reverse("collection-detail", kwargs={"pk": collection.id})
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("ETag", response.headers)
+        self.assertIn("Last-Modified", response.headers)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response.headers["ETag"])
+        self.assertEqual(
+            response.status_code,
+            304,
+            msg=f"Expected 304 for a matching ETag, but got {response.status_code}.",
+        )
+
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response.headers["Last-Modified"]
+        )
+        self.assertEqual(
+            response.status_code,
+            304,
+            msg=f"Expected 304 for an unchanged Last-Modified, but got {response.status_code}.",
+        )
+
+    def test_retrieve_collection_modified_after_workbook_change(self):
+        self.client.credentials()
+
+        collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US", is_released=True
+        )
+        url = reverse("collection-detail", kwargs={"pk": collection.id})
+
+        etag = self.client.get(url).headers["ETag"]
+
+        Workbook.objects.create(number=1, collection=collection, chapters=[], pdf=None)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(
+            response.status_code,
+            200,
+            msg="Adding a workbook should change the collection's ETag.",
+        )
+        self.assertNotEqual(etag, response.headers["ETag"])
+
+    def test_list_collections_not_modified(self):
+        self.client.credentials()
+
+        collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US", is_released=True
+        )
+        url = reverse("collection-list")
+
+        etag = self.client.get(url).headers["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        collection.delete()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(
+            response.status_code,
+            200,
+            msg="Deleting a collection should change the list's ETag.",
+        )
+
+    def test_retrieve_latest_collection_not_modified(self):
+        self.client.credentials()
+
+        Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US", is_released=True
+        )
+        url = reverse("collection-latest")
+
+        etag = self.client.get(f"{url}?expand=true").headers["ETag"]
+
+        response = self.client.get(f"{url}?expand=true", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # The expanded and list representations are different.
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,106 @@
+import gzip
+import json
+import unittest
+from unittest import mock
+
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from core.models import Collection, Workbook
+from core.views import WorkbookViewSet
+from readers_backend import middleware
+from .constants import GOOD_CHAPTERS
+
+
+class CompressionTestCase(APITestCase):
+
+    def setUp(self):
+        self._original_throttle_classes = WorkbookViewSet.throttle_classes
+        WorkbookViewSet.throttle_classes = []
+
+        collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US", is_released=True
+        )
+        self.workbook = Workbook.objects.create(
+            number=1, collection=collection, chapters=GOOD_CHAPTERS, pdf=None
+        )
+        self.url = reverse("workbook-detail", args=[self.workbook.id])
+
+        cache.clear()
+
+    def tearDown(self):
+        WorkbookViewSet.throttle_classes = self._original_throttle_classes
+
+    def test_gzip(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("gzip", response.headers["Content-Encoding"])
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        self.assertEqual(str(len(response.content)), response.headers["Content-Length"])
+
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual(GOOD_CHAPTERS, data["chapters"])
+
+    @unittest.skipIf(middleware.brotli is None, "brotli is not installed.")
+    def test_brotli_preferred(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip, deflate, br")
+
+        self.assertEqual("br", response.headers["Content-Encoding"])
+        data = json.loads(middleware.brotli.decompress(response.content))
+        self.assertEqual(GOOD_CHAPTERS, data["chapters"])
+
+    def test_quality_values(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="br;q=0, gzip;q=0.5")
+        self.assertEqual("gzip", response.headers["Content-Encoding"])
+
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip;q=0")
+        self.assertNotIn("Content-Encoding", response.headers)
+
+    def test_not_compressed_without_accept_encoding(self):
+        response = self.client.get(self.url)
+
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(GOOD_CHAPTERS, response.json()["chapters"])
+
+    def test_compressed_once_per_etag(self):
+        with mock.patch.object(
+            middleware.CompressionMiddleware,
+            "compress",
+            autospec=True,
+            side_effect=middleware.CompressionMiddleware.compress,
+        ) as compress:
+            first = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+            second = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual(1, compress.call_count)
+        self.assertEqual(first.content, second.content)
+        self.assertTrue(first.headers["ETag"].startswith('W/"'))
+
+        # A changed workbook has a new ETag, and is compressed again.
+        self.workbook.chapters = GOOD_CHAPTERS[:1]
+        self.workbook.save()
+
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(
+            GOOD_CHAPTERS[:1], json.loads(gzip.decompress(response.content))["chapters"]
+        )
+
+    def test_weak_etag_revalidates(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+
+        response = self.client.get(
+            self.url,
+            HTTP_ACCEPT_ENCODING="gzip",
+            HTTP_IF_NONE_MATCH=response.headers["ETag"],
+        )
+        self.assertEqual(304, response.status_code)
+
+    def test_small_and_error_responses_not_compressed(self):
+        response = self.client.get(
+            reverse("workbook-detail", args=[self.workbook.id + 1]),
+            HTTP_ACCEPT_ENCODING="gzip",
+        )
+
+        self.assertEqual(404, response.status_code)
+        self.assertNotIn("Content-Encoding", response.headers)
@@ -0,0 +1,212 @@
+import io
+import json
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.urls import reverse
+from pypdf import PdfReader, PdfWriter
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from core.models import Collection, Workbook
+from core.patches import PATCHES_DIR, get_or_create_patch, patch_name
+from core.pdf import build_patch, page_hashes
+from core.views import WorkbookViewSet
+from .constants import GOOD_CHAPTERS
+
+
+def make_pdf(page_widths):
+    """A pdf with one blank page per width, pages with the same width are identical."""
+    writer = PdfWriter()
+    for width in page_widths:
+        writer.add_blank_page(width=width, height=100)
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+class WorkbookDeltaTestCase(APITestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username="testuser", password="testpass123")
+        token = Token.objects.create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+        self._original_throttle_classes = WorkbookViewSet.throttle_classes
+        WorkbookViewSet.throttle_classes = []
+
+        # Patches are written to storage, keep them out of the development media root.
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        self.old_collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US", is_released=True
+        )
+        self.new_collection = Collection.objects.create(
+            major_version=1, minor_version=1, localization="en-US", is_released=True
+        )
+
+    def tearDown(self):
+        """Ensure uploaded files are deleted after tests"""
+        Workbook.objects.all().delete()
+
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+        WorkbookViewSet.throttle_classes = self._original_throttle_classes
+
+    def upload(self, collection, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("workbook-list"),
+                {
+                    "number": 1,
+                    "collection": collection.id,
+                    "chapters": json.dumps(GOOD_CHAPTERS),
+                    "pdf": SimpleUploadedFile(name="test.pdf", content=content),
+                },
+                format="multipart",
+            )
+        self.assertEqual(201, response.status_code, response.content)
+        return Workbook.objects.get(pk=response.data["id"])
+
+    def test_page_hashes_computed_on_upload(self):
+        workbook = self.upload(self.old_collection, make_pdf([100, 101, 100]))
+
+        self.assertEqual(3, len(workbook.page_hashes))
+        self.assertEqual(
+            workbook.page_hashes[0],
+            workbook.page_hashes[2],
+            "Identical pages should have identical hashes.",
+        )
+        self.assertNotEqual(workbook.page_hashes[0], workbook.page_hashes[1])
+
+    def test_page_hashes_are_not_serialized(self):
+        workbook = self.upload(self.new_collection, make_pdf([100, 101]))
+
+        responses = [
+            self.client.get(reverse("workbook-detail", args=[workbook.id])).data,
+            self.client.get(reverse("collection-latest"), {"expand": "true"}).data[
+                "workbooks"
+            ][0],
+            self.client.get(reverse("sync")).data["workbooks"][0],
+        ]
+
+        for data in responses:
+            self.assertEqual(workbook.id, data["id"])
+            self.assertNotIn("page_hashes", data)
+
+    def test_page_hashes_do_not_depend_on_file_layout(self):
+        # Same pages, but the second file has an extra page in front, so object numbers differ.
+        first = page_hashes(io.BytesIO(make_pdf([100, 101])))
+        second = page_hashes(io.BytesIO(make_pdf([300, 100, 101])))
+
+        self.assertEqual(first, second[1:])
+
+    def test_delta_between_versions(self):
+        base = self.upload(self.old_collection, make_pdf([100, 101, 102, 103]))
+        target = self.upload(self.new_collection, make_pdf([100, 101, 200, 103, 201]))
+
+        response = self.client.get(
+            reverse("workbook-delta", args=[target.id]) + f"?base={base.id}"
+        )
+
+        self.assertEqual(200, response.status_code, response.content)
+        self.assertEqual(
+            [
+                {"source": "base", "start": 0, "count": 2},
+                {"source": "patch", "start": 0, "count": 1},
+                {"source": "base", "start": 3, "count": 1},
+                {"source": "patch", "start": 1, "count": 1},
+            ],
+            response.data["recipe"],
+        )
+
+        patch_response = self.client.get(response.data["patch"]["url"])
+        self.assertEqual(200, patch_response.status_code)
+
+        patch = b"".join(patch_response.streaming_content)
+        patch_response.close()
+
+        self.assertEqual(response.data["patch"]["size"], len(patch))
+        self.assertEqual(
+            [200, 201],
+            [int(page.mediabox.width) for page in PdfReader(io.BytesIO(patch)).pages],
+        )
+
+    def test_patch_is_built_once(self):
+        base = self.upload(self.old_collection, make_pdf([100, 101]))
+        target = self.upload(self.new_collection, make_pdf([100, 200]))
+        name = patch_name(base, target)
+        # Left by a build that didn't finish.
+        default_storage.save(f"{name}.pdf", ContentFile(b"partial"))
+
+        started = threading.Barrier(4)
+
+        def slow_build_patch(*args):
+            time.sleep(0.1)
+            return build_patch(*args)
+
+        def request():
+            started.wait()
+            return get_or_create_patch(base, target)
+
+        with mock.patch(
+            "core.patches.build_patch", side_effect=slow_build_patch
+        ) as built:
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                descriptions = list(executor.map(lambda _: request(), range(4)))
+
+        self.assertEqual(1, built.call_count)
+        self.assertEqual(1, len({json.dumps(d) for d in descriptions}))
+        self.assertEqual(f"{name}.pdf", descriptions[0]["pdf"])
+        _, files = default_storage.listdir(PATCHES_DIR)
+        self.assertEqual(
+            sorted(
+                f"{name}.{extension}".split("/")[-1] for extension in ("json", "pdf")
+            ),
+            sorted(file for file in files if not file.startswith(".")),
+        )
+
+    def test_delta_without_changes(self):
+        base = self.upload(self.old_collection, make_pdf([100, 101]))
+        target = self.upload(self.new_collection, make_pdf([100, 101]))
+
+        response = self.client.get(
+            reverse("workbook-delta", args=[target.id]) + f"?base={base.id}"
+        )
+
+        self.assertEqual(
+            [{"source": "base", "start": 0, "count": 2}], response.data["recipe"]
+        )
+        self.assertIsNone(response.data["patch"]["url"])
+
+    def test_delta_requires_base(self):
+        target = self.upload(self.new_collection, make_pdf([100]))
+
+        response = self.client.get(reverse("workbook-delta", args=[target.id]))
+
+        self.assertEqual(400, response.status_code)
+
+    def test_delta_from_unreleased_base_without_auth(self):
+        base = self.upload(self.old_collection, make_pdf([100]))
+        target = self.upload(self.new_collection, make_pdf([101]))
+
+        self.old_collection.is_released = False
+        self.old_collection.save()
+        self.client.credentials()
+
+        response = self.client.get(
+            reverse("workbook-delta", args=[target.id]) + f"?base={base.id}"
+        )
+
+        self.assertEqual(404, response.status_code)
@@ -0,0 +1,183 @@
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from core.models import Collection, Workbook
+from core.views import WorkbookViewSet
+from .constants import GOOD_CHAPTERS
+
+PDF_CONTENT = b"%PDF-1.4 " + bytes(range(256)) * 40 + b"%%EOF"
+
+
+class WorkbookDownloadTestCase(APITestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username="testuser", password="testpass123")
+        self.token = Token.objects.create(user=user)
+
+        self._original_throttle_classes = WorkbookViewSet.throttle_classes
+        WorkbookViewSet.throttle_classes = []
+
+        self.collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US", is_released=True
+        )
+        self.workbook = Workbook.objects.create(
+            number=1,
+            collection=self.collection,
+            chapters=GOOD_CHAPTERS,
+            pdf=SimpleUploadedFile(
+                name="test.pdf", content=PDF_CONTENT, content_type="application/pdf"
+            ),
+        )
+        self.url = reverse("workbook-pdf", args=[self.workbook.id])
+
+    def tearDown(self):
+        """Ensure uploaded files are deleted after tests"""
+        Workbook.objects.all().delete()
+
+        WorkbookViewSet.throttle_classes = self._original_throttle_classes
+
+    def get_content(self, response):
+        if response.streaming:
+            content = b"".join(response.streaming_content)
+        else:
+            content = response.content
+        response.close()
+        return content
+
+    def test_download_pdf(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(
+            200,
+            response.status_code,
+            f"Expected 200 when downloading a released workbook, got {response.status_code}.",
+        )
+        self.assertEqual("application/pdf", response.headers["Content-Type"])
+        self.assertEqual("bytes", response.headers["Accept-Ranges"])
+        self.assertEqual(str(len(PDF_CONTENT)), response.headers["Content-Length"])
+        self.assertIn("ETag", response.headers)
+        self.assertEqual(PDF_CONTENT, self.get_content(response))
+
+    def test_download_pdf_accepting_pdf_only(self):
+        response = self.client.get(self.url, HTTP_ACCEPT="application/pdf")
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(PDF_CONTENT, self.get_content(response))
+
+    def test_download_pdf_single_range(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=100-199")
+
+        self.assertEqual(206, response.status_code)
+        self.assertEqual(
+            f"bytes 100-199/{len(PDF_CONTENT)}", response.headers["Content-Range"]
+        )
+        self.assertEqual("100", response.headers["Content-Length"])
+        self.assertEqual(PDF_CONTENT[100:200], self.get_content(response))
+
+    def test_download_pdf_resume_open_ended_range(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=5000-")
+
+        self.assertEqual(206, response.status_code)
+        self.assertEqual(PDF_CONTENT[5000:], self.get_content(response))
+
+    def test_download_pdf_suffix_range(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-5")
+
+        self.assertEqual(206, response.status_code)
+        self.assertEqual(b"%%EOF", self.get_content(response))
+
+    def test_download_pdf_multiple_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-3, 20-29")
+
+        self.assertEqual(206, response.status_code)
+        content_type = response.headers["Content-Type"]
+        self.assertTrue(
+            content_type.startswith("multipart/byteranges; boundary="),
+            f"Expected a multipart response, got {content_type}.",
+        )
+
+        boundary = content_type.split("boundary=")[1]
+        content = self.get_content(response)
+
+        self.assertEqual(int(response.headers["Content-Length"]), len(content))
+        self.assertTrue(content.endswith(f"--{boundary}--\r\n".encode()))
+
+        parts = content.split(f"--{boundary}".encode())[1:-1]
+        self.assertEqual(2, len(parts))
+        self.assertIn(f"Content-Range: bytes 0-3/{len(PDF_CONTENT)}".encode(), parts[0])
+        self.assertTrue(parts[0].endswith(b"\r\n\r\n" + PDF_CONTENT[0:4] + b"\r\n"))
+        self.assertTrue(parts[1].endswith(b"\r\n\r\n" + PDF_CONTENT[20:30] + b"\r\n"))
+
+    def test_download_pdf_overlapping_ranges_are_merged(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-9,5-19")
+
+        self.assertEqual(206, response.status_code)
+        self.assertEqual(PDF_CONTENT[0:20], self.get_content(response))
+
+    def test_download_pdf_unsatisfiable_range(self):
+        response = self.client.get(
+            self.url, HTTP_RANGE=f"bytes={len(PDF_CONTENT) + 10}-"
+        )
+
+        self.assertEqual(416, response.status_code)
+        self.assertEqual(
+            f"bytes */{len(PDF_CONTENT)}", response.headers["Content-Range"]
+        )
+
+    def test_download_pdf_malformed_range_is_ignored(self):
+        response = self.client.get(self.url, HTTP_RANGE="pages=1-2")
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(PDF_CONTENT, self.get_content(response))
+
+    def test_download_pdf_if_range(self):
+        etag = self.client.get(self.url).headers["ETag"]
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=etag)
+        self.assertEqual(206, response.status_code)
+        self.assertEqual(PDF_CONTENT[:10], self.get_content(response))
+
+        # The file changed since the partial download, start over.
+        response = self.client.get(
+            self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"'
+        )
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(PDF_CONTENT, self.get_content(response))
+
+    def test_download_pdf_not_modified(self):
+        etag = self.client.get(self.url).headers["ETag"]
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(304, response.status_code)
+
+    def test_head_pdf(self):
+        response = self.client.head(self.url)
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(str(len(PDF_CONTENT)), response.headers["Content-Length"])
+        self.assertEqual("bytes", response.headers["Accept-Ranges"])
+        self.assertEqual(b"", self.get_content(response))
+
+    def test_download_unreleased_pdf_without_auth_returns_404(self):
+        self.collection.is_released = False
+        self.collection.save()
+
+        response = self.client.get(self.url)
+        self.assertEqual(404, response.status_code)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+        response = self.client.get(self.url)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(PDF_CONTENT, self.get_content(response))
+
+    def test_retrieve_workbook_links_download(self):
+        response = self.client.get(reverse("workbook-detail", args=[self.workbook.id]))
+
+        self.assertTrue(
+            response.data["pdf_download"].endswith(self.url),
+            f"Expected pdf_download to link to {self.url}, got {response.data['pdf_download']}.",
+        )
@@ -0,0 +1,212 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import pikepdf
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from core.extracts import extract_digests_cache, extracts_cache
+from core.filecache import DiskLRUCache
+from core.models import Collection, Workbook
+from core.views import WorkbookViewSet
+from .test_delta import make_pdf
+
+CHAPTERS = [
+    {"id": "first", "title": "First", "chap_num": 1, "start_page": 1, "covers": []},
+    {"id": "second", "title": "Second", "chap_num": 2, "start_page": 3, "covers": []},
+    {"id": "third", "title": "Third", "chap_num": 3, "start_page": 6, "covers": []},
+]
+
+
+def page_widths(body):
+    with pikepdf.open(io.BytesIO(body)) as pdf:
+        return [int(page.mediabox[2]) for page in pdf.pages]
+
+
+class WorkbookExtractTestCase(APITestCase):
+
+    def setUp(self):
+        self._original_throttle_classes = WorkbookViewSet.throttle_classes
+        WorkbookViewSet.throttle_classes = []
+
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        self.collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en_US", is_released=True
+        )
+        self.workbook = Workbook.objects.create(
+            number=1,
+            collection=self.collection,
+            chapters=CHAPTERS,
+            pdf=ContentFile(
+                make_pdf([100, 200, 300, 400, 500, 600, 700]), name="test.pdf"
+            ),
+        )
+        self.url = reverse("workbook-extract", args=[self.workbook.id])
+
+    def tearDown(self):
+        """Ensure uploaded files are deleted after tests"""
+        Workbook.objects.all().delete()
+
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+        WorkbookViewSet.throttle_classes = self._original_throttle_classes
+
+    def download(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(200, response.status_code)
+        return response, b"".join(response.streaming_content)
+
+    def test_chapter(self):
+        response, body = self.download(chapter="second")
+
+        self.assertEqual([300, 400, 500], page_widths(body))
+        self.assertIn("workbook-1-second.pdf", response["Content-Disposition"])
+        with pikepdf.open(io.BytesIO(body)) as pdf:
+            self.assertTrue(pdf.is_linearized)
+
+        # The last chapter runs to the last page.
+        _, body = self.download(chapter="third")
+        self.assertEqual([600, 700], page_widths(body))
+
+    def test_page_range(self):
+        _, body = self.download(first=2, last=4)
+        self.assertEqual([200, 300, 400], page_widths(body))
+
+    def test_cached(self):
+        response, body = self.download(first=3, last=5)
+
+        cache = extracts_cache()
+        digests = extract_digests_cache()
+        self.assertEqual(1, len(cache.entries()))
+        self.assertEqual(1, digests.misses)
+        self.assertEqual(f'"{hashlib.sha256(body).hexdigest()}"', response["ETag"])
+
+        # The same pages, whether asked as a chapter or a range.
+        again, again_body = self.download(chapter="second")
+        self.assertEqual(body, again_body)
+        self.assertEqual(response["ETag"], again["ETag"])
+        self.assertEqual(1, len(cache.entries()))
+        self.assertEqual(1, digests.hits)
+
+        # Built again with the same bytes once evicted.
+        shutil.rmtree(cache.directory)
+        _, rebuilt = self.download(first=3, last=5)
+        self.assertEqual(body, rebuilt)
+
+    def test_rebuilt_extract_has_its_own_etag(self):
+        response, body = self.download(first=3, last=5)
+
+        # Evicted, then built again by a qpdf writing other bytes.
+        shutil.rmtree(extracts_cache().directory)
+        with mock.patch(
+            "core.extracts.extract_pages", return_value=body + b"\n% rebuilt"
+        ):
+            rebuilt = self.client.get(
+                self.url,
+                {"first": 3, "last": 5},
+                headers={"range": "bytes=10-", "if-range": response["ETag"]},
+            )
+
+        # The range of the first build can't be resumed from the second one.
+        self.assertEqual(200, rebuilt.status_code)
+        self.assertNotEqual(response["ETag"], rebuilt["ETag"])
+        self.assertEqual(body + b"\n% rebuilt", b"".join(rebuilt.streaming_content))
+
+    def test_cache_stats(self):
+        url = reverse("cache-stats")
+        self.download(first=3, last=5)
+        self.download(chapter="second")
+
+        user = User.objects.create_user(username="reader", password="testpass123")
+        self.client.force_authenticate(user=user)
+        self.assertEqual(403, self.client.get(url).status_code)
+
+        admin = User.objects.create_user(
+            username="admin", password="testpass123", is_staff=True
+        )
+        self.client.force_authenticate(user=admin)
+        response = self.client.get(url)
+        self.assertEqual(200, response.status_code)
+
+        # Counters of this process, the one running the tests.
+        self.assertEqual(os.getpid(), response.data["pid"])
+        stats = response.data["file_caches"]
+        digests = stats[extract_digests_cache().directory]
+        self.assertEqual((1, 1), (digests["hits"], digests["misses"]))
+        extracts = stats[extracts_cache().directory]
+        self.assertEqual(extracts_cache().size(), extracts["size"])
+        self.assertIsNone(response.data["hot_file_cache"])
+
+    def test_invalid_requests(self):
+        self.assertEqual(400, self.client.get(self.url).status_code)
+        self.assertEqual(
+            400,
+            self.client.get(self.url, {"chapter": "first", "first": 1}).status_code,
+        )
+        self.assertEqual(
+            400, self.client.get(self.url, {"first": 3, "last": 2}).status_code
+        )
+        self.assertEqual(
+            400, self.client.get(self.url, {"first": 5, "last": 8}).status_code
+        )
+        self.assertEqual(404, self.client.get(self.url, {"chapter": "x"}).status_code)
+
+
+class DiskLRUCacheTestCase(APITestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = DiskLRUCache(self.directory, max_size=25)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def age(self, key, seconds):
+        path = self.cache.path(key)
+        modified = os.stat(path).st_mtime - seconds
+        os.utime(path, (modified, modified))
+
+    def test_evicts_least_recently_used(self):
+        self.cache.put("a", b"a" * 10)
+        self.age("a", 30)
+        self.cache.put("b", b"b" * 10)
+        self.age("b", 20)
+
+        # A hit makes "a" the most recently used.
+        self.assertEqual(self.cache.name("a"), self.cache.get("a"))
+
+        self.cache.put("c", b"c" * 10)
+
+        self.assertIsNone(self.cache.get("b"))
+        self.assertIsNotNone(self.cache.get("a"))
+        self.assertIsNotNone(self.cache.get("c"))
+        self.assertEqual(20, self.cache.size())
+
+    def test_keeps_entry_over_cap(self):
+        name = self.cache.put("large", b"x" * 100)
+
+        with self.cache.storage.open(name, "rb") as file:
+            self.assertEqual(b"x" * 100, file.read())
+
+    def test_get_or_create(self):
+        calls = []
+
+        def build():
+            calls.append(1)
+            return b"data"
+
+        self.assertEqual(
+            self.cache.get_or_create("key", build),
+            self.cache.get_or_create("key", build),
+        )
+        self.assertEqual(1, len(calls))
@@ -0,0 +1,74 @@
+import datetime
+import decimal
+import io
+import json
+from unittest import mock
+
+from rest_framework import parsers, renderers
+from rest_framework.test import APITestCase
+from core import fastjson
+from core.models import Collection, Workbook
+from core.renderers import JSONParser, JSONRenderer
+from .constants import GOOD_CHAPTERS
+
+PAYLOAD = {
+    "chapters": GOOD_CHAPTERS,
+    "title": "Kontinua – Kontinua",
+    "created": datetime.datetime(2025, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.UTC),
+    "price": decimal.Decimal("1.50"),
+    "empty": None,
+}
+
+
+class FastJSONTestCase(APITestCase):
+
+    def test_renderer_matches_drf(self):
+        expected = renderers.JSONRenderer().render(PAYLOAD)
+
+        self.assertEqual(expected, JSONRenderer().render(PAYLOAD))
+
+        with mock.patch.object(fastjson, "orjson", None):
+            self.assertEqual(expected, JSONRenderer().render(PAYLOAD))
+
+    def test_renderer_indent(self):
+        rendered = JSONRenderer().render(
+            {"a": [1]}, accepted_media_type="application/json; indent=2"
+        )
+
+        self.assertEqual(b'{\n  "a": [\n    1\n  ]\n}', rendered)
+
+    def test_parser(self):
+        body = json.dumps(GOOD_CHAPTERS).encode()
+
+        self.assertEqual(GOOD_CHAPTERS, JSONParser().parse(io.BytesIO(body)))
+
+        with mock.patch.object(fastjson, "orjson", None):
+            self.assertEqual(GOOD_CHAPTERS, JSONParser().parse(io.BytesIO(body)))
+
+    def test_parser_rejects_invalid_json(self):
+        with self.assertRaises(parsers.ParseError):
+            JSONParser().parse(io.BytesIO(b'{"chapters": ['))
+
+    def test_dumps_and_loads_without_orjson(self):
+        with mock.patch.object(fastjson, "orjson", None):
+            encoded = fastjson.dumps(GOOD_CHAPTERS)
+
+            self.assertEqual(GOOD_CHAPTERS, fastjson.loads(encoded))
+            with self.assertRaises(json.JSONDecodeError):
+                fastjson.loads(b"[")
+
+        self.assertEqual(encoded, fastjson.dumps(GOOD_CHAPTERS))
+
+    def test_model_field_round_trip(self):
+        collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US"
+        )
+        Workbook.objects.create(
+            number=1, collection=collection, chapters=GOOD_CHAPTERS, pdf=None
+        )
+
+        self.assertEqual(GOOD_CHAPTERS, Workbook.objects.get().chapters)
+        self.assertEqual(
+            GOOD_CHAPTERS[0]["title"],
+            Workbook.objects.values_list("chapters__0__title", flat=True).get(),
+        )
@@ -0,0 +1,141 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from core.hotcache import HotFileCache, hot_file_cache
+from core.models import Collection, Workbook
+from core.pipeline import process_workbook
+from core.views import CollectionViewSet, WorkbookViewSet
+from .constants import GOOD_CHAPTERS
+from .test_delta import make_pdf
+
+
+class HotFileDownloadTestCase(APITestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username="testuser", password="testpass123")
+        token = Token.objects.create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+        self._original_throttle_classes = (
+            WorkbookViewSet.throttle_classes,
+            CollectionViewSet.throttle_classes,
+        )
+        WorkbookViewSet.throttle_classes = []
+        CollectionViewSet.throttle_classes = []
+
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, HOT_FILE_CACHE_MAX_SIZE=1024 * 1024
+        )
+        self.settings_override.enable()
+
+        self.collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US"
+        )
+        self.pdf = make_pdf([100, 200, 300])
+        self.workbook = Workbook.objects.create(
+            number=1,
+            collection=self.collection,
+            chapters=GOOD_CHAPTERS,
+            pdf=ContentFile(self.pdf, name="test.pdf"),
+        )
+        self.url = reverse("workbook-pdf", args=[self.workbook.id]) + "?original=true"
+
+    def tearDown(self):
+        """Ensure uploaded files are deleted after tests"""
+        Workbook.objects.all().delete()
+
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+        (
+            WorkbookViewSet.throttle_classes,
+            CollectionViewSet.throttle_classes,
+        ) = self._original_throttle_classes
+
+    def download(self, **headers):
+        response = self.client.get(self.url, headers=headers)
+        return response, b"".join(response.streaming_content)
+
+    def test_served_from_mapping(self):
+        # One cache per process, shared by the tests.
+        cache = hot_file_cache()
+        misses, hits = cache.misses, cache.hits
+
+        _, body = self.download()
+        self.assertEqual(self.pdf, body)
+        self.assertEqual(misses + 1, cache.misses)
+
+        response, body = self.download(range="bytes=100-199")
+        self.assertEqual(206, response.status_code)
+        self.assertEqual(self.pdf[100:200], body)
+        self.assertEqual("100", response["Content-Length"])
+        self.assertEqual(hits + 1, cache.hits)
+
+    def test_release_reads_ahead(self):
+        process_workbook(self.workbook.id)
+
+        with mock.patch("core.hotcache.os.posix_fadvise") as posix_fadvise:
+            response = self.client.patch(
+                reverse("collection-release", args=[self.collection.id])
+            )
+        self.assertEqual(200, response.status_code)
+
+        # The pdf and every derived file.
+        self.assertEqual(1 + self.workbook.artifacts.count(), posix_fadvise.call_count)
+        posix_fadvise.assert_called_with(mock.ANY, 0, 0, os.POSIX_FADV_WILLNEED)
+
+
+class HotFileCacheTestCase(APITestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = HotFileCache(max_size=25)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, "wb") as file:
+            file.write(data)
+        return path
+
+    def test_least_recently_used_are_evicted(self):
+        a = self.write("a", b"a" * 10)
+        b = self.write("b", b"b" * 10)
+        self.cache.get(a)
+        self.cache.get(b)
+        self.cache.get(a)
+
+        self.cache.get(self.write("c", b"c" * 10))
+
+        self.assertEqual(1, self.cache.evictions)
+        self.assertEqual(20, self.cache.size)
+        self.assertEqual(b"a" * 10, self.cache.get(a)[:])
+        self.assertEqual(2, self.cache.hits)
+
+    def test_replaced_file_is_mapped_again(self):
+        path = self.write("a", b"a" * 10)
+        mapping = self.cache.get(path)
+
+        os.unlink(path)
+        self.write("a", b"b" * 12)
+
+        self.assertEqual(b"b" * 12, self.cache.get(path)[:])
+        self.assertEqual(12, self.cache.size)
+        # What was handed out before stays readable.
+        self.assertEqual(b"a" * 10, mapping[:])
+
+    def test_files_over_the_cap_are_not_mapped(self):
+        self.assertIsNone(self.cache.get(self.write("large", b"x" * 26)))
+        self.assertIsNone(self.cache.get(self.write("empty", b"")))
+        self.assertEqual(0, self.cache.size)
@@ -0,0 +1,105 @@
+import io
+import shutil
+import tempfile
+
+import pikepdf
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from core.models import Collection, Workbook, WorkbookArtifact
+from core.pipeline import process_workbook
+from core.views import WorkbookViewSet
+from .constants import GOOD_CHAPTERS
+from .test_delta import make_pdf
+
+
+class WorkbookLinearizationTestCase(APITestCase):
+
+    def setUp(self):
+        self._original_throttle_classes = WorkbookViewSet.throttle_classes
+        WorkbookViewSet.throttle_classes = []
+
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        self.collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en_US", is_released=True
+        )
+        self.pdf = make_pdf([100, 200, 300])
+        self.workbook = Workbook.objects.create(
+            number=1,
+            collection=self.collection,
+            chapters=GOOD_CHAPTERS,
+            pdf=ContentFile(self.pdf, name="test.pdf"),
+        )
+
+    def tearDown(self):
+        """Ensure uploaded files are deleted after tests"""
+        Workbook.objects.all().delete()
+
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+        WorkbookViewSet.throttle_classes = self._original_throttle_classes
+
+    def download(self, query=""):
+        response = self.client.get(
+            reverse("workbook-pdf", args=[self.workbook.id]) + query
+        )
+        self.assertEqual(200, response.status_code)
+        return response, b"".join(response.streaming_content)
+
+    def test_serves_linearized_copy(self):
+        self.assertFalse(pikepdf.open(io.BytesIO(self.pdf)).is_linearized)
+        process_workbook(self.workbook.id)
+
+        response, body = self.download()
+
+        with pikepdf.open(io.BytesIO(body)) as pdf:
+            self.assertTrue(pdf.is_linearized)
+            self.assertEqual(3, len(pdf.pages))
+
+        artifact = WorkbookArtifact.objects.get(
+            workbook=self.workbook, kind=WorkbookArtifact.Kind.LINEARIZED_PDF
+        )
+        self.assertEqual(f'"{artifact.sha256}"', response["ETag"])
+
+        data = self.client.get(reverse("workbook-detail", args=[self.workbook.id])).data
+        self.assertEqual(len(body), data["pdf_variants"]["standard"]["size"])
+        self.assertEqual(artifact.sha256, data["pdf_variants"]["standard"]["sha256"])
+
+    def test_original_kept(self):
+        process_workbook(self.workbook.id)
+
+        response, body = self.download("?original=true")
+
+        self.assertEqual(self.pdf, body)
+        self.assertEqual(f'"{self.workbook.sha256}"', response["ETag"])
+
+    def test_serves_upload_until_linearized(self):
+        _, body = self.download()
+        self.assertEqual(self.pdf, body)
+
+        data = self.client.get(reverse("workbook-detail", args=[self.workbook.id])).data
+        self.assertEqual(
+            self.workbook.sha256, data["pdf_variants"]["standard"]["sha256"]
+        )
+
+    def test_check_command(self):
+        output = io.StringIO()
+        call_command("check_linearization", stdout=output)
+        self.assertIn(f"Workbook {self.workbook.id} not linearized", output.getvalue())
+
+        output = io.StringIO()
+        call_command("check_linearization", "--fix", stdout=output)
+        self.assertIn(f"Workbook {self.workbook.id} fixed", output.getvalue())
+
+        output = io.StringIO()
+        call_command("check_linearization", stdout=output)
+        self.assertIn(
+            f"Workbook {self.workbook.id} linearized (uploaded pdf not linearized)",
+            output.getvalue(),
+        )
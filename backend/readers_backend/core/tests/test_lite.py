@@ -0,0 +1,114 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+
+import pikepdf
+from django.core.files.base import ContentFile
+from django.test import override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APITestCase
+from core.lite import LITE_MAX_IMAGE_SIZE
+from core.models import Collection, Workbook, WorkbookArtifact
+from core.pipeline import process_workbook
+from core.views import WorkbookViewSet
+from .constants import GOOD_CHAPTERS
+
+
+def make_image_pdf(width=2400, height=1800):
+    """A one page pdf holding a noisy (hard to compress) image."""
+    image = Image.frombytes("RGB", (width, height), os.urandom(width * height * 3))
+    output = io.BytesIO()
+    image.save(output, "PDF", resolution=300, title="Workbook", author="Kontinua")
+    return output.getvalue()
+
+
+class WorkbookLiteVariantTestCase(APITestCase):
+
+    def setUp(self):
+        self._original_throttle_classes = WorkbookViewSet.throttle_classes
+        WorkbookViewSet.throttle_classes = []
+
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        self.collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en_US", is_released=True
+        )
+        self.workbook = Workbook.objects.create(
+            number=1,
+            collection=self.collection,
+            chapters=GOOD_CHAPTERS,
+            pdf=ContentFile(make_image_pdf(), name="test.pdf"),
+        )
+        self.url = reverse("workbook-pdf", args=[self.workbook.id])
+
+    def tearDown(self):
+        """Ensure uploaded files are deleted after tests"""
+        Workbook.objects.all().delete()
+
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+        WorkbookViewSet.throttle_classes = self._original_throttle_classes
+
+    def download(self, url, **headers):
+        response = self.client.get(url, headers=headers)
+        self.assertEqual(200, response.status_code)
+        return response, b"".join(response.streaming_content)
+
+    def test_lite_variant(self):
+        process_workbook(self.workbook.id)
+
+        variants = self.client.get(
+            reverse("workbook-detail", args=[self.workbook.id])
+        ).data["pdf_variants"]
+        self.assertLess(variants["lite"]["size"], variants["standard"]["size"] / 2)
+
+        response, body = self.download(variants["lite"]["url"])
+
+        self.assertEqual(variants["lite"]["sha256"], hashlib.sha256(body).hexdigest())
+        self.assertIn("workbook-1-lite.pdf", response["Content-Disposition"])
+
+        with pikepdf.open(io.BytesIO(body)) as pdf:
+            self.assertTrue(pdf.is_linearized)
+            self.assertNotIn("/Info", pdf.trailer)
+
+            image = pikepdf.PdfImage(next(iter(pdf.pages[0].images.values())))
+            self.assertEqual(LITE_MAX_IMAGE_SIZE, image.width)
+
+        # Picked explicitly, Save-Data doesn't matter.
+        _, body = self.download(variants["standard"]["url"], save_data="on")
+        self.assertEqual(
+            variants["standard"]["sha256"], hashlib.sha256(body).hexdigest()
+        )
+
+    def test_save_data(self):
+        process_workbook(self.workbook.id)
+        lite = WorkbookArtifact.objects.get(
+            workbook=self.workbook, kind=WorkbookArtifact.Kind.LITE_PDF
+        )
+
+        response, _ = self.download(self.url, save_data="on")
+        self.assertEqual(f'"{lite.sha256}"', response["ETag"])
+        self.assertIn("Save-Data", response["Vary"])
+
+        response, _ = self.download(self.url)
+        self.assertNotEqual(f'"{lite.sha256}"', response["ETag"])
+        self.assertIn("Save-Data", response["Vary"])
+
+    def test_falls_back_until_built(self):
+        variants = self.client.get(
+            reverse("workbook-detail", args=[self.workbook.id])
+        ).data["pdf_variants"]
+        self.assertNotIn("lite", variants)
+
+        response, _ = self.download(self.url + "?variant=lite")
+        self.assertEqual(f'"{self.workbook.sha256}"', response["ETag"])
+
+    def test_unknown_variant(self):
+        response = self.client.get(self.url + "?variant=tiny")
+        self.assertEqual(400, response.status_code)
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from core.artifacts import save_artifact
+from core.manifests import write_manifest
+from core.models import Collection, Workbook, WorkbookArtifact
+from core.views import CollectionViewSet
+from .constants import GOOD_CHAPTERS
+
+PDF_CONTENT = b"%PDF-1.4 fake pdf content"
+
+
+class ReleaseManifestTestCase(APITestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username="testuser", password="testpass123")
+        token = Token.objects.create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+        self._original_throttle_classes = CollectionViewSet.throttle_classes
+        CollectionViewSet.throttle_classes = []
+
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        Workbook.objects.all().delete()
+
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+        CollectionViewSet.throttle_classes = self._original_throttle_classes
+
+    def create_collection(self, minor_version, workbooks=2):
+        collection = Collection.objects.create(
+            major_version=1, minor_version=minor_version, localization="en-US"
+        )
+        for i in range(workbooks):
+            Workbook.objects.create(
+                number=i + 1,
+                collection=collection,
+                chapters=GOOD_CHAPTERS,
+                pdf=SimpleUploadedFile(name="test.pdf", content=PDF_CONTENT),
+            )
+        return collection
+
+    def read_media_json(self, relative_path):
+        with open(os.path.join(self.media_root, relative_path)) as file:
+            return json.load(file)
+
+    def read_pointer(self):
+        return self.read_media_json("manifests/latest-en-US.json")
+
+    def release(self, collection):
+        response = self.client.patch(
+            reverse("collection-release", args=[collection.id])
+        )
+        self.assertEqual(200, response.status_code)
+
+    def test_release_writes_manifest_and_pointer(self):
+        collection = self.create_collection(minor_version=0)
+
+        self.release(collection)
+
+        pointer = self.read_pointer()
+        self.assertEqual(collection.id, pointer["collection_id"])
+        self.assertTrue(pointer["manifest"].startswith("/files/manifests/en-US/1.0-"))
+
+        manifest_path = pointer["manifest"].removeprefix("/files/")
+        with open(os.path.join(self.media_root, manifest_path), "rb") as file:
+            data = file.read()
+        self.assertEqual(
+            hashlib.sha256(data).hexdigest(),
+            pointer["sha256"],
+            "Pointer hash does not match the manifest it points to.",
+        )
+
+        manifest = json.loads(data)
+        self.assertEqual(collection.id, manifest["collection"]["id"])
+        self.assertEqual([1, 2], [w["number"] for w in manifest["workbooks"]])
+
+        for workbook in manifest["workbooks"]:
+            self.assertEqual(GOOD_CHAPTERS, workbook["chapters"])
+            self.assertEqual(len(PDF_CONTENT), workbook["pdf"]["size"])
+            self.assertEqual(
+                hashlib.sha256(PDF_CONTENT).hexdigest(), workbook["pdf"]["sha256"]
+            )
+            self.assertEqual(
+                reverse("workbook-pdf", args=[workbook["id"]]) + "?variant=standard",
+                workbook["pdf"]["url"],
+            )
+
+    def test_manifest_describes_the_served_pdf(self):
+        collection = self.create_collection(minor_version=0, workbooks=1)
+        linearized = b"%PDF-1.4 linearized pdf content"
+        save_artifact(
+            collection.workbooks.get(),
+            WorkbookArtifact.Kind.LINEARIZED_PDF,
+            linearized,
+            "pdf",
+        )
+
+        self.release(collection)
+
+        manifest = self.read_media_json(
+            self.read_pointer()["manifest"].removeprefix("/files/")
+        )
+        pdf = manifest["workbooks"][0]["pdf"]
+        self.assertEqual(len(linearized), pdf["size"])
+        self.assertEqual(hashlib.sha256(linearized).hexdigest(), pdf["sha256"])
+
+        response = self.client.get(pdf["url"], headers={"save-data": "on"})
+        self.assertEqual(linearized, b"".join(response.streaming_content))
+
+    def test_manifest_is_written_under_manifests(self):
+        collection = self.create_collection(minor_version=0)
+        # Saved without validation, nothing may be written outside of MEDIA_ROOT/manifests.
+        Collection.objects.filter(pk=collection.pk).update(localization="../..")
+        collection.refresh_from_db()
+
+        with self.assertRaises(SuspiciousFileOperation):
+            write_manifest(collection)
+
+    def test_release_older_collection_keeps_pointer_on_latest(self):
+        old = self.create_collection(minor_version=0)
+        new = self.create_collection(minor_version=1)
+
+        self.release(new)
+        self.release(old)
+
+        self.assertEqual(new.id, self.read_pointer()["collection_id"])
+
+    def test_unrelease_rolls_pointer_back(self):
+        old = self.create_collection(minor_version=0)
+        new = self.create_collection(minor_version=1)
+
+        self.release(old)
+        old_pointer = self.read_pointer()
+
+        self.release(new)
+        self.assertEqual(new.id, self.read_pointer()["collection_id"])
+
+        response = self.client.patch(reverse("collection-unrelease", args=[new.id]))
+        self.assertEqual(200, response.status_code)
+
+        self.assertEqual(
+            old_pointer,
+            self.read_pointer(),
+            "Expected the pointer to roll back to the previous release.",
+        )
+
+    def test_unrelease_last_release_removes_pointer(self):
+        collection = self.create_collection(minor_version=0)
+
+        self.release(collection)
+        self.client.patch(reverse("collection-unrelease", args=[collection.id]))
+
+        self.assertFalse(
+            os.path.exists(os.path.join(self.media_root, "manifests/latest-en-US.json"))
+        )
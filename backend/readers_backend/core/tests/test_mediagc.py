@@ -0,0 +1,190 @@
+import io
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import transaction
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from core.artifacts import save_artifact
+from core.mediagc import collect_orphaned_media
+from core.models import Collection, UploadSession, Workbook, WorkbookArtifact
+from core.patches import patch_name
+from .constants import GOOD_CHAPTERS
+from .test_delta import make_pdf
+
+DAY = 24 * 60 * 60
+
+
+class OrphanedMediaTestCase(APITestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        self.collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US"
+        )
+        self.workbook = self.create_workbook(1)
+        self.artifact = save_artifact(
+            self.workbook, WorkbookArtifact.Kind.SEARCH_INDEX, b"{}", "json"
+        )
+
+    def tearDown(self):
+        """Ensure uploaded files are deleted after tests"""
+        Workbook.objects.all().delete()
+
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def create_workbook(self, number):
+        return Workbook.objects.create(
+            number=number,
+            collection=self.collection,
+            chapters=GOOD_CHAPTERS,
+            pdf=ContentFile(make_pdf([100 + number]), name="test.pdf"),
+        )
+
+    def path(self, name):
+        return os.path.join(self.media_root, name)
+
+    def write(self, name, data=b"orphan"):
+        os.makedirs(os.path.dirname(self.path(name)), exist_ok=True)
+        with open(self.path(name), "wb") as file:
+            file.write(data)
+        return name
+
+    def age_all(self, seconds=2 * DAY):
+        past = time.time() - seconds
+        for directory, _, files in os.walk(self.media_root):
+            for file in files:
+                os.utime(os.path.join(directory, file), (past, past))
+
+    def collect(self, *args):
+        output = io.StringIO()
+        call_command("collect_orphaned_media", *args, stdout=output)
+        return output.getvalue()
+
+    def test_collects_unreferenced_files(self):
+        orphans = [
+            self.write(f"blobs/00/{'0' * 64}.pdf"),
+            self.write("artifacts/workbook-99-search_index.json"),
+            self.write("legacy.pdf"),
+            self.write(f"uploads/{uuid.uuid4()}.part"),
+            self.write(f"patches/98-99-{'0' * 16}.pdf"),
+        ]
+        manifest = self.write("manifests/en-US/1.0.json")
+        # Kept there by an operator, only legacy pdfs are collected at the top level.
+        kept = [self.write("robots.txt"), self.write("README")]
+        self.age_all()
+
+        output = self.collect()
+
+        for name in orphans:
+            self.assertIn(f"Deleted {name} (6 bytes)", output)
+            self.assertFalse(os.path.exists(self.path(name)))
+        self.assertIn("Deleted 5 orphaned file(s), 30 bytes", output)
+
+        # Referenced files, and those the collector doesn't own, stay.
+        self.assertTrue(os.path.exists(self.path(self.workbook.pdf.name)))
+        self.assertTrue(os.path.exists(self.path(self.artifact.file.name)))
+        self.assertTrue(os.path.exists(self.path(manifest)))
+        for name in kept:
+            self.assertTrue(os.path.exists(self.path(name)))
+
+    def test_dry_run(self):
+        orphan = self.write("artifacts/orphan.json")
+        self.age_all()
+
+        output = self.collect("--dry-run")
+
+        self.assertIn(f"Would delete {orphan} (6 bytes)", output)
+        self.assertIn("Would delete 1 orphaned file(s), 6 bytes", output)
+        self.assertTrue(os.path.exists(self.path(orphan)))
+
+    def test_grace_period(self):
+        orphan = self.write("artifacts/orphan.json")
+        self.age_all(seconds=2 * 60 * 60)
+
+        self.assertIn("Deleted 0 orphaned file(s)", self.collect())
+        self.assertIn("Deleted 1 orphaned file(s)", self.collect("--grace-period", "1"))
+        self.assertFalse(os.path.exists(self.path(orphan)))
+
+    def test_rolled_back_workbook(self):
+        try:
+            with transaction.atomic():
+                workbook = self.create_workbook(2)
+                raise ValueError("rollback")
+        except ValueError:
+            pass
+        self.age_all()
+
+        orphans = [
+            orphan.name
+            for orphan in collect_orphaned_media(
+                grace_period=timedelta(days=1), batch_size=1
+            )
+        ]
+
+        self.assertEqual([workbook.pdf.name], orphans)
+        self.assertTrue(os.path.exists(self.path(self.workbook.pdf.name)))
+
+    def test_reused_blob_is_recent(self):
+        name = self.create_workbook(2).pdf.name
+        # Orphaned by a queryset update, which doesn't send signals.
+        Workbook.objects.filter(number=2).update(pdf="")
+        Workbook.objects.filter(number=2).delete()
+        self.age_all()
+
+        # Uploaded again, the blob is reused rather than written (as if its row wasn't committed yet).
+        self.create_workbook(2)
+        Workbook.objects.filter(number=2).update(pdf="")
+
+        self.assertNotIn(name, self.collect())
+        self.assertTrue(os.path.exists(self.path(name)))
+
+    def test_stale_patches(self):
+        target = self.create_workbook(2)
+        Workbook.objects.update(page_hashes=["a", "b"])
+        self.workbook.refresh_from_db()
+        target.refresh_from_db()
+
+        current = self.write(patch_name(self.workbook, target) + ".json")
+        stale = self.write(f"patches/{self.workbook.id}-{target.id}-{'0' * 16}.json")
+        self.age_all()
+
+        self.collect()
+
+        self.assertTrue(os.path.exists(self.path(current)))
+        self.assertFalse(os.path.exists(self.path(stale)))
+
+    def test_upload_sessions(self):
+        session = UploadSession.objects.create(
+            user=User.objects.create_user(username="testuser", password="testpass123"),
+            collection=self.collection,
+            number=2,
+            chapters=GOOD_CHAPTERS,
+            filename="workbook.pdf",
+            length=10,
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+        partial = self.write(f"uploads/{session.id}.part")
+        self.age_all()
+
+        self.collect()
+        self.assertTrue(os.path.exists(self.path(partial)))
+
+        UploadSession.objects.filter(pk=session.pk).update(
+            expires_at=timezone.now() - timedelta(hours=1)
+        )
+        self.collect()
+        self.assertFalse(os.path.exists(self.path(partial)))
+        self.assertFalse(UploadSession.objects.exists())
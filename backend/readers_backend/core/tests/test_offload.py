@@ -0,0 +1,162 @@
+import os
+import re
+import shutil
+import tempfile
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from core.models import Collection, Workbook
+from core.views import WorkbookViewSet
+from .constants import GOOD_CHAPTERS
+from .test_delta import make_pdf
+
+NGINX_CONFIG = os.path.join(settings.BASE_DIR, "nginx", "readers.conf")
+
+INTERNAL_LOCATION_RE = re.compile(
+    r"location\s+(?P<location>\S+)\s*{[^}]*?\binternal;[^}]*?\balias\s+(?P<alias>[^;]+);",
+    re.DOTALL,
+)
+
+LOCATION_RE = re.compile(r"location\s+(?P<location>\S+)\s*{(?P<body>[^}]*)}")
+
+
+class NginxStub:
+    """
+    Resolves X-Accel-Redirect like the internal location of the sample nginx config does,
+    with its alias pointed at the test MEDIA_ROOT.
+    """
+
+    def __init__(self, media_root):
+        with open(NGINX_CONFIG) as file:
+            match = INTERNAL_LOCATION_RE.search(file.read())
+        self.location = match.group("location")
+        self.media_root = media_root
+
+    def follow(self, response):
+        uri = response["X-Accel-Redirect"]
+        assert uri.startswith(self.location), uri
+
+        path = os.path.join(self.media_root, unquote(uri[len(self.location) :]))
+        with open(path, "rb") as file:
+            return file.read()
+
+
+class DownloadOffloadTestCase(APITestCase):
+
+    def setUp(self):
+        self._original_throttle_classes = WorkbookViewSet.throttle_classes
+        WorkbookViewSet.throttle_classes = []
+
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, DOWNLOAD_OFFLOAD="x-accel-redirect"
+        )
+        self.settings_override.enable()
+        self.nginx = NginxStub(self.media_root)
+
+        self.collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en_US", is_released=True
+        )
+        self.pdf = make_pdf([100, 200])
+        self.workbook = Workbook.objects.create(
+            number=1,
+            collection=self.collection,
+            chapters=GOOD_CHAPTERS,
+            pdf=ContentFile(self.pdf, name="test.pdf"),
+        )
+        self.url = reverse("workbook-pdf", args=[self.workbook.id])
+
+    def tearDown(self):
+        """Ensure uploaded files are deleted after tests"""
+        Workbook.objects.all().delete()
+
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+        WorkbookViewSet.throttle_classes = self._original_throttle_classes
+
+    def test_pdf_is_offloaded(self):
+        response = self.client.get(self.url, headers={"range": "bytes=0-9"})
+
+        # Django only sends headers, nginx sends the bytes (and the range).
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(b"", response.content)
+        self.assertEqual(
+            f"/protected/{self.workbook.pdf.name}", response["X-Accel-Redirect"]
+        )
+        self.assertEqual(self.pdf, self.nginx.follow(response))
+
+        self.assertEqual("application/pdf", response["Content-Type"])
+        self.assertIn("workbook-1.pdf", response["Content-Disposition"])
+        self.assertEqual(f'"{self.workbook.sha256}"', response["ETag"])
+        self.assertIn("no-cache", response["Cache-Control"])
+
+    def test_not_modified_is_answered_by_django(self):
+        response = self.client.get(
+            self.url, headers={"if_none_match": f'"{self.workbook.sha256}"'}
+        )
+
+        self.assertEqual(304, response.status_code)
+        self.assertNotIn("X-Accel-Redirect", response)
+
+    def test_access_is_checked(self):
+        self.collection.is_released = False
+        self.collection.save()
+
+        response = self.client.get(self.url)
+        self.assertEqual(404, response.status_code)
+        self.assertNotIn("X-Accel-Redirect", response)
+
+        user = User.objects.create_user(username="testuser", password="testpass123")
+        token = Token.objects.create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+        response = self.client.get(self.url)
+        self.assertEqual(self.pdf, self.nginx.follow(response))
+
+    def test_only_manifests_are_public(self):
+        with open(NGINX_CONFIG) as file:
+            locations = LOCATION_RE.findall(file.read())
+
+        public = [
+            location
+            for location, body in locations
+            if "alias" in body and "internal;" not in body
+        ]
+        self.assertEqual(["/files/manifests/"], public)
+
+        response = self.client.get(reverse("workbook-detail", args=[self.workbook.id]))
+        self.assertEqual(
+            f"http://testserver{self.url}?original=true", response.data["pdf"]
+        )
+        self.assertEqual(
+            self.pdf, self.nginx.follow(self.client.get(response.data["pdf"]))
+        )
+
+    def test_x_sendfile(self):
+        with override_settings(DOWNLOAD_OFFLOAD="x-sendfile"):
+            response = self.client.get(self.url)
+
+        self.assertEqual(
+            os.path.realpath(self.workbook.pdf.path), response["X-Sendfile"]
+        )
+
+    def test_files_outside_media_root_are_sent_by_django(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+
+        with override_settings(FILE_CACHE_DIR=cache_dir):
+            response = self.client.get(
+                reverse("workbook-extract", args=[self.workbook.id]),
+                {"first": 1, "last": 1},
+            )
+
+        self.assertEqual(200, response.status_code)
+        self.assertNotIn("X-Accel-Redirect", response)
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
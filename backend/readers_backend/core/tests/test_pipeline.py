@@ -0,0 +1,229 @@
+import io
+import json
+import os
+from datetime import timedelta
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from core.artifacts import save_artifact
+from core.manifests import pointer_path, publish_release
+from core.models import Collection, Workbook, WorkbookArtifact
+from core.pipeline import process_workbook
+from core.views import WorkbookViewSet
+from .constants import GOOD_CHAPTERS
+from .test_delta import make_pdf
+
+
+class WorkbookPipelineTestCase(APITestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username="testuser", password="testpass123")
+        token = Token.objects.create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+        self._original_throttle_classes = WorkbookViewSet.throttle_classes
+        WorkbookViewSet.throttle_classes = []
+
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        self.collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US"
+        )
+
+    def tearDown(self):
+        """Ensure uploaded files are deleted after tests"""
+        Workbook.objects.all().delete()
+
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+        WorkbookViewSet.throttle_classes = self._original_throttle_classes
+
+    def create_workbook(self, number=1):
+        return Workbook.objects.create(
+            number=number,
+            collection=self.collection,
+            chapters=GOOD_CHAPTERS,
+            pdf=ContentFile(make_pdf([100 + number, 200]), name="test.pdf"),
+        )
+
+    def test_processed_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(
+                reverse("workbook-list"),
+                {
+                    "number": 1,
+                    "collection": self.collection.id,
+                    "chapters": json.dumps(GOOD_CHAPTERS),
+                    "pdf": SimpleUploadedFile(name="test.pdf", content=make_pdf([100])),
+                },
+                format="multipart",
+            )
+        self.assertEqual(201, response.status_code, response.content)
+
+        # Nothing is computed within the upload request.
+        url = reverse("workbook-detail", args=[response.data["id"]])
+        self.assertEqual("pending", self.client.get(url).data["processing_state"])
+        self.assertIsNone(Workbook.objects.get().page_hashes)
+
+        for callback in callbacks:
+            callback()
+
+        data = self.client.get(url).data
+        self.assertEqual("ready", data["processing_state"])
+        self.assertIsNotNone(data["word_index"])
+
+    def test_stages_are_idempotent(self):
+        workbook = self.create_workbook()
+        self.assertEqual("ready", process_workbook(workbook.id))
+
+        artifact = WorkbookArtifact.objects.get(
+            workbook=workbook, kind=WorkbookArtifact.Kind.SEARCH_INDEX
+        )
+
+        with mock.patch("core.ingest.page_hashes") as page_hashes:
+            self.assertEqual("ready", process_workbook(workbook.id))
+        page_hashes.assert_not_called()
+
+        # Forced, every stage runs again.
+        self.assertEqual("ready", process_workbook(workbook.id, force=True))
+        self.assertGreater(
+            WorkbookArtifact.objects.get(pk=artifact.pk).created_at,
+            artifact.created_at,
+        )
+
+    def test_artifact_replaced_before_old_file_is_deleted(self):
+        workbook = self.create_workbook()
+        previous = save_artifact(
+            workbook, WorkbookArtifact.Kind.SEARCH_INDEX, b"previous", "idx"
+        )
+        storage = previous.file.storage
+        delete = FileSystemStorage.delete
+
+        def checked_delete(storage, name):
+            # By then downloads already get the new file.
+            current = WorkbookArtifact.objects.get(pk=previous.pk).file
+            self.assertNotEqual(name, current.name)
+            self.assertTrue(storage.exists(current.name))
+            delete(storage, name)
+
+        with mock.patch.object(
+            FileSystemStorage, "delete", autospec=True, side_effect=checked_delete
+        ) as deleted:
+            artifact = save_artifact(
+                workbook, WorkbookArtifact.Kind.SEARCH_INDEX, b"current", "idx"
+            )
+
+        deleted.assert_called_once()
+        self.assertEqual(previous.file.name, deleted.call_args.args[1])
+        self.assertFalse(storage.exists(previous.file.name))
+        with artifact.file.open("rb") as file:
+            self.assertEqual(b"current", file.read())
+
+    def test_failed_stage(self):
+        workbook = self.create_workbook()
+
+        with mock.patch(
+            "core.wordindex.extract_words", side_effect=ValueError("broken")
+        ):
+            self.assertEqual("failed", process_workbook(workbook.id))
+
+        workbook.refresh_from_db()
+        self.assertEqual("failed", workbook.processing_state)
+        # The other stages still ran.
+        self.assertIsNotNone(workbook.page_hashes)
+
+        # Re-running only does what is missing.
+        self.assertEqual("ready", process_workbook(workbook.id))
+        self.assertTrue(
+            workbook.artifacts.filter(kind=WorkbookArtifact.Kind.WORD_INDEX).exists()
+        )
+
+    def test_processed_workbook_is_synced(self):
+        workbook = self.create_workbook()
+        token = self.client.get(reverse("sync")).data["token"]
+
+        process_workbook(workbook.id)
+
+        response = self.client.get(reverse("sync"), {"since": token})
+        self.assertEqual(
+            [(workbook.id, "ready")],
+            [
+                (data["id"], data["processing_state"])
+                for data in response.data["workbooks"]
+            ],
+        )
+
+    def test_processed_workbook_is_in_the_manifest(self):
+        workbook = self.create_workbook()
+        self.collection.is_released = True
+        self.collection.save()
+        publish_release(self.collection)
+
+        process_workbook(workbook.id)
+        workbook.refresh_from_db()
+
+        with open(os.path.join(self.media_root, pointer_path("en-US"))) as file:
+            manifest_path = json.load(file)["manifest"].removeprefix("/files/")
+        with open(os.path.join(self.media_root, manifest_path)) as file:
+            pdf = json.load(file)["workbooks"][0]["pdf"]
+
+        linearized = workbook.artifacts.get(kind=WorkbookArtifact.Kind.LINEARIZED_PDF)
+        self.assertEqual(linearized.sha256, pdf["sha256"])
+        self.assertNotEqual(workbook.sha256, pdf["sha256"])
+
+    def test_command_recovers_lost_processing(self):
+        lost_pending, lost_processing, pending = [
+            self.create_workbook(number) for number in (1, 2, 3)
+        ]
+        # As if the web process restarted with these queued or running an hour ago.
+        an_hour_ago = timezone.now() - timedelta(
+            seconds=settings.PIPELINE_STALE_AFTER + 1
+        )
+        Workbook.objects.filter(pk=lost_pending.pk).update(
+            processing_updated_at=an_hour_ago
+        )
+        Workbook.objects.filter(pk=lost_processing.pk).update(
+            processing_state=Workbook.ProcessingState.PROCESSING,
+            processing_updated_at=an_hour_ago,
+        )
+
+        output = io.StringIO()
+        call_command("process_workbooks", "--stale", stdout=output)
+
+        self.assertEqual(
+            [("ready", 1), ("ready", 2), ("pending", 3)],
+            list(
+                Workbook.objects.order_by("number").values_list(
+                    "processing_state", "number"
+                )
+            ),
+        )
+        self.assertNotIn(f"Workbook {pending.id} ", output.getvalue())
+
+    def test_command_backfills(self):
+        workbooks = [self.create_workbook(number) for number in (1, 2)]
+        process_workbook(workbooks[0].id)
+
+        output = io.StringIO()
+        call_command("process_workbooks", stdout=output)
+
+        self.assertNotIn(f"Workbook {workbooks[0].id} ", output.getvalue())
+        self.assertIn(f"Workbook {workbooks[1].id} ready", output.getvalue())
+        self.assertEqual(
+            {"ready"}, set(Workbook.objects.values_list("processing_state", flat=True))
+        )
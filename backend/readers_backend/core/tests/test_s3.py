@@ -0,0 +1,285 @@
+import hashlib
+import json
+import shutil
+import tempfile
+from urllib.parse import parse_qs, urlparse
+
+import boto3
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.urls import reverse
+from moto import mock_aws
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from core.artifacts import save_artifact
+from core.models import Collection, Workbook, WorkbookArtifact
+from core.storage import CachedStorage
+from core.views import WorkbookViewSet
+from .constants import GOOD_CHAPTERS
+from .test_delta import make_pdf
+
+BUCKET = "workbooks"
+
+S3_STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.InMemoryStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    "workbooks": {
+        "BACKEND": "core.storage.ContentAddressedS3Storage",
+        "OPTIONS": {
+            "bucket_name": BUCKET,
+            "region_name": "us-east-1",
+            "access_key": "testing",
+            "secret_key": "testing",
+            "presigned_url_expiry": 60,
+            # Small parts, so the test pdfs go through a multipart upload.
+            "multipart_threshold": 5 * 1024 * 1024,
+            "multipart_chunksize": 5 * 1024 * 1024,
+        },
+    },
+}
+
+
+@override_settings(STORAGES=S3_STORAGES)
+class S3StorageTestCase(APITestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username="testuser", password="testpass123")
+        token = Token.objects.create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+        self._original_throttle_classes = WorkbookViewSet.throttle_classes
+        WorkbookViewSet.throttle_classes = []
+
+        self.aws = mock_aws()
+        self.aws.start()
+        self.s3 = boto3.client(
+            "s3",
+            region_name="us-east-1",
+            aws_access_key_id="testing",
+            aws_secret_access_key="testing",
+        )
+        self.s3.create_bucket(Bucket=BUCKET)
+
+        # The pdf field evaluates its storage once, when models load.
+        self.pdf_field = Workbook._meta.get_field("pdf")
+        self._original_storage = self.pdf_field.storage
+        self.pdf_field.storage = storages["workbooks"]
+        self.artifact_file_field = WorkbookArtifact._meta.get_field("file")
+        self._original_artifact_storage = self.artifact_file_field.storage
+        self.artifact_file_field.storage = storages["workbooks"]
+
+        self.collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US", is_released=True
+        )
+
+    def tearDown(self):
+        """Ensure uploaded files are deleted after tests"""
+        Workbook.objects.all().delete()
+
+        self.pdf_field.storage = self._original_storage
+        self.artifact_file_field.storage = self._original_artifact_storage
+        self.aws.stop()
+
+        WorkbookViewSet.throttle_classes = self._original_throttle_classes
+
+    def upload(self, content, number=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("workbook-list"),
+                {
+                    "number": number,
+                    "collection": self.collection.id,
+                    "chapters": json.dumps(GOOD_CHAPTERS),
+                    "pdf": SimpleUploadedFile(name="test.pdf", content=content),
+                },
+                format="multipart",
+            )
+        self.assertEqual(201, response.status_code, response.content)
+        return Workbook.objects.get(pk=response.data["id"])
+
+    def bucket_keys(self):
+        return [
+            item["Key"]
+            for item in self.s3.list_objects_v2(Bucket=BUCKET).get("Contents", [])
+        ]
+
+    def test_upload_is_stored_in_the_bucket(self):
+        pdf = make_pdf([100, 200])
+        sha256 = hashlib.sha256(pdf).hexdigest()
+
+        workbook = self.upload(pdf)
+
+        key = f"blobs/{sha256[:2]}/{sha256}.pdf"
+        self.assertEqual(key, workbook.pdf.name)
+        # Next to its derived files.
+        artifacts = workbook.artifacts.values_list("file", flat=True)
+        self.assertEqual({key, *artifacts}, set(self.bucket_keys()))
+
+        stored = self.s3.get_object(Bucket=BUCKET, Key=key)
+        self.assertEqual("application/pdf", stored["ContentType"])
+        self.assertEqual(pdf, stored["Body"].read())
+
+        # Derived data is built from the bucket too.
+        workbook.refresh_from_db()
+        self.assertEqual(Workbook.ProcessingState.READY, workbook.processing_state)
+        self.assertEqual(2, len(workbook.page_hashes))
+
+    def test_upload_is_processed(self):
+        workbook = self.upload(make_pdf([100, 200]))
+
+        # Every stage reads the pdf from the bucket.
+        workbook.refresh_from_db()
+        self.assertEqual(Workbook.ProcessingState.READY, workbook.processing_state)
+        self.assertEqual(
+            set(WorkbookArtifact.Kind.values),
+            set(workbook.artifacts.values_list("kind", flat=True)),
+        )
+
+    def test_upload_is_processed_through_cached_storage(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        self.pdf_field.storage = CachedStorage(
+            backend=S3_STORAGES["workbooks"]["BACKEND"],
+            options=S3_STORAGES["workbooks"]["OPTIONS"],
+            cache_dir=cache_dir,
+            max_size=1024 * 1024,
+        )
+
+        workbook = self.upload(make_pdf([100, 200]))
+
+        workbook.refresh_from_db()
+        self.assertEqual(Workbook.ProcessingState.READY, workbook.processing_state)
+        self.assertEqual(
+            set(WorkbookArtifact.Kind.values),
+            set(workbook.artifacts.values_list("kind", flat=True)),
+        )
+        # Downloaded once, every other stage read the local copy.
+        self.assertEqual(1, self.pdf_field.storage.cache.misses)
+
+    def test_large_upload_is_multipart(self):
+        # Padding after %%EOF keeps the pdf readable while crossing the multipart threshold.
+        pdf = make_pdf([100]) + b"\n" * (12 * 1024 * 1024)
+        sha256 = hashlib.sha256(pdf).hexdigest()
+
+        workbook = self.upload(pdf)
+
+        head = self.s3.head_object(Bucket=BUCKET, Key=workbook.pdf.name)
+        self.assertEqual(len(pdf), head["ContentLength"])
+        # Multipart ETags are suffixed with the number of parts.
+        self.assertTrue(head["ETag"].strip('"').endswith("-3"), head["ETag"])
+        self.assertEqual(sha256, workbook.sha256)
+
+    def test_identical_pdfs_are_stored_once(self):
+        pdf = make_pdf([100])
+        self.upload(pdf, number=1)
+        # The pdf and its derived files.
+        keys = self.bucket_keys()
+        self.upload(pdf, number=2)
+
+        self.assertEqual(keys, self.bucket_keys())
+
+        Workbook.objects.get(number=1).delete()
+        self.assertEqual(keys, self.bucket_keys())
+
+        Workbook.objects.get(number=2).delete()
+        self.assertEqual([], self.bucket_keys())
+
+    def test_download_redirects_to_presigned_url(self):
+        pdf = make_pdf([100, 200])
+        workbook = self.upload(pdf)
+
+        response = self.client.get(reverse("workbook-pdf", args=[workbook.id]))
+
+        self.assertEqual(302, response.status_code)
+        self.assertIn("no-store", response["Cache-Control"])
+
+        # The linearized copy is served by default (see core/linearize.py).
+        linearized = workbook.artifacts.get(kind=WorkbookArtifact.Kind.LINEARIZED_PDF)
+        url = urlparse(response["Location"])
+        params = parse_qs(url.query)
+        self.assertTrue(url.path.endswith(linearized.file.name))
+        self.assertEqual(["60"], params["X-Amz-Expires"])
+        self.assertEqual(["application/pdf"], params["response-content-type"])
+        self.assertIn(
+            f"workbook-{workbook.number}.pdf",
+            params["response-content-disposition"][0],
+        )
+
+        response = self.client.get(
+            reverse("workbook-pdf", args=[workbook.id]), {"original": "true"}
+        )
+        self.assertEqual(302, response.status_code)
+        self.assertTrue(urlparse(response["Location"]).path.endswith(workbook.pdf.name))
+
+        storage = storages["workbooks"]
+        with storage.open(workbook.pdf.name) as file:
+            self.assertEqual(pdf, file.read())
+
+    def test_pdf_url_does_not_expire(self):
+        workbook = self.upload(make_pdf([100, 200]))
+
+        response = self.client.get(reverse("workbook-detail", args=[workbook.id]))
+
+        # Cached and ETag validated, a presigned url would go stale behind an unchanged ETag.
+        url = reverse("workbook-pdf", args=[workbook.id])
+        self.assertEqual(f"http://testserver{url}?original=true", response.data["pdf"])
+        with self.assertRaises(NotImplementedError):
+            storages["workbooks"].url(workbook.pdf.name)
+
+        response = self.client.get(response.data["pdf"])
+        self.assertEqual(302, response.status_code)
+        self.assertTrue(urlparse(response["Location"]).path.endswith(workbook.pdf.name))
+
+    def test_served_artifact_redirects(self):
+        workbook = self.upload(make_pdf([100, 200]))
+        artifact = save_artifact(
+            workbook, WorkbookArtifact.Kind.LINEARIZED_PDF, b"linearized", "pdf"
+        )
+        self.assertIn(artifact.file.name, self.bucket_keys())
+
+        response = self.client.get(reverse("workbook-pdf", args=[workbook.id]))
+
+        self.assertEqual(302, response.status_code)
+        self.assertTrue(
+            urlparse(response["Location"]).path.endswith(artifact.file.name)
+        )
+
+    def test_range_is_streamed(self):
+        pdf = make_pdf([100, 200])
+        workbook = self.upload(pdf)
+
+        chunks = list(
+            storages["workbooks"].iter_range(workbook.pdf.name, 10, 100, chunk_size=32)
+        )
+
+        self.assertEqual(pdf[10:110], b"".join(chunks))
+        self.assertEqual(4, len(chunks))
+
+    def test_cached_storage(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        storage = CachedStorage(
+            backend=S3_STORAGES["workbooks"]["BACKEND"],
+            options=S3_STORAGES["workbooks"]["OPTIONS"],
+            cache_dir=cache_dir,
+            max_size=1024 * 1024,
+        )
+
+        pdf = make_pdf([100, 200])
+        name = storage.save("test.pdf", ContentFile(pdf))
+        self.assertEqual([name], self.bucket_keys())
+
+        with storage.open(name) as file:
+            self.assertEqual(pdf, file.read())
+
+        # Read from the local copy from now on.
+        self.s3.delete_object(Bucket=BUCKET, Key=name)
+        with storage.open(name) as file:
+            self.assertEqual(pdf, file.read())
+        self.assertEqual(1, storage.cache.misses)
+
+        # Downloads still go straight to the bucket.
+        self.assertIn("X-Amz-Signature", storage.download_url(name))
@@ -0,0 +1,191 @@
+import io
+import json
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.urls import reverse
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from core.models import Collection, Workbook, WorkbookArtifact
+from core.search import SearchIndex, build_index
+from core.views import WorkbookViewSet
+from .constants import GOOD_CHAPTERS
+
+
+def make_text_pdf(page_texts):
+    """A pdf with one page per text, written in Helvetica."""
+    writer = PdfWriter()
+    font = writer._add_object(
+        DictionaryObject(
+            {
+                NameObject("/Type"): NameObject("/Font"),
+                NameObject("/Subtype"): NameObject("/Type1"),
+                NameObject("/BaseFont"): NameObject("/Helvetica"),
+            }
+        )
+    )
+
+    for text in page_texts:
+        page = writer.add_blank_page(width=300, height=100)
+        page[NameObject("/Resources")] = DictionaryObject(
+            {
+                NameObject("/Font"): DictionaryObject({NameObject("/F1"): font}),
+            }
+        )
+        content = DecodedStreamObject()
+        content.set_data(f"BT /F1 12 Tf 10 50 Td ({text}) Tj ET".encode())
+        page[NameObject("/Contents")] = writer._add_object(content)
+
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+class SearchIndexTestCase(APITestCase):
+
+    def test_search_ranks_pages(self):
+        index = SearchIndex(
+            build_index(
+                [
+                    "Heat flows from hot to cold.",
+                    "Buoyancy: a boat floats. Buoyancy depends on density.",
+                    "Nothing to see here, buoyancy aside.",
+                ]
+            )
+        )
+
+        results = index.search("BUOYANCY")
+
+        self.assertEqual([1, 2], [page for page, _, _ in results])
+        self.assertEqual([(0, 8), (25, 8)], results[0][2])
+        self.assertEqual([], index.search("magnetism"))
+        self.assertEqual([], index.search("   "))
+
+    def test_snippet_highlights(self):
+        index = SearchIndex(build_index(["x " * 100 + "energy is conserved"]))
+
+        (page, _, occurrences), *_ = index.search("energy")
+        snippet, highlights = index.snippet(page, occurrences)
+
+        start, length = highlights[0]
+        self.assertEqual("energy", snippet[start : start + length])
+
+    def test_rejects_other_files(self):
+        with self.assertRaises(ValueError):
+            SearchIndex(b"%PDF-1.4" + bytes(64))
+
+
+class WorkbookSearchTestCase(APITestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username="testuser", password="testpass123")
+        self.token = Token.objects.create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+        self._original_throttle_classes = WorkbookViewSet.throttle_classes
+        WorkbookViewSet.throttle_classes = []
+
+        # Search indexes are written to storage, keep them out of the development media root.
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        self.collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US", is_released=True
+        )
+
+        page_texts = ["Page about nothing"] * 16
+        page_texts[0] = "Title page of the workbook"
+        page_texts[5] = "Energy of matter"
+        page_texts[15] = "Atomic mass and energy of energy"
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("workbook-list"),
+                {
+                    "number": 1,
+                    "collection": self.collection.id,
+                    "chapters": json.dumps(GOOD_CHAPTERS),
+                    "pdf": SimpleUploadedFile(
+                        name="test.pdf", content=make_text_pdf(page_texts)
+                    ),
+                },
+                format="multipart",
+            )
+        self.assertEqual(201, response.status_code, response.content)
+        self.workbook = Workbook.objects.get(pk=response.data["id"])
+        self.url = reverse("workbook-search", args=[self.workbook.id])
+
+        self.client.credentials()
+
+    def tearDown(self):
+        """Ensure uploaded files are deleted after tests"""
+        Workbook.objects.all().delete()
+
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+        WorkbookViewSet.throttle_classes = self._original_throttle_classes
+
+    def test_index_built_on_upload(self):
+        artifact = WorkbookArtifact.objects.get(
+            workbook=self.workbook, kind=WorkbookArtifact.Kind.SEARCH_INDEX
+        )
+
+        self.assertEqual(artifact.file.size, artifact.size)
+
+    def test_search(self):
+        response = self.client.get(self.url, {"q": "energy"})
+
+        self.assertEqual(200, response.status_code)
+        results = response.data["results"]
+        self.assertEqual([16, 6], [result["page"] for result in results])
+
+        # Pages are 1 based, like the chapters start pages.
+        self.assertEqual("atomic_mass", results[0]["chapter"]["id"])
+        self.assertEqual("matter_energy_intro", results[1]["chapter"]["id"])
+        self.assertEqual(2, results[0]["matches"])
+
+        highlight = results[1]["highlights"][0]
+        self.assertEqual(
+            "Energy",
+            results[1]["snippet"][
+                highlight["start"] : highlight["start"] + highlight["length"]
+            ],
+        )
+
+    def test_search_before_first_chapter(self):
+        response = self.client.get(self.url, {"q": "title"})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(1, response.data["results"][0]["page"])
+        self.assertIsNone(response.data["results"][0]["chapter"])
+
+    def test_search_without_index_builds_it(self):
+        WorkbookArtifact.objects.all().delete()
+
+        response = self.client.get(self.url, {"q": "matter"})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([6], [result["page"] for result in response.data["results"]])
+        self.assertTrue(
+            WorkbookArtifact.objects.filter(workbook=self.workbook).exists()
+        )
+
+    def test_search_requires_query(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(400, response.status_code)
+
+    def test_search_unreleased_workbook_without_auth_returns_404(self):
+        self.collection.is_released = False
+        self.collection.save()
+
+        response = self.client.get(self.url, {"q": "energy"})
+
+        self.assertEqual(404, response.status_code)
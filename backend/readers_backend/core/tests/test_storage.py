@@ -0,0 +1,255 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from core.artifacts import save_artifact
+from core.models import Collection, Workbook, WorkbookArtifact
+from core.storage import CachedStorage, blob_name, workbook_storage
+from core.views import WorkbookViewSet
+from .constants import GOOD_CHAPTERS
+from .test_delta import make_pdf
+
+
+class ContentAddressedStorageTestCase(APITestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username="testuser", password="testpass123")
+        token = Token.objects.create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+        self._original_throttle_classes = WorkbookViewSet.throttle_classes
+        WorkbookViewSet.throttle_classes = []
+
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        self.collections = [
+            Collection.objects.create(
+                major_version=1, minor_version=minor_version, localization="en-US"
+            )
+            for minor_version in (0, 1)
+        ]
+        self.pdf = make_pdf([100, 200])
+        self.sha256 = hashlib.sha256(self.pdf).hexdigest()
+
+    def tearDown(self):
+        """Ensure uploaded files are deleted after tests"""
+        Workbook.objects.all().delete()
+
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+        WorkbookViewSet.throttle_classes = self._original_throttle_classes
+
+    def upload(self, collection, content, name="test.pdf", number=1):
+        response = self.client.post(
+            reverse("workbook-list"),
+            {
+                "number": number,
+                "collection": collection.id,
+                "chapters": json.dumps(GOOD_CHAPTERS),
+                "pdf": SimpleUploadedFile(name=name, content=content),
+            },
+            format="multipart",
+        )
+        self.assertEqual(201, response.status_code, response.content)
+        return Workbook.objects.get(pk=response.data["id"])
+
+    def stored_pdfs(self):
+        return sorted(
+            name
+            for _, _, names in os.walk(self.media_root)
+            for name in names
+            if name.endswith(".pdf")
+        )
+
+    def test_pdf_is_stored_under_its_hash(self):
+        workbook = self.upload(self.collections[0], self.pdf)
+
+        self.assertEqual(
+            f"blobs/{self.sha256[:2]}/{self.sha256}.pdf", workbook.pdf.name
+        )
+        self.assertEqual(self.sha256, workbook.sha256)
+
+        response = self.client.get(reverse("workbook-detail", args=[workbook.id]))
+        self.assertEqual(self.sha256, response.data["sha256"])
+
+    def test_sha256_is_set_on_create(self):
+        workbook = Workbook.objects.create(
+            number=1,
+            collection=self.collections[0],
+            chapters=GOOD_CHAPTERS,
+            pdf=ContentFile(self.pdf, name="test.pdf"),
+        )
+
+        workbook.refresh_from_db()
+        self.assertEqual(self.sha256, workbook.sha256)
+
+    def test_identical_pdfs_are_stored_once(self):
+        first = self.upload(self.collections[0], self.pdf, name="first.pdf")
+        second = self.upload(self.collections[1], self.pdf, name="second.pdf")
+
+        self.assertEqual(first.pdf.name, second.pdf.name)
+        self.assertEqual([f"{self.sha256}.pdf"], self.stored_pdfs())
+
+        other = self.upload(self.collections[1], make_pdf([300]), number=2)
+        self.assertNotEqual(first.pdf.name, other.pdf.name)
+        self.assertEqual(2, len(self.stored_pdfs()))
+
+    def test_shared_pdf_is_deleted_with_its_last_workbook(self):
+        first = self.upload(self.collections[0], self.pdf)
+        second = self.upload(self.collections[1], self.pdf)
+        name = first.pdf.name
+
+        first.delete()
+        self.assertTrue(workbook_storage().exists(name))
+
+        response = self.client.get(reverse("workbook-pdf", args=[second.id]))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(f'"{self.sha256}"', response["ETag"])
+        self.assertEqual(self.pdf, b"".join(response.streaming_content))
+
+        second.delete()
+        self.assertFalse(workbook_storage().exists(name))
+
+    def test_shared_artifact_is_deleted_with_its_last_workbook(self):
+        workbooks = [
+            self.upload(collection, self.pdf) for collection in self.collections
+        ]
+        # Identical pdfs, identical derived files.
+        artifacts = [
+            save_artifact(
+                workbook, WorkbookArtifact.Kind.LINEARIZED_PDF, b"linearized", "pdf"
+            )
+            for workbook in workbooks
+        ]
+        name = artifacts[0].file.name
+        self.assertEqual(
+            blob_name(hashlib.sha256(b"linearized").hexdigest(), name), name
+        )
+        self.assertEqual(name, artifacts[1].file.name)
+
+        workbooks[0].delete()
+        self.assertTrue(workbook_storage().exists(name))
+
+        workbooks[1].delete()
+        self.assertFalse(workbook_storage().exists(name))
+
+    def test_artifact_same_as_its_pdf(self):
+        workbook = self.upload(self.collections[0], self.pdf)
+        artifact = save_artifact(
+            workbook, WorkbookArtifact.Kind.LINEARIZED_PDF, self.pdf, "pdf"
+        )
+        self.assertEqual(workbook.pdf.name, artifact.file.name)
+
+        workbook.delete()
+        self.assertEqual([], self.stored_pdfs())
+
+
+class CachedStorageTestCase(APITestCase):
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.storage = CachedStorage(
+            backend="core.storage.ContentAddressedFileSystemStorage",
+            options={"location": self.location},
+            cache_dir=self.cache_dir,
+            max_size=1024 * 1024,
+        )
+        self.pdf = make_pdf([100, 200])
+
+    def tearDown(self):
+        shutil.rmtree(self.location, ignore_errors=True)
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def read(self, name):
+        with self.storage.open(name, "rb") as file:
+            return file.read()
+
+    def test_read_through(self):
+        name = self.storage.save("test.pdf", ContentFile(self.pdf))
+        self.assertTrue(name.startswith("blobs/"))
+
+        self.assertEqual(self.pdf, self.read(name))
+        self.assertEqual(self.pdf, self.read(name))
+        self.assertEqual(1, self.storage.cache.misses)
+        self.assertEqual(1, self.storage.cache.hits)
+
+        # Served from the local copy, whatever happens to the backend.
+        os.unlink(os.path.join(self.location, name))
+        self.assertEqual(self.pdf, self.read(name))
+
+        self.assertEqual(
+            self.pdf[10:50],
+            b"".join(self.storage.iter_range(name, 10, 40, chunk_size=16)),
+        )
+
+    def test_deleted_with_backend_file(self):
+        name = self.storage.save("test.pdf", ContentFile(self.pdf))
+        self.read(name)
+
+        self.storage.delete(name)
+
+        self.assertFalse(self.storage.exists(name))
+        self.assertEqual(0, self.storage.cache.size())
+
+    def test_concurrent_reads_fill_once(self):
+        name = self.storage.save("test.pdf", ContentFile(self.pdf))
+        fill = self.storage._fill
+
+        started = threading.Barrier(4)
+        results = []
+
+        def slow_fill(name, file):
+            # Every reader has missed by the time the first fill writes.
+            threading.Event().wait(0.2)
+            fill(name, file)
+
+        self.storage._fill = slow_fill
+
+        def read():
+            started.wait()
+            results.append(self.read(name))
+
+        threads = [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([self.pdf] * 4, results)
+        self.assertEqual(1, self.storage.cache.misses)
+        self.assertEqual(3, self.storage.cache.hits)
+
+    def test_evicts_least_recently_used(self):
+        self.storage.max_size = len(self.pdf) * 2
+        names = [
+            self.storage.save("test.pdf", ContentFile(make_pdf([width])))
+            for width in (100, 200, 300)
+        ]
+
+        for name in names:
+            self.read(name)
+
+        stats = self.storage.cache.stats()
+        self.assertEqual(1, stats["evictions"])
+        self.assertLessEqual(stats["size"], stats["max_size"])
+
+    def test_other_names_are_not_cached(self):
+        with open(os.path.join(self.location, "notes.txt"), "wb") as file:
+            file.write(b"notes")
+
+        self.assertEqual(b"notes", self.read("notes.txt"))
+        self.assertEqual(0, self.storage.cache.misses)
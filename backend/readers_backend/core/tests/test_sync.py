@@ -0,0 +1,272 @@
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from core.models import CatalogChange, Collection, Workbook
+from core.views import SyncView, WorkbookViewSet
+from .constants import GOOD_CHAPTERS
+from .test_delta import make_pdf
+
+
+class SyncTestCase(APITestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username="testuser", password="testpass123")
+        self.token = Token.objects.create(user=user)
+
+        self.url = reverse("sync")
+
+        self._original_throttle_classes = SyncView.throttle_classes
+        SyncView.throttle_classes = []
+
+    def tearDown(self):
+        SyncView.throttle_classes = self._original_throttle_classes
+
+    def sync(self, since=None):
+        if since is None:
+            response = self.client.get(self.url)
+        else:
+            response = self.client.get(f"{self.url}?since={since}")
+
+        self.assertEqual(
+            200,
+            response.status_code,
+            f"Sync failed with {response.status_code}: {response.content}",
+        )
+        return response.data
+
+    def test_first_sync_returns_everything(self):
+        collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US", is_released=True
+        )
+        workbook = Workbook.objects.create(
+            number=1, collection=collection, chapters=GOOD_CHAPTERS, pdf=None
+        )
+
+        data = self.sync()
+
+        self.assertTrue(data["reset"])
+        self.assertEqual([collection.id], [c["id"] for c in data["collections"]])
+        self.assertEqual([workbook.id], [w["id"] for w in data["workbooks"]])
+        self.assertEqual(GOOD_CHAPTERS, data["workbooks"][0]["chapters"])
+
+    def test_sync_without_changes_is_empty(self):
+        collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US", is_released=True
+        )
+        Workbook.objects.create(
+            number=1, collection=collection, chapters=GOOD_CHAPTERS, pdf=None
+        )
+
+        token = self.sync()["token"]
+        data = self.sync(token)
+
+        self.assertFalse(data["reset"])
+        self.assertEqual(token, data["token"])
+        self.assertEqual([], data["collections"])
+        self.assertEqual([], data["workbooks"])
+        self.assertEqual({"collections": [], "workbooks": []}, data["removed"])
+
+    def test_sync_returns_only_changed_workbooks(self):
+        collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US", is_released=True
+        )
+        Workbook.objects.create(
+            number=1, collection=collection, chapters=GOOD_CHAPTERS, pdf=None
+        )
+        changed = Workbook.objects.create(
+            number=2, collection=collection, chapters=GOOD_CHAPTERS, pdf=None
+        )
+
+        token = self.sync()["token"]
+
+        changed.chapters = GOOD_CHAPTERS[:1]
+        changed.save()
+
+        data = self.sync(token)
+
+        self.assertEqual([], data["collections"])
+        self.assertEqual([changed.id], [w["id"] for w in data["workbooks"]])
+        self.assertEqual(GOOD_CHAPTERS[:1], data["workbooks"][0]["chapters"])
+        self.assertNotEqual(token, data["token"])
+
+    def test_sync_reports_deletes(self):
+        collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US", is_released=True
+        )
+        workbook = Workbook.objects.create(
+            number=1, collection=collection, chapters=GOOD_CHAPTERS, pdf=None
+        )
+
+        token = self.sync()["token"]
+
+        workbook_id = workbook.id
+        workbook.delete()
+
+        data = self.sync(token)
+        self.assertEqual([workbook_id], data["removed"]["workbooks"])
+
+        token = data["token"]
+        collection_id = collection.id
+        collection.delete()
+
+        data = self.sync(token)
+        self.assertEqual([collection_id], data["removed"]["collections"])
+
+    def test_sync_release_and_unrelease_without_auth(self):
+        collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US"
+        )
+        workbook = Workbook.objects.create(
+            number=1, collection=collection, chapters=GOOD_CHAPTERS, pdf=None
+        )
+
+        data = self.sync()
+        self.assertEqual([], data["collections"])
+        self.assertEqual([], data["workbooks"])
+
+        collection.is_released = True
+        collection.save()
+
+        data = self.sync(data["token"])
+        self.assertEqual([collection.id], [c["id"] for c in data["collections"]])
+        self.assertEqual(
+            [workbook.id],
+            [w["id"] for w in data["workbooks"]],
+            "Releasing a collection should sync its workbooks.",
+        )
+
+        collection.is_released = False
+        collection.save()
+
+        data = self.sync(data["token"])
+        self.assertEqual([], data["collections"])
+        self.assertEqual([collection.id], data["removed"]["collections"])
+        self.assertEqual([workbook.id], data["removed"]["workbooks"])
+
+    def test_sync_doesnt_report_drafts_as_removed(self):
+        collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US"
+        )
+        token = self.sync()["token"]
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.addCleanup(
+            setattr,
+            WorkbookViewSet,
+            "throttle_classes",
+            WorkbookViewSet.throttle_classes,
+        )
+        WorkbookViewSet.throttle_classes = []
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        # Processing logs the workbook as updated once more.
+        with override_settings(MEDIA_ROOT=media_root), self.captureOnCommitCallbacks(
+            execute=True
+        ):
+            response = self.client.post(
+                reverse("workbook-list"),
+                {
+                    "number": 1,
+                    "collection": collection.id,
+                    "chapters": json.dumps(GOOD_CHAPTERS),
+                    "pdf": SimpleUploadedFile(name="test.pdf", content=make_pdf([100])),
+                },
+                format="multipart",
+            )
+            self.assertEqual(201, response.status_code, response.content)
+        self.client.credentials()
+
+        data = self.sync(token)
+        self.assertEqual([], data["workbooks"])
+        self.assertEqual({"collections": [], "workbooks": []}, data["removed"])
+
+    def test_sync_unreleased_changes_with_auth(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+        token = self.sync()["token"]
+
+        collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US"
+        )
+
+        data = self.sync(token)
+        self.assertEqual([collection.id], [c["id"] for c in data["collections"]])
+
+    def test_sync_token_waits_for_uncommitted_changes(self):
+        collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US", is_released=True
+        )
+        token = self.sync()["token"]
+
+        first = Workbook.objects.create(
+            number=1, collection=collection, chapters=GOOD_CHAPTERS, pdf=None
+        )
+        second = Workbook.objects.create(
+            number=2, collection=collection, chapters=GOOD_CHAPTERS, pdf=None
+        )
+        # As if the first workbook's transaction hadn't committed yet.
+        pending = CatalogChange.objects.get(
+            kind=CatalogChange.Kind.WORKBOOK, object_id=first.id
+        )
+        CatalogChange.objects.filter(id=pending.id).delete()
+
+        data = self.sync(token)
+        self.assertEqual([second.id], [w["id"] for w in data["workbooks"]])
+        self.assertEqual(token, data["token"])
+
+        pending.save()
+
+        data = self.sync(data["token"])
+        self.assertEqual(
+            [first.id, second.id], sorted(w["id"] for w in data["workbooks"])
+        )
+        self.assertEqual(str(CatalogChange.objects.last().id), data["token"])
+
+    def test_sync_token_skips_rolled_back_changes(self):
+        collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US", is_released=True
+        )
+        workbook = Workbook.objects.create(
+            number=1, collection=collection, chapters=GOOD_CHAPTERS, pdf=None
+        )
+        change = CatalogChange.objects.get(
+            kind=CatalogChange.Kind.WORKBOOK, object_id=workbook.id
+        )
+        # An id a rolled back transaction used.
+        change.id += 1
+        change.save()
+        CatalogChange.objects.filter(id=change.id - 1).delete()
+
+        self.assertNotEqual(str(change.id), self.sync()["token"])
+
+        CatalogChange.objects.update(
+            created_at=timezone.now()
+            - timedelta(seconds=settings.SYNC_TRANSACTION_WINDOW + 1)
+        )
+        self.assertEqual(str(change.id), self.sync()["token"])
+
+    def test_sync_with_unknown_token_resets(self):
+        Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US", is_released=True
+        )
+
+        data = self.sync(10**9)
+
+        self.assertTrue(data["reset"])
+        self.assertEqual(1, len(data["collections"]))
+
+    def test_sync_with_invalid_token(self):
+        response = self.client.get(f"{self.url}?since=not_a_token")
+
+        self.assertEqual(400, response.status_code)
@@ -0,0 +1,116 @@
+import io
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APITestCase
+from core.models import Collection, Workbook, WorkbookArtifact
+from core.pipeline import process_workbook
+from core.thumbnails import IMAGE_EXTENSION, PAGE_THUMBNAIL_WIDTH
+from core.views import WorkbookViewSet
+from .constants import GOOD_CHAPTERS
+from .test_search import make_text_pdf
+
+
+class WorkbookThumbnailsTestCase(APITestCase):
+
+    def setUp(self):
+        self._original_throttle_classes = WorkbookViewSet.throttle_classes
+        WorkbookViewSet.throttle_classes = []
+
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        self.collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en_US", is_released=True
+        )
+        self.workbook = Workbook.objects.create(
+            number=1,
+            collection=self.collection,
+            chapters=GOOD_CHAPTERS,
+            pdf=ContentFile(
+                make_text_pdf([f"Page {page}" for page in range(1, 13)]),
+                name="test.pdf",
+            ),
+        )
+        process_workbook(self.workbook.id)
+
+    def tearDown(self):
+        """Ensure uploaded files are deleted after tests"""
+        Workbook.objects.all().delete()
+
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+        WorkbookViewSet.throttle_classes = self._original_throttle_classes
+
+    def download(self, url):
+        response = self.client.get(url)
+        self.assertEqual(200, response.status_code)
+        return response, Image.open(io.BytesIO(b"".join(response.streaming_content)))
+
+    def test_images_listed(self):
+        response = self.client.get(reverse("workbook-detail", args=[self.workbook.id]))
+        images = response.data["images"]
+
+        self.assertEqual(
+            [160, 320, 640], [cover["width"] for cover in images["covers"]]
+        )
+        self.assertEqual(12, images["pages"]["pages"])
+        self.assertEqual(10, images["pages"]["columns"])
+        self.assertEqual(PAGE_THUMBNAIL_WIDTH, images["pages"]["tile_width"])
+
+        # Collections list them too, so catalogs need one request.
+        response = self.client.get(
+            reverse("collection-detail", args=[self.collection.id])
+        )
+        self.assertEqual(images, response.data["workbooks"][0]["images"])
+
+    def test_download_cover(self):
+        images = self.client.get(
+            reverse("workbook-detail", args=[self.workbook.id])
+        ).data["images"]
+        cover = images["covers"][1]
+
+        response, image = self.download(cover["url"])
+
+        self.assertEqual(f"image/{IMAGE_EXTENSION}", response["Content-Type"])
+        self.assertEqual((cover["width"], cover["height"]), image.size)
+
+        artifact = WorkbookArtifact.objects.get(
+            workbook=self.workbook, kind=WorkbookArtifact.Kind.COVER_MEDIUM
+        )
+        self.assertEqual(f'"{artifact.sha256}"', response["ETag"])
+
+    def test_download_page_thumbnails(self):
+        pages = self.client.get(
+            reverse("workbook-detail", args=[self.workbook.id])
+        ).data["images"]["pages"]
+
+        _, image = self.download(pages["url"])
+
+        # 12 pages in rows of 10.
+        self.assertEqual(
+            (10 * pages["tile_width"], 2 * pages["tile_height"]), image.size
+        )
+
+    def test_unknown_image(self):
+        response = self.client.get(
+            reverse("workbook-image", args=[self.workbook.id, "search_index"])
+        )
+        self.assertEqual(404, response.status_code)
+
+    def test_index_uses_rendered_covers(self):
+        response = self.client.get(reverse("index"))
+
+        self.assertContains(
+            response,
+            reverse(
+                "workbook-image",
+                args=[self.workbook.id, WorkbookArtifact.Kind.COVER_LARGE],
+            ),
+        )
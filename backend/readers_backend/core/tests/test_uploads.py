@@ -0,0 +1,205 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from core import uploads
+from core.models import Collection, UploadSession, Workbook
+from .constants import GOOD_CHAPTERS
+from .test_delta import make_pdf
+
+
+class UploadTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="testuser", password="testpass123"
+        )
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        self.collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US"
+        )
+        self.pdf = make_pdf([100, 200, 300])
+        self.sha256 = hashlib.sha256(self.pdf).hexdigest()
+
+    def tearDown(self):
+        """Ensure uploaded files are deleted after tests"""
+        Workbook.objects.all().delete()
+
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def start(self, length=None):
+        response = self.client.post(
+            reverse("upload-list"),
+            {
+                "collection": self.collection.id,
+                "number": 1,
+                "chapters": GOOD_CHAPTERS,
+                "filename": "workbook.pdf",
+                "length": len(self.pdf) if length is None else length,
+            },
+            format="json",
+        )
+        self.assertEqual(201, response.status_code, response.content)
+        return response
+
+    def send(self, url, offset, chunk):
+        return self.client.generic(
+            "PATCH",
+            url,
+            chunk,
+            content_type="application/offset+octet-stream",
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def finalize(self, url, **data):
+        # Runs the processing scheduled once the workbook is committed.
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(url + "finalize/", data, format="json")
+
+    def test_chunked_upload(self):
+        response = self.start()
+        url = response["Location"]
+        self.assertEqual("0", response["Upload-Offset"])
+
+        middle = len(self.pdf) // 2
+        response = self.send(url, 0, self.pdf[:middle])
+        self.assertEqual(204, response.status_code, response.content)
+        self.assertEqual(str(middle), response["Upload-Offset"])
+
+        # What a client resuming after a drop asks.
+        response = self.client.head(url)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(str(middle), response["Upload-Offset"])
+        self.assertEqual(str(len(self.pdf)), response["Upload-Length"])
+
+        response = self.send(url, middle, self.pdf[middle:])
+        self.assertEqual(204, response.status_code, response.content)
+
+        response = self.finalize(url, sha256=self.sha256)
+        self.assertEqual(201, response.status_code, response.content)
+
+        workbook = Workbook.objects.get(pk=response.data["id"])
+        self.assertEqual(self.sha256, workbook.sha256)
+        with workbook.pdf.open("rb") as file:
+            self.assertEqual(self.pdf, file.read())
+        self.assertEqual(3, len(workbook.page_hashes))
+
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual([], os.listdir(os.path.join(self.media_root, "uploads")))
+
+    def test_chunk_at_wrong_offset_is_rejected(self):
+        url = self.start()["Location"]
+        self.send(url, 0, self.pdf[:10])
+
+        response = self.send(url, 5, self.pdf[5:20])
+        self.assertEqual(409, response.status_code)
+        self.assertEqual("10", response["Upload-Offset"])
+
+        response = self.send(url, 10, self.pdf[10:] + b"extra")
+        self.assertEqual(413, response.status_code)
+
+    def test_upload_in_use_is_busy(self):
+        url = self.start()["Location"]
+        self.send(url, 0, self.pdf)
+        session = UploadSession.objects.get()
+
+        # As if another request was receiving a chunk.
+        with uploads.lock_upload(session):
+            response = self.send(url, len(self.pdf), b"")
+            self.assertEqual(409, response.status_code)
+            self.assertEqual(str(len(self.pdf)), response["Upload-Offset"])
+
+            response = self.finalize(url, sha256=self.sha256)
+            self.assertEqual(409, response.status_code)
+
+        self.assertFalse(Workbook.objects.exists())
+        self.assertEqual(201, self.finalize(url, sha256=self.sha256).status_code)
+
+    def test_finalized_once(self):
+        url = self.start()["Location"]
+        self.send(url, 0, self.pdf)
+        session = UploadSession.objects.get()
+
+        self.assertEqual(201, self.finalize(url).status_code)
+
+        # A finalize that found the session just before it was deleted.
+        with self.assertRaises(UploadSession.DoesNotExist):
+            with uploads.lock_upload(session):
+                pass
+        self.assertEqual(404, self.finalize(url).status_code)
+        self.assertEqual(1, Workbook.objects.count())
+
+    def test_hash_survives_another_process(self):
+        url = self.start()["Location"]
+        self.send(url, 0, self.pdf[:100])
+
+        # As if the next chunk landed on a process that never saw the first one.
+        uploads._hashers.clear()
+        self.send(url, 100, self.pdf[100:])
+
+        response = self.finalize(url, sha256=self.sha256)
+        self.assertEqual(201, response.status_code, response.content)
+
+    def test_finalize_checks_upload(self):
+        url = self.start()["Location"]
+        self.send(url, 0, self.pdf[:10])
+
+        response = self.finalize(url)
+        self.assertEqual(409, response.status_code)
+
+        self.send(url, 10, self.pdf[10:])
+        response = self.finalize(url, sha256="0" * 64)
+        self.assertEqual(400, response.status_code)
+        self.assertIn("sha256", response.data)
+
+        self.assertFalse(Workbook.objects.exists())
+        self.assertTrue(UploadSession.objects.exists())
+
+    def test_start_validates_workbook(self):
+        response = self.client.post(
+            reverse("upload-list"),
+            {
+                "collection": self.collection.id,
+                "number": 1,
+                "chapters": [],
+                "filename": "workbook.pdf",
+                "length": 0,
+            },
+            format="json",
+        )
+        self.assertEqual(400, response.status_code)
+        self.assertIn("chapters", response.data)
+        self.assertIn("length", response.data)
+
+    def test_sessions_are_private(self):
+        url = self.start()["Location"]
+
+        other = User.objects.create_user(username="other", password="testpass123")
+        token = Token.objects.create(user=other)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        self.assertEqual(404, self.client.head(url).status_code)
+
+        self.client.credentials()
+        self.assertEqual(401, self.client.head(url).status_code)
+
+    def test_abort(self):
+        url = self.start()["Location"]
+        self.send(url, 0, self.pdf[:10])
+
+        response = self.client.delete(url)
+        self.assertEqual(204, response.status_code)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(404, self.client.head(url).status_code)
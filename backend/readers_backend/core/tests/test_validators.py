@@ -0,0 +1,174 @@
+import copy
+import json
+
+import jsonschema
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from core.models import Collection, Workbook
+from core.validators import CHAPTERS_SCHEMA, validate_chapters
+from .constants import GOOD_CHAPTERS
+
+
+def chapter(chapter_id, chap_num, start_page, requires=None):
+    return {
+        "requires": requires or [],
+        "title": f"Chapter {chap_num}",
+        "id": chapter_id,
+        "chap_num": chap_num,
+        "start_page": start_page,
+        "covers": [],
+    }
+
+
+class ChaptersValidatorTestCase(APITestCase):
+
+    def test_good_chapters(self):
+        result = validate_chapters(GOOD_CHAPTERS)
+
+        self.assertTrue(result.is_valid, result.messages())
+
+    def test_matches_jsonschema(self):
+        cases = [
+            [],
+            {},
+            ["chapter"],
+            [{**GOOD_CHAPTERS[0], "title": ""}],
+            [{**GOOD_CHAPTERS[0], "chap_num": "1"}],
+            [{**GOOD_CHAPTERS[0], "chap_num": True}],
+            [{**GOOD_CHAPTERS[0], "chap_num": 1.0}],
+            [{**GOOD_CHAPTERS[0], "book": "01"}],
+            [{**GOOD_CHAPTERS[0], "covers": {}}],
+            [{**GOOD_CHAPTERS[0], "requires": [1]}],
+            [{**GOOD_CHAPTERS[0], "covers": [{"id": "a"}]}],
+            [
+                {
+                    **GOOD_CHAPTERS[0],
+                    "covers": [{"id": "a", "desc": "b", "videos": [{}]}],
+                }
+            ],
+        ]
+        for field in ["title", "id", "chap_num", "start_page", "covers"]:
+            missing = copy.deepcopy(GOOD_CHAPTERS[:1])
+            del missing[0][field]
+            cases.append(missing)
+
+        for case in cases:
+            expected = jsonschema.Draft7Validator(CHAPTERS_SCHEMA).is_valid(case)
+            self.assertEqual(
+                expected,
+                validate_chapters(case).is_valid,
+                f"Expected valid={expected} for {case}.",
+            )
+
+    def test_reports_all_errors(self):
+        chapters = [
+            {**chapter("a", 1, 1), "title": ""},
+            {**chapter("b", 2, 5), "covers": [{"id": "cover"}]},
+            "chapter",
+        ]
+
+        result = validate_chapters(chapters)
+
+        self.assertEqual(
+            [
+                "chapters[0].title: Must not be empty.",
+                "chapters[1].covers[0].desc: This field is required.",
+                "chapters[2]: Must be an object.",
+            ],
+            result.messages(),
+        )
+
+    def test_duplicate_ids(self):
+        result = validate_chapters([chapter("a", 1, 1), chapter("a", 2, 5)])
+
+        self.assertEqual(
+            ["chapters[1].id: Duplicate chapter id 'a', also used by chapters[0]."],
+            result.messages(),
+        )
+
+    def test_start_pages_increase(self):
+        result = validate_chapters(
+            [chapter("a", 1, 5), chapter("b", 2, 5), chapter("c", 3, 3)]
+        )
+
+        self.assertEqual(
+            [
+                "chapters[1].start_page: Must be greater than the start page of the previous chapter (5).",
+                "chapters[2].start_page: Must be greater than the start page of the previous chapter (5).",
+            ],
+            result.messages(),
+        )
+
+    def test_chapter_numbers_contiguous(self):
+        result = validate_chapters(
+            [chapter("a", 1, 1), chapter("b", 3, 5), chapter("c", 4, 9)]
+        )
+
+        self.assertEqual(
+            ["chapters[1].chap_num: Must be 2, chapter numbers are contiguous."],
+            result.messages(),
+        )
+
+    def test_requires(self):
+        result = validate_chapters(
+            [
+                chapter("a", 1, 1, requires=["b"]),
+                chapter("b", 2, 5, requires=["a", "b", "other"]),
+            ]
+        )
+
+        # Any chapter of the workbook can be required, whatever its position.
+        self.assertTrue(result.is_valid, result.messages())
+        self.assertEqual({"other"}, result.external_requires)
+
+
+class WorkbookChaptersValidationTestCase(APITestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username="testuser", password="testpass123")
+        token = Token.objects.create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+        self.collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US"
+        )
+
+    def tearDown(self):
+        """Ensure uploaded files are deleted after tests"""
+        Workbook.objects.all().delete()
+
+    def upload(self, number, chapters):
+        return self.client.post(
+            reverse("workbook-list"),
+            {
+                "number": number,
+                "collection": self.collection.id,
+                "chapters": json.dumps(chapters),
+                "pdf": SimpleUploadedFile(
+                    name="test.pdf", content=b"%PDF-1.4 fake pdf content"
+                ),
+            },
+            format="multipart",
+        )
+
+    def test_all_errors_returned(self):
+        response = self.upload(1, [chapter("a", 1, 5), chapter("a", 3, 2)])
+
+        self.assertEqual(400, response.status_code)
+        self.assertEqual(3, len(response.json()["chapters"]))
+
+    def test_requires_chapters_of_other_workbooks(self):
+        response = self.upload(1, [chapter("atom", 1, 1)])
+        self.assertEqual(201, response.status_code, response.content)
+
+        with self.assertNoLogs("core.serializers", level="WARNING"):
+            response = self.upload(2, [chapter("mole", 1, 1, requires=["atom"])])
+        self.assertEqual(201, response.status_code, response.content)
+
+        # Prerequisites may be uploaded later, unknown ids are only logged.
+        with self.assertLogs("core.serializers", level="WARNING"):
+            response = self.upload(3, [chapter("heat", 1, 1, requires=["energy"])])
+        self.assertEqual(201, response.status_code, response.content)
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from core.models import Collection, Workbook
+from core.views import WorkbookViewSet
+from core.wordindex import WordIndex, build_word_index, extract_words
+from .constants import GOOD_CHAPTERS
+from .test_search import make_text_pdf
+
+DEVELOPMENT_PDF = "development_data/pdfs/workbook-01.pdf"
+
+
+class WordIndexFormatTestCase(APITestCase):
+
+    @unittest.skipUnless(
+        os.path.exists(DEVELOPMENT_PDF), "Development pdfs are not available."
+    )
+    def test_round_trip_development_pdf(self):
+        pages = extract_words(DEVELOPMENT_PDF)
+        index = WordIndex(build_word_index(pages))
+
+        self.assertEqual(len(pages), index.page_count)
+
+        for page, (width, height, words) in enumerate(pages):
+            self.assertEqual((width, height), index.page_size(page))
+
+            read_words = index.words(page)
+            self.assertEqual(
+                [word for word, _ in words], [word for word, _ in read_words]
+            )
+            for (_, box), (_, read_box) in zip(words, read_words):
+                for coordinate, read_coordinate in zip(box, read_box):
+                    # Coordinates are stored in tenths of a point.
+                    self.assertAlmostEqual(coordinate, read_coordinate, delta=0.1)
+
+        for term in index.terms:
+            expected_pages = [
+                page
+                for page, (_, _, words) in enumerate(pages)
+                if any(word == term for word, _ in words)
+            ]
+            self.assertEqual(expected_pages, index.pages(term))
+
+    def test_unknown_word(self):
+        index = WordIndex(build_word_index([(100.0, 100.0, [])]))
+
+        self.assertEqual([], index.pages("energy"))
+        self.assertEqual([], index.words(0))
+
+    def test_rejects_other_files(self):
+        with self.assertRaises(ValueError):
+            WordIndex(b"%PDF-1.4" + bytes(64))
+
+
+class WorkbookWordIndexTestCase(APITestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username="testuser", password="testpass123")
+        token = Token.objects.create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+        self._original_throttle_classes = WorkbookViewSet.throttle_classes
+        WorkbookViewSet.throttle_classes = []
+
+        # Word indexes are written to storage, keep them out of the development media root.
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US", is_released=True
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("workbook-list"),
+                {
+                    "number": 1,
+                    "collection": collection.id,
+                    "chapters": json.dumps(GOOD_CHAPTERS),
+                    "pdf": SimpleUploadedFile(
+                        name="test.pdf",
+                        content=make_text_pdf(["Energy of matter", "Heat and energy"]),
+                    ),
+                },
+                format="multipart",
+            )
+        self.assertEqual(201, response.status_code, response.content)
+        self.workbook = Workbook.objects.get(pk=response.data["id"])
+
+    def tearDown(self):
+        """Ensure uploaded files are deleted after tests"""
+        Workbook.objects.all().delete()
+
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+        WorkbookViewSet.throttle_classes = self._original_throttle_classes
+
+    def test_download_word_index(self):
+        response = self.client.get(reverse("workbook-detail", args=[self.workbook.id]))
+        word_index = response.data["word_index"]
+
+        self.assertTrue(
+            word_index["url"].endswith(
+                reverse("workbook-words", args=[self.workbook.id])
+            )
+        )
+
+        response = self.client.get(word_index["url"])
+        self.assertEqual(200, response.status_code)
+        content = b"".join(response.streaming_content)
+        response.close()
+
+        self.assertEqual(word_index["size"], len(content))
+        self.assertEqual(word_index["sha256"], hashlib.sha256(content).hexdigest())
+        self.assertEqual(f'"{word_index["sha256"]}"', response.headers["ETag"])
+
+        index = WordIndex(content)
+        self.assertEqual([0, 1], index.pages("energy"))
+        self.assertEqual([1], index.pages("heat"))
+        self.assertEqual(
+            ["energy", "of", "matter"], [word for word, _ in index.words(0)]
+        )
+
+    def test_workbook_without_word_index(self):
+        self.workbook.artifacts.all().delete()
+
+        response = self.client.get(reverse("workbook-detail", args=[self.workbook.id]))
+        self.assertIsNone(response.data["word_index"])
+
+        response = self.client.get(reverse("workbook-words", args=[self.workbook.id]))
+        self.assertEqual(404, response.status_code)
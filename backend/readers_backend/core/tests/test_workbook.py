@@ -805,3 +805,42 @@ class WorkbookTestCase(APITestCase):
             response.status_code,
             f"Expected 200 OK for unreleased workbook, got {response.status_code}.",
         )
+
+    def test_retrieve_workbook_not_modified(self):
+        self.client.credentials()
+
+        collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US", is_released=True
+        )
+        workbook = Workbook.objects.create(
+            number=1, collection=collection, chapters=GOOD_CHAPTERS, pdf=None
+        )
+        url = reverse("workbook-detail", args=[workbook.id])
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        # Only the validators are fetched for a 304, chapters are never loaded.
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response.headers["ETag"])
+
+        self.assertEqual(
+            response.status_code,
+            304,
+            msg=f"Expected 304 for a matching ETag, but got {response.status_code}.",
+        )
+
+    def test_retrieve_unreleased_workbook_without_auth_ignores_etag(self):
+        self.client.credentials()
+
+        collection = Collection.objects.create(
+            major_version=1, minor_version=0, localization="en-US"
+        )
+        workbook = Workbook.objects.create(
+            number=1, collection=collection, chapters=GOOD_CHAPTERS, pdf=None
+        )
+        url = reverse("workbook-detail", args=[workbook.id])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH="*")
+
+        self.assertEqual(response.status_code, 404)
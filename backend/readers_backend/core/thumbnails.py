@@ -0,0 +1,120 @@
+"""
+Cover images and page thumbnails of a workbook, rendered once after upload so previews never need the pdf.
+
+    covers            the first page at COVER_WIDTHS, one image per size
+    page thumbnails   every page at PAGE_THUMBNAIL_WIDTH, packed left to right, top to bottom in a single
+                      sprite sheet of SPRITE_COLUMNS columns (one request instead of one per page).
+                      Every tile has the size of the largest page, smaller pages are centered.
+
+Images are WebP, or PNG when Pillow was built without WebP.
+"""
+
+import io
+
+import pypdfium2
+from PIL import Image, features
+
+from core.artifacts import save_artifact
+from core.models import WorkbookArtifact
+from core.storage import open_stored
+
+IMAGE_FORMAT, IMAGE_EXTENSION = (
+    ("WEBP", "webp") if features.check("webp") else ("PNG", "png")
+)
+
+COVER_WIDTHS = {
+    WorkbookArtifact.Kind.COVER_SMALL: 160,
+    WorkbookArtifact.Kind.COVER_MEDIUM: 320,
+    WorkbookArtifact.Kind.COVER_LARGE: 640,
+}
+
+IMAGE_KINDS = [*COVER_WIDTHS, WorkbookArtifact.Kind.PAGE_THUMBNAILS]
+
+PAGE_THUMBNAIL_WIDTH = 120
+SPRITE_COLUMNS = 10
+
+# WebP images can't be larger, very long workbooks get more columns.
+MAX_SPRITE_HEIGHT = 16383
+
+BACKGROUND = (255, 255, 255)
+
+
+def render_page(page, width):
+    scale = width / page.get_width()
+    return page.render(scale=scale).to_pil().convert("RGB")
+
+
+def encode_image(image):
+    output = io.BytesIO()
+    if IMAGE_FORMAT == "WEBP":
+        image.save(output, IMAGE_FORMAT, quality=80, method=6)
+    else:
+        image.save(output, IMAGE_FORMAT, optimize=True)
+    return output.getvalue()
+
+
+def render_covers(workbook):
+    with open_stored(workbook.pdf) as file:
+        document = pypdfium2.PdfDocument(file)
+        try:
+            page = document[0]
+            # Rendered once at the largest size, smaller sizes are downscaled from it.
+            largest = render_page(page, max(COVER_WIDTHS.values()))
+        finally:
+            document.close()
+
+    artifacts = []
+    for kind, width in COVER_WIDTHS.items():
+        height = round(largest.height * width / largest.width)
+        image = largest.resize((width, height), Image.Resampling.LANCZOS)
+        artifacts.append(
+            save_artifact(
+                workbook,
+                kind,
+                encode_image(image),
+                IMAGE_EXTENSION,
+                metadata={"width": width, "height": height},
+            )
+        )
+
+    return artifacts
+
+
+def render_page_thumbnails(workbook):
+    with open_stored(workbook.pdf) as file:
+        document = pypdfium2.PdfDocument(file)
+        try:
+            thumbnails = [render_page(page, PAGE_THUMBNAIL_WIDTH) for page in document]
+        finally:
+            document.close()
+
+    tile_height = max(thumbnail.height for thumbnail in thumbnails)
+    max_rows = MAX_SPRITE_HEIGHT // tile_height
+    columns = min(max(SPRITE_COLUMNS, -(-len(thumbnails) // max_rows)), len(thumbnails))
+    rows = -(-len(thumbnails) // columns)
+
+    sprite = Image.new(
+        "RGB", (columns * PAGE_THUMBNAIL_WIDTH, rows * tile_height), BACKGROUND
+    )
+    for index, thumbnail in enumerate(thumbnails):
+        row, column = divmod(index, columns)
+        sprite.paste(
+            thumbnail,
+            (
+                column * PAGE_THUMBNAIL_WIDTH,
+                row * tile_height + (tile_height - thumbnail.height) // 2,
+            ),
+        )
+
+    return save_artifact(
+        workbook,
+        WorkbookArtifact.Kind.PAGE_THUMBNAILS,
+        encode_image(sprite),
+        IMAGE_EXTENSION,
+        metadata={
+            "pages": len(thumbnails),
+            "columns": columns,
+            "tile_width": PAGE_THUMBNAIL_WIDTH,
+            "tile_height": tile_height,
+        },
+    )
@@ -0,0 +1,194 @@
+"""
+Resumable workbook uploads, modelled on the tus protocol (https://tus.io/protocols/resumable-upload).
+
+    POST   /api/uploads/                 workbook metadata and the pdf size, creates an UploadSession
+    HEAD   /api/uploads/<id>/            Upload-Offset header, how much was received (to resume after a drop)
+    PATCH  /api/uploads/<id>/            application/offset+octet-stream chunk, sent at the current Upload-Offset
+    POST   /api/uploads/<id>/finalize/   once complete, creates the workbook (optionally checking its sha256)
+    DELETE /api/uploads/<id>/            gives up
+
+Chunks are streamed to a partial file under MEDIA_ROOT, never buffered by django's upload handlers,
+and hashed as they arrive. Hash states can't be stored in the database, so each process keeps those of
+recent sessions and rebuilds one from the partial file when a chunk lands on another process.
+
+Requests writing or finalizing an upload hold an exclusive flock on its partial file (see lock_upload) rather than
+a database lock, a slow client only ever ties up its own upload. The offset is saved once the chunk is received.
+"""
+
+import fcntl
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import File
+from django.utils import timezone
+
+from core.models import UploadSession
+
+UPLOADS_DIR = "uploads"
+
+CHUNK_SIZE = 64 * 1024
+
+SESSION_LIFETIME = timedelta(days=1)
+
+# Same as a pdf in a collection archive.
+MAX_UPLOAD_LENGTH = 1024 * 1024 * 1024
+
+MAX_CACHED_HASHERS = 64
+
+_hashers = OrderedDict()
+_hashers_lock = threading.Lock()
+
+
+class IncompleteUpload(Exception):
+    pass
+
+
+class ChecksumMismatch(Exception):
+    pass
+
+
+class UploadBusy(Exception):
+    pass
+
+
+def partial_path(session):
+    return os.path.join(settings.MEDIA_ROOT, UPLOADS_DIR, f"{session.id}.part")
+
+
+def create_session(**fields):
+    delete_expired_sessions()
+
+    session = UploadSession.objects.create(
+        expires_at=timezone.now() + SESSION_LIFETIME, **fields
+    )
+
+    path = partial_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "wb").close()
+
+    return session
+
+
+def delete_session(session):
+    with _hashers_lock:
+        _hashers.pop(session.id, None)
+
+    try:
+        os.unlink(partial_path(session))
+    except FileNotFoundError:
+        pass
+
+    session.delete()
+
+
+@contextmanager
+def lock_upload(session):
+    """
+    Holds an exclusive flock on the partial file of the session, and reloads its offset once locked.
+    Raises UploadBusy when another request holds it, UploadSession.DoesNotExist when the session is gone.
+    """
+    try:
+        file = open(partial_path(session), "r+b")
+    except FileNotFoundError:
+        raise UploadSession.DoesNotExist("The upload was finalized or deleted.")
+
+    with file:
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadBusy("Another request is sending or finalizing this upload.")
+
+        # The file may have been deleted (with its session) while we opened it.
+        session.refresh_from_db(fields=["offset"])
+        yield file
+
+
+def delete_expired_sessions():
+    for session in UploadSession.objects.filter(expires_at__lte=timezone.now()):
+        delete_session(session)
+
+
+def _get_hasher(session):
+    """
+    Returns the sha256 of the first session.offset bytes, still open for the next ones.
+    """
+    with _hashers_lock:
+        cached = _hashers.pop(session.id, None)
+
+    if cached is not None and cached[0] == session.offset:
+        return cached[1]
+
+    hasher = hashlib.sha256()
+    with open(partial_path(session), "rb") as file:
+        remaining = session.offset
+        while remaining > 0:
+            data = file.read(min(CHUNK_SIZE, remaining))
+            if not data:
+                break
+            hasher.update(data)
+            remaining -= len(data)
+
+    return hasher
+
+
+def _put_hasher(session, hasher):
+    with _hashers_lock:
+        _hashers[session.id] = (session.offset, hasher)
+        while len(_hashers) > MAX_CACHED_HASHERS:
+            _hashers.popitem(last=False)
+
+
+def append_chunk(session, file, stream, size):
+    """
+    Appends up to size bytes read from stream at the session offset, file is the partial file from lock_upload.
+    Whatever was received is kept even when the client goes away mid chunk, so it can resume from there.
+    Returns the number of bytes written.
+    """
+    hasher = _get_hasher(session)
+    written = 0
+
+    file.seek(session.offset)
+    try:
+        while written < size:
+            data = stream.read(min(CHUNK_SIZE, size - written))
+            if not data:
+                break
+            file.write(data)
+            hasher.update(data)
+            written += len(data)
+    except OSError:
+        # Client disconnected (UnreadablePostError and gunicorn's NoMoreData are OSErrors).
+        pass
+    finally:
+        # Drops bytes a previous, interrupted, attempt left past the offset.
+        file.truncate(session.offset + written)
+        file.flush()
+
+    session.offset += written
+    # A single short update, the session isn't locked in the database.
+    UploadSession.objects.filter(pk=session.pk).update(offset=session.offset)
+    _put_hasher(session, hasher)
+
+    return written
+
+
+def open_upload(session, sha256=None):
+    """
+    Returns the complete pdf of the session as a File, for the workbook pdf field.
+    Its sha256 is attached, so the content addressed storage doesn't hash it again.
+    """
+    if session.offset != session.length:
+        raise IncompleteUpload(f"Received {session.offset} of {session.length} bytes.")
+
+    digest = _get_hasher(session).hexdigest()
+    if sha256 is not None and sha256 != digest:
+        raise ChecksumMismatch(f"The upload has sha256 {digest}, not {sha256}.")
+
+    file = File(open(partial_path(session), "rb"), name=session.filename)
+    file.sha256 = digest
+    return file
@@ -19,10 +19,13 @@ from django.urls import path
 from rest_framework.authtoken.views import obtain_auth_token
 from rest_framework.routers import DefaultRouter
 from core.views import (
+    CacheStatsView,
     FeedbackView,
     DestroyAuthTokenView,
     CollectionViewSet,
     RootAPIView,
+    SyncView,
+    UploadViewSet,
     WorkbookViewSet,
 )
 from django.contrib import admin
@@ -37,12 +40,15 @@ from core.views import (
 router = DefaultRouter()
 router.register("api/collections", CollectionViewSet, basename="collection")
 router.register("api/workbooks", WorkbookViewSet, basename="workbook")
+router.register("api/uploads", UploadViewSet, basename="upload")
 
 urlpatterns = [
     path("api/", RootAPIView.as_view(), name="root"),
     path("api/token/", obtain_auth_token, name="token-obtain"),
     path("api/token/destroy/", DestroyAuthTokenView.as_view(), name="token-destroy"),
     path("api/feedback/", FeedbackView.as_view(), name="feedback"),
+    path("api/sync/", SyncView.as_view(), name="sync"),
+    path("api/cache-stats/", CacheStatsView.as_view(), name="cache-stats"),
     path("management/", admin.site.urls),
 ]
 
@@ -3,6 +3,8 @@ from django.conf import settings
 from django.template.loader import render_to_string
 import json
 
+from core import fastjson
+
 
 def send_feedback_email(feedback):
     """
@@ -36,7 +38,7 @@ def send_feedback_email(feedback):
         try:
             # If logs is a string (from iOS), parse it
             if isinstance(feedback.logs, str):
-                logs_data = json.loads(feedback.logs)
+                logs_data = fastjson.loads(feedback.logs)
             else:
                 # If it's already a dict/list (stored as JSONField)
                 logs_data = feedback.logs
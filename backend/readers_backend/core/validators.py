@@ -0,0 +1,261 @@
+"""
+Validation of workbook chapters.
+
+The chapters schema is compiled once per process into plain python checks (no jsonschema at request time),
+and a single pass over the chapters reports every schema error along with the rules a schema can't express:
+    - chapter ids are unique
+    - start pages are increasing
+    - chapter numbers are contiguous
+    - requires point at chapters that exist, those that aren't in the workbook are left to the caller
+      (external_requires, chapters of other workbooks)
+"""
+
+from functools import lru_cache
+
+from django.core.validators import RegexValidator
+
+# Language and country, e.g. en-US (en_US in older collections). Localizations end up in manifest paths.
+validate_localization = RegexValidator(
+    r"^[a-z]{2}[-_][A-Z]{2}$", "Must be a language and a country code, e.g. en-US."
+)
+
+CHAPTERS_SCHEMA = {
+    "type": "array",
+    "minItems": 1,
+    "items": {
+        "type": "object",
+        "required": ["title", "id", "chap_num", "start_page", "covers"],
+        "properties": {
+            "requires": {"type": "array", "items": {"type": "string"}},
+            "title": {"type": "string", "minLength": 1},
+            "id": {"type": "string", "minLength": 1},
+            "chap_num": {"type": "integer"},
+            "start_page": {"type": "integer"},
+            "covers": {
+                "type": "array",
+                "minItems": 0,
+                "items": {
+                    "type": "object",
+                    "required": ["id", "desc"],
+                    "properties": {
+                        "id": {"type": "string", "minLength": 1},
+                        "desc": {"type": "string", "minLength": 1},
+                        "videos": {
+                            "type": "array",
+                            "items": {
+                                "type": "object",
+                                "required": ["link", "title"],
+                                "properties": {
+                                    "link": {"type": "string", "minLength": 1},
+                                    "title": {"type": "string", "minLength": 1},
+                                },
+                                "additionalProperties": False,
+                            },
+                        },
+                        "references": {
+                            "type": "array",
+                            "items": {
+                                "type": "object",
+                                "required": ["link", "title"],
+                                "properties": {
+                                    "link": {"type": "string", "minLength": 1},
+                                    "title": {"type": "string", "minLength": 1},
+                                },
+                                "additionalProperties": False,
+                            },
+                        },
+                    },
+                    "additionalProperties": False,
+                },
+            },
+        },
+        "additionalProperties": False,
+    },
+}
+
+
+def _is_integer(value):
+    # Same as jsonschema: 3.0 is an integer, True is not.
+    if isinstance(value, bool):
+        return False
+    return isinstance(value, int) or (isinstance(value, float) and value.is_integer())
+
+
+TYPE_CHECKS = {
+    "object": (lambda value: isinstance(value, dict), "an object"),
+    "array": (lambda value: isinstance(value, list), "an array"),
+    "string": (lambda value: isinstance(value, str), "a string"),
+    "integer": (_is_integer, "an integer"),
+}
+
+
+def compile_schema(schema):
+    """
+    Compiles the subset of JSON schema used for chapters (type, required, properties, additionalProperties,
+    items, minItems, minLength) into a function check(value, path, errors), appending (path, message) to errors.
+    """
+    type_name = schema.get("type")
+    if type_name is not None and type_name not in TYPE_CHECKS:
+        raise ValueError(f"Unsupported schema type {type_name}.")
+
+    supported = {
+        "type",
+        "required",
+        "properties",
+        "additionalProperties",
+        "items",
+        "minItems",
+        "minLength",
+    }
+    unsupported = set(schema) - supported
+    if unsupported:
+        raise ValueError(f"Unsupported schema keywords {sorted(unsupported)}.")
+
+    is_type, type_description = TYPE_CHECKS.get(type_name, (None, None))
+    required = schema.get("required", [])
+    properties = {
+        name: compile_schema(subschema)
+        for name, subschema in schema.get("properties", {}).items()
+    }
+    allow_additional = schema.get("additionalProperties", True) is not False
+    check_item = compile_schema(schema["items"]) if "items" in schema else None
+    min_items = schema.get("minItems")
+    min_length = schema.get("minLength")
+
+    def check(value, path, errors):
+        if is_type is not None and not is_type(value):
+            errors.append((path, f"Must be {type_description}."))
+            return
+
+        if isinstance(value, dict):
+            for name in required:
+                if name not in value:
+                    errors.append((f"{path}.{name}", "This field is required."))
+
+            for name, item in value.items():
+                check_property = properties.get(name)
+                if check_property is not None:
+                    check_property(item, f"{path}.{name}", errors)
+                elif not allow_additional:
+                    errors.append((f"{path}.{name}", "Unknown field."))
+
+        elif isinstance(value, list):
+            if min_items is not None and len(value) < min_items:
+                errors.append((path, f"Must have at least {min_items} item(s)."))
+
+            if check_item is not None:
+                for index, item in enumerate(value):
+                    check_item(item, f"{path}[{index}]", errors)
+
+        elif isinstance(value, str):
+            if min_length is not None and len(value) < min_length:
+                errors.append((path, "Must not be empty."))
+
+    return check
+
+
+class ChaptersValidationResult:
+    def __init__(self, errors, external_requires):
+        # [(path, message), ...]
+        self.errors = errors
+        # Required ids that are not chapters of this workbook (chapters of other workbooks, or unknown).
+        self.external_requires = external_requires
+
+    @property
+    def is_valid(self):
+        return not self.errors
+
+    def messages(self):
+        return [f"{path}: {message}" for path, message in self.errors]
+
+
+class ChaptersValidator:
+
+    def __init__(self, schema):
+        items_schema = schema["items"]
+
+        # The list itself and every chapter are checked separately, so the cross chapter checks share the same loop.
+        self.check_list = compile_schema(
+            {key: value for key, value in schema.items() if key != "items"}
+        )
+        self.check_chapter = compile_schema(items_schema)
+
+    def validate(self, chapters, path="chapters"):
+        errors = []
+
+        self.check_list(chapters, path, errors)
+        if not isinstance(chapters, list):
+            return ChaptersValidationResult(errors, set())
+
+        positions = {}
+        required_ids = set()
+        previous_start_page = None
+        previous_chap_num = None
+
+        for index, chapter in enumerate(chapters):
+            chapter_path = f"{path}[{index}]"
+            self.check_chapter(chapter, chapter_path, errors)
+
+            if not isinstance(chapter, dict):
+                continue
+
+            chapter_id = chapter.get("id")
+            if isinstance(chapter_id, str):
+                if chapter_id in positions:
+                    errors.append(
+                        (
+                            f"{chapter_path}.id",
+                            f"Duplicate chapter id {chapter_id!r}, also used by {path}[{positions[chapter_id]}].",
+                        )
+                    )
+                else:
+                    positions[chapter_id] = index
+
+            start_page = chapter.get("start_page")
+            if _is_integer(start_page):
+                if start_page < 1:
+                    errors.append((f"{chapter_path}.start_page", "Must be at least 1."))
+                if (
+                    previous_start_page is not None
+                    and start_page <= previous_start_page
+                ):
+                    errors.append(
+                        (
+                            f"{chapter_path}.start_page",
+                            f"Must be greater than the start page of the previous chapter ({previous_start_page}).",
+                        )
+                    )
+                previous_start_page = start_page
+
+            chap_num = chapter.get("chap_num")
+            if _is_integer(chap_num):
+                if previous_chap_num is not None and chap_num != previous_chap_num + 1:
+                    errors.append(
+                        (
+                            f"{chapter_path}.chap_num",
+                            f"Must be {previous_chap_num + 1}, chapter numbers are contiguous.",
+                        )
+                    )
+                previous_chap_num = chap_num
+
+            chapter_requires = chapter.get("requires")
+            if isinstance(chapter_requires, list):
+                required_ids.update(
+                    required_id
+                    for required_id in chapter_requires
+                    if isinstance(required_id, str)
+                )
+
+        # Requires may point at any chapter, so they are resolved once every id is known.
+        external_requires = required_ids - positions.keys()
+
+        return ChaptersValidationResult(errors, external_requires)
+
+
+@lru_cache(maxsize=None)
+def get_chapters_validator():
+    return ChaptersValidator(CHAPTERS_SCHEMA)
+
+
+def validate_chapters(chapters):
+    return get_chapters_validator().validate(chapters)
@@ -2,26 +2,83 @@ from rest_framework import mixins
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+import os
+from datetime import timedelta
+from functools import partial
+
+from core.archives import import_collection_archive
+from core.artifacts import get_artifact
+from core.bundles import serve_bundle
+from core.cache import get_latest_collection_payload
+from core.conditional import conditional_response, make_etag
+from core.downloads import serve_file
+from core.extracts import (
+    InvalidPageRange,
+    chapter_pages,
+    extract_digests_cache,
+    extracts_cache,
+    get_extract,
+)
+from core.filecache import cache_stats
+from core.hotcache import hot_file_cache, warm_collection
+from core.lite import PDF_VARIANTS
+from core.manifests import publish_release, update_latest_pointer
+from core.patches import get_or_create_patch
+from core.pipeline import schedule_processing
+from core.search import search_workbook
+from core.uploads import (
+    ChecksumMismatch,
+    IncompleteUpload,
+    UploadBusy,
+    append_chunk,
+    create_session,
+    delete_session,
+    lock_upload,
+    open_upload,
+)
+from core.thumbnails import IMAGE_KINDS
 from core.throttles import FeedbackThrottle
 from .utils import send_feedback_email
 from rest_framework.viewsets import GenericViewSet
 from django.utils import timezone
+from django.utils.cache import patch_vary_headers
 from django.conf import settings
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import NotFound, ValidationError
+
+from django.db.models import Max
+from django.urls import reverse
+from django.core.files.storage import default_storage
 
-from core.models import Collection, Workbook, Feedback
+from core.models import (
+    CatalogChange,
+    Collection,
+    Workbook,
+    WorkbookArtifact,
+    Feedback,
+    UploadSession,
+)
 from core.serializers import (
+    CollectionArchiveUploadSerializer,
     CollectionListSerializer,
     CollectionRetrieveQueryParamsSerializer,
     WorkbookCreateSerializer,
+    WorkbookExtractQueryParamsSerializer,
     CollectionCreateSerializer,
     CollectionRetrieveSerializer,
+    CollectionExpandedSerializer,
     WorkbookRetrieveSerializer,
+    WorkbookPatchQueryParamsSerializer,
+    WorkbookPdfQueryParamsSerializer,
+    WorkbookSearchQueryParamsSerializer,
     FeedbackSerializer,
+    SyncQueryParamsSerializer,
+    UploadSessionCreateSerializer,
+    UploadSessionFinalizeSerializer,
+    UploadSessionSerializer,
 )
 
 
@@ -47,6 +104,30 @@ class DestroyAuthTokenView(APIView):
         )
 
 
+class CacheStatsView(APIView):
+    """
+    Counters and sizes of the file caches of the process answering, for admins.
+    Counters are per process (every gunicorn worker has its own), sizes are those of the shared directories.
+    """
+
+    permission_classes = [IsAdminUser]
+    serializer_class = None
+
+    def get(self, request):
+        # Listed even before this process has served an extract.
+        extracts_cache()
+        extract_digests_cache()
+
+        hot_cache = hot_file_cache()
+        return Response(
+            {
+                "pid": os.getpid(),
+                "file_caches": cache_stats(),
+                "hot_file_cache": hot_cache.stats() if hot_cache else None,
+            }
+        )
+
+
 class CollectionViewSet(
     GenericViewSet,
     mixins.CreateModelMixin,
@@ -62,7 +143,9 @@ class CollectionViewSet(
             return CollectionListSerializer
         elif self.action == "retrieve":
             return CollectionRetrieveSerializer
-        # TODO: Consider just returning the entire collection rather than the list representation...
+        elif self.action == "import_archive":
+            return CollectionArchiveUploadSerializer
+        # The expanded representation is opt in (?expand=true), see latest.
         elif self.action == "latest":
             return CollectionListSerializer
 
@@ -70,10 +153,16 @@ class CollectionViewSet(
         return CollectionListSerializer
 
     def get_permissions(self):
-        if self.action in ["list", "retrieve", "latest"]:
+        if self.action in ["list", "retrieve", "latest", "bundle"]:
             return []
         return [IsAuthenticated()]
 
+    def perform_content_negotiation(self, request, force=False):
+        # The bundle isn't rendered by DRF, see WorkbookViewSet.
+        if self.action == "bundle":
+            force = True
+        return super().perform_content_negotiation(request, force)
+
     def get_queryset(self):
         # drf-spectacular compatibility.
         if getattr(self, "swagger_fake_view", False):
@@ -85,25 +174,20 @@ class CollectionViewSet(
         if not self.request.user.is_authenticated:
             queryset = queryset.filter(is_released=True)
 
+        # Workbooks are listed with their images.
+        if self.action == "retrieve":
+            queryset = queryset.prefetch_related("workbooks__artifacts")
+
         # Query param filtering only applies for listing collections or retrieving the latest collection.
         if not self.action in ["list", "latest"]:
             return queryset
 
-        params = self.request.query_params
-
-        query_params_serializer = CollectionRetrieveQueryParamsSerializer(data=params)
-
-        if not query_params_serializer.is_valid():
-            raise ValidationError(query_params_serializer.errors)
+        params = self.get_query_params()
 
-        major_version = query_params_serializer.validated_data.get(
-            "major_version", None
-        )
-        minor_version = query_params_serializer.validated_data.get(
-            "minor_version", None
-        )
-        localization = query_params_serializer.validated_data.get("localization", None)
-        is_released = query_params_serializer.validated_data.get("is_released", None)
+        major_version = params.get("major_version", None)
+        minor_version = params.get("minor_version", None)
+        localization = params.get("localization", None)
+        is_released = params.get("is_released", None)
 
         if major_version is not None:
             queryset = queryset.filter(major_version=major_version)
@@ -119,11 +203,73 @@ class CollectionViewSet(
 
         return queryset
 
+    def get_query_params(self):
+        query_params_serializer = CollectionRetrieveQueryParamsSerializer(
+            data=self.request.query_params
+        )
+
+        if not query_params_serializer.is_valid():
+            raise ValidationError(query_params_serializer.errors)
+
+        return query_params_serializer.validated_data
+
+    def list(self, request, *args, **kwargs):
+        # Deletes can't be expressed with a Last-Modified date, so lists only get an ETag.
+        versions = list(
+            self.filter_queryset(self.get_queryset()).values_list("id", "updated_at")
+        )
+        etag = make_etag(request, "collection-list", request.query_params, versions)
+
+        return conditional_response(
+            request,
+            partial(super().list, request, *args, **kwargs),
+            etag,
+            vary_on_auth=True,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            collection = (
+                self.get_queryset()
+                .filter(pk=self.kwargs["pk"])
+                .values("id", "updated_at")
+                .first()
+            )
+        except (TypeError, ValueError):
+            collection = None
+
+        # Let the regular retrieve deal with the 404.
+        if collection is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        etag = make_etag(
+            request, "collection-detail", collection["id"], collection["updated_at"]
+        )
+
+        return conditional_response(
+            request,
+            partial(super().retrieve, request, *args, **kwargs),
+            etag,
+            last_modified=collection["updated_at"],
+        )
+
+    def perform_destroy(self, instance):
+        was_released = instance.is_released
+        super().perform_destroy(instance)
+
+        if was_released:
+            update_latest_pointer(instance.localization)
+
     @action(detail=True, methods=["patch"])
     def release(self, request, pk=None):
         collection = self.get_object()
         collection.is_released = True
         collection.save()
+
+        publish_release(collection)
+        # The first downloads of a release shouldn't wait on the disk.
+        warm_collection(collection)
+
         return Response({"message": "Collection released."}, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=["patch"])
@@ -131,15 +277,58 @@ class CollectionViewSet(
         collection = self.get_object()
         collection.is_released = False
         collection.save()
+
+        # Roll the pointer back to the previous release (if any).
+        update_latest_pointer(collection.localization)
         return Response(
             {"message": "Collection un-released."}, status=status.HTTP_200_OK
         )
 
+    @action(detail=True, methods=["get"])
+    def bundle(self, request, pk=None):
+        """
+        Downloads everything needed to use the collection offline (manifest, chapters and workbook pdfs)
+        as one tar, see core/bundles.py. Only released collections have a bundle.
+        Supports HEAD, conditional requests and Range requests, so interrupted downloads can resume.
+        """
+        collection = self.get_object()
+
+        if not collection.is_released:
+            raise NotFound("Only released collections have a bundle.")
+
+        return serve_bundle(request, collection)
+
+    @action(detail=False, methods=["post"], url_path="import")
+    def import_archive(self, request):
+        """
+        Creates a whole collection (workbooks, pdfs and chapters) from one zip archive, see core/archives.py.
+        Either everything is created or, on any error, nothing.
+        """
+        upload_serializer = CollectionArchiveUploadSerializer(data=request.data)
+        if not upload_serializer.is_valid():
+            raise ValidationError(upload_serializer.errors)
+
+        collection, workbooks = import_collection_archive(
+            upload_serializer.validated_data["archive"]
+        )
+
+        return Response(
+            {
+                "collection": CollectionRetrieveSerializer(
+                    collection, context=self.get_serializer_context()
+                ).data,
+                "workbooks": [
+                    {"id": workbook.id, "number": workbook.number, "sha256": sha256}
+                    for workbook, sha256 in workbooks
+                ],
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
     @action(detail=False, methods=["get"])
     def latest(self, request):
-        # TODO: Lets make this return the collection retrieve serializer at some point.
-        # More specifically, is there a reason to make the client two two requests to get the chapters for the latest collection?
         queryset = self.get_queryset()
+        params = self.get_query_params()
 
         try:
             latest = queryset.latest()
@@ -148,8 +337,59 @@ class CollectionViewSet(
                 {"message": "No collections found."}, status=status.HTTP_404_NOT_FOUND
             )
 
-        serializer = self.get_serializer(latest)
-        return Response(serializer.data)
+        # The latest collection can change through a delete, so there is no Last-Modified here either.
+        etag = make_etag(
+            request,
+            "collection-latest",
+            params["expand"],
+            latest.id,
+            latest.updated_at,
+        )
+
+        if params["expand"]:
+            build_response = partial(self.latest_expanded, queryset, params)
+        else:
+            build_response = lambda: Response(self.get_serializer(latest).data)
+
+        return conditional_response(request, build_response, etag, vary_on_auth=True)
+
+    def latest_expanded(self, queryset, params):
+        """
+        The latest collection with every workbook and its chapters inlined.
+        This is what clients need at launch, so it is cached until the catalog changes.
+        """
+
+        def build():
+            try:
+                latest = queryset.prefetch_related("workbooks__artifacts").latest()
+            except Collection.DoesNotExist:
+                return None
+
+            serializer = CollectionExpandedSerializer(
+                latest, context=self.get_serializer_context()
+            )
+            return serializer.data
+
+        # Only the common case (optionally filtered by localization) is cached.
+        # Version filters are rare and would fragment the cache.
+        is_cacheable = all(
+            params.get(key) is None
+            for key in ["major_version", "minor_version", "is_released"]
+        )
+
+        if is_cacheable:
+            payload = get_latest_collection_payload(
+                self.request, params.get("localization"), build
+            )
+        else:
+            payload = build()
+
+        if payload is None:
+            return Response(
+                {"message": "No collections found."}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        return Response(payload)
 
 
 class WorkbookViewSet(
@@ -171,6 +411,10 @@ class WorkbookViewSet(
         if not self.request.user.is_authenticated:
             queryset = queryset.filter(collection__is_released=True)
 
+        # Downloads never need the chapters.
+        if self.action in ["pdf", "delta", "delta_pdf", "words", "image"]:
+            queryset = queryset.defer("chapters")
+
         return queryset
 
     def get_serializer_class(self):
@@ -183,11 +427,628 @@ class WorkbookViewSet(
         return WorkbookRetrieveSerializer
 
     def get_permissions(self):
-        if self.action in ["list", "retrieve"]:
+        if self.action in [
+            "list",
+            "retrieve",
+            "pdf",
+            "extract",
+            "delta",
+            "delta_pdf",
+            "search",
+            "words",
+            "image",
+        ]:
             return []
 
         return [IsAuthenticated()]
 
+    def perform_content_negotiation(self, request, force=False):
+        # Downloads aren't rendered by DRF, clients asking for application/pdf shouldn't get a 406.
+        # Errors still fall back to the default (JSON) renderer.
+        if self.action in ["pdf", "extract", "delta_pdf", "words", "image"]:
+            force = True
+        return super().perform_content_negotiation(request, force)
+
+    def retrieve(self, request, *args, **kwargs):
+        # Validators come from the collection, this way the chapters column is never loaded for a 304.
+        try:
+            workbook = (
+                self.get_queryset()
+                .filter(pk=self.kwargs["pk"])
+                .values("id", "collection__updated_at")
+                .first()
+            )
+        except (TypeError, ValueError):
+            workbook = None
+
+        if workbook is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        updated_at = workbook["collection__updated_at"]
+        etag = make_etag(request, "workbook-detail", workbook["id"], updated_at)
+
+        return conditional_response(
+            request,
+            partial(super().retrieve, request, *args, **kwargs),
+            etag,
+            last_modified=updated_at,
+        )
+
+    @action(detail=True, methods=["get"])
+    def pdf(self, request, pk=None):
+        """
+        Downloads the workbook pdf, ?variant=standard (default) or lite (see core/lite.py).
+        Without ?variant=, clients sending Save-Data: on get the lite variant.
+        Variants not built yet fall back to the standard one, itself the pdf as uploaded until it's built.
+        The pdf as uploaded, kept for audits, is served with ?original=true.
+        Supports HEAD, conditional requests and (multi) Range requests, so interrupted downloads can resume.
+        """
+        params_serializer = WorkbookPdfQueryParamsSerializer(data=request.query_params)
+        if not params_serializer.is_valid():
+            raise ValidationError(params_serializer.errors)
+        params = params_serializer.validated_data
+
+        workbook = self.get_object()
+
+        if not workbook.pdf:
+            return Response(
+                {"message": "Workbook has no pdf."}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        variant = params["variant"]
+        if variant is None:
+            save_data = request.headers.get("Save-Data", "").strip().lower() == "on"
+            variant = "lite" if save_data else "standard"
+
+        artifact = None
+        if not params["original"]:
+            artifact = get_artifact(workbook, PDF_VARIANTS[variant])
+            if artifact is None and variant != "standard":
+                variant = "standard"
+                artifact = get_artifact(workbook, PDF_VARIANTS[variant])
+
+        if artifact is not None:
+            suffix = "" if variant == "standard" else f"-{variant}"
+            response = serve_file(
+                request,
+                artifact.file.storage,
+                artifact.file.name,
+                content_type="application/pdf",
+                filename=f"workbook-{workbook.number}{suffix}.pdf",
+                etag=f'"{artifact.sha256}"',
+            )
+        else:
+            response = serve_file(
+                request,
+                workbook.pdf.storage,
+                workbook.pdf.name,
+                content_type="application/pdf",
+                filename=f"workbook-{workbook.number}.pdf",
+                etag=f'"{workbook.sha256}"' if workbook.sha256 else None,
+            )
+
+        if params["variant"] is None and not params["original"]:
+            patch_vary_headers(response, ["Save-Data"])
+        return response
+
+    @action(detail=True, methods=["get"])
+    def extract(self, request, pk=None):
+        """
+        Downloads a standalone pdf of one chapter (?chapter=<chapter id>) or a page range (?first=&last=, inclusive)
+        of the workbook, see core/extracts.py.
+        Supports HEAD, conditional requests and Range requests, like the full pdf.
+        """
+        params_serializer = WorkbookExtractQueryParamsSerializer(
+            data=request.query_params
+        )
+        if not params_serializer.is_valid():
+            raise ValidationError(params_serializer.errors)
+        params = params_serializer.validated_data
+
+        workbook = self.get_object()
+
+        if not workbook.pdf:
+            raise NotFound("Workbook has no pdf.")
+
+        if "chapter" in params:
+            pages = chapter_pages(workbook, params["chapter"])
+            if pages is None:
+                raise NotFound("Chapter not found.")
+            first, last = pages
+            filename = f"workbook-{workbook.number}-{params['chapter']}.pdf"
+        else:
+            first, last = params["first"], params["last"]
+            filename = f"workbook-{workbook.number}-pages-{first}-{last}.pdf"
+
+        try:
+            cache, name, sha256 = get_extract(workbook, first, last)
+        except InvalidPageRange as e:
+            raise ValidationError({"message": str(e)})
+
+        return serve_file(
+            request,
+            cache.storage,
+            name,
+            content_type="application/pdf",
+            filename=filename,
+            # The hash of the bytes served, an extract built again with other bytes has another ETag.
+            etag=f'"{sha256}"',
+        )
+
+    def perform_create(self, serializer):
+        workbook = serializer.save()
+        schedule_processing(workbook)
+
+    def get_patch(self):
+        """
+        Returns (base, target, patch description) for the delta actions.
+        The base workbook follows the same visibility rules as the target.
+        """
+        params_serializer = WorkbookPatchQueryParamsSerializer(
+            data=self.request.query_params
+        )
+        if not params_serializer.is_valid():
+            raise ValidationError(params_serializer.errors)
+
+        target = self.get_object()
+        base = (
+            self.get_queryset()
+            .filter(pk=params_serializer.validated_data["base"])
+            .first()
+        )
+
+        if base is None or not base.pdf or not target.pdf:
+            raise NotFound("Workbook not found.")
+
+        return base, target, get_or_create_patch(base, target)
+
+    @action(detail=True, methods=["get"])
+    def delta(self, request, pk=None):
+        """
+        Describes how to update from the base workbook (?base=) to this one, transferring only the changed pages.
+        The recipe lists runs of pages to take from the base pdf or from the patch pdf, in order.
+        """
+        base, target, patch = self.get_patch()
+
+        patch_url = None
+        if patch["pdf"] is not None:
+            patch_url = request.build_absolute_uri(
+                reverse("workbook-delta-pdf", args=[target.id]) + f"?base={base.id}"
+            )
+
+        return Response(
+            {
+                "base": base.id,
+                "target": target.id,
+                "recipe": patch["recipe"],
+                "patch": {
+                    "url": patch_url,
+                    "size": patch["size"],
+                    "sha256": patch["sha256"],
+                },
+                "full_size": target.pdf.size,
+            }
+        )
+
+    @action(detail=True, methods=["get"], url_path="delta/pdf")
+    def delta_pdf(self, request, pk=None):
+        base, target, patch = self.get_patch()
+
+        if patch["pdf"] is None:
+            raise NotFound("No page changed, there is no patch to download.")
+
+        return serve_file(
+            request,
+            default_storage,
+            patch["pdf"],
+            content_type="application/pdf",
+            filename=f"workbook-{base.id}-{target.id}.patch.pdf",
+        )
+
+    @action(detail=True, methods=["get"])
+    def words(self, request, pk=None):
+        """
+        Downloads the precomputed word index of the workbook (see core/wordindex.py), for offline search.
+        The ETag is the sha256 of the index, also listed in the workbook's word_index.
+        """
+        workbook = self.get_object()
+
+        artifact = get_artifact(workbook, WorkbookArtifact.Kind.WORD_INDEX)
+        if artifact is None:
+            raise NotFound("Workbook has no word index.")
+
+        return serve_file(
+            request,
+            artifact.file.storage,
+            artifact.file.name,
+            content_type="application/octet-stream",
+            filename=f"workbook-{workbook.number}.words",
+            etag=f'"{artifact.sha256}"',
+        )
+
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path=r"images/(?P<kind>[a-z_]+)",
+    )
+    def image(self, request, pk=None, kind=None):
+        """
+        Downloads a cover or the page thumbnails of the workbook, listed with their sizes in its images.
+        """
+        if kind not in IMAGE_KINDS:
+            raise NotFound("Unknown image.")
+
+        workbook = self.get_object()
+
+        artifact = get_artifact(workbook, kind)
+        if artifact is None:
+            raise NotFound("Image not rendered yet.")
+
+        extension = artifact.file.name.rsplit(".", 1)[-1]
+        return serve_file(
+            request,
+            artifact.file.storage,
+            artifact.file.name,
+            content_type=f"image/{extension}",
+            filename=f"workbook-{workbook.number}-{kind}.{extension}",
+            etag=f'"{artifact.sha256}"',
+        )
+
+    @action(detail=True, methods=["get"])
+    def search(self, request, pk=None):
+        """
+        Full text search in the workbook pdf (?q=).
+        Returns pages ranked by relevance, with the chapter they belong to and a snippet around the first match.
+        """
+        params_serializer = WorkbookSearchQueryParamsSerializer(
+            data=request.query_params
+        )
+        if not params_serializer.is_valid():
+            raise ValidationError(params_serializer.errors)
+
+        workbook = self.get_object()
+
+        if not workbook.pdf:
+            raise NotFound("Workbook has no pdf.")
+
+        query = params_serializer.validated_data["q"]
+
+        return Response(
+            {
+                "query": query,
+                "results": search_workbook(
+                    workbook, query, params_serializer.validated_data["limit"]
+                ),
+            }
+        )
+
+
+class UploadViewSet(
+    GenericViewSet,
+    mixins.RetrieveModelMixin,
+):
+    """
+    Resumable workbook uploads, see core/uploads.py for the protocol.
+    """
+
+    queryset = UploadSession.objects.all()
+
+    def get_queryset(self):
+        # drf-spectacular compatibility.
+        if getattr(self, "swagger_fake_view", False):
+            return UploadSession.objects.none()
+
+        return (
+            super()
+            .get_queryset()
+            .filter(user=self.request.user, expires_at__gt=timezone.now())
+        )
+
+    def get_serializer_class(self):
+        if self.action == "create":
+            return UploadSessionCreateSerializer
+        if self.action == "finalize":
+            return UploadSessionFinalizeSerializer
+        return UploadSessionSerializer
+
+    def offset_response(self, session, data=None, status=status.HTTP_200_OK):
+        response = Response(data, status=status)
+        response.headers["Upload-Offset"] = session.offset
+        response.headers["Upload-Length"] = session.length
+        # The offset changes with every chunk.
+        response.headers["Cache-Control"] = "no-store"
+        return response
+
+    def create(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        session = create_session(user=request.user, **serializer.validated_data)
+
+        response = self.offset_response(
+            session,
+            UploadSessionSerializer(session).data,
+            status=status.HTTP_201_CREATED,
+        )
+        response.headers["Location"] = reverse("upload-detail", args=[session.id])
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        The session, with how much was received in Upload-Offset (also answers HEAD, to resume an upload).
+        """
+        session = self.get_object()
+        return self.offset_response(session, self.get_serializer(session).data)
+
+    def partial_update(self, request, pk=None):
+        """
+        Receives the next chunk of the pdf, sent as application/offset+octet-stream at the current Upload-Offset.
+        """
+        if request.content_type != "application/offset+octet-stream":
+            return Response(
+                {"message": "Chunks must be sent as application/offset+octet-stream."},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            )
+
+        try:
+            offset = int(request.headers["Upload-Offset"])
+            size = int(request.headers.get("Content-Length") or 0)
+        except (KeyError, ValueError):
+            return Response(
+                {"message": "Upload-Offset and Content-Length headers are required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        session = self.get_object()
+
+        # Locked (the partial file, not the row), so concurrent chunks for the same upload can't interleave.
+        try:
+            with lock_upload(session) as file:
+                if offset != session.offset:
+                    return self.offset_response(
+                        session,
+                        {"message": f"Upload-Offset must be {session.offset}."},
+                        status=status.HTTP_409_CONFLICT,
+                    )
+
+                if size > session.length - session.offset:
+                    return self.offset_response(
+                        session,
+                        {"message": "The chunk goes past the end of the upload."},
+                        status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    )
+
+                if size:
+                    append_chunk(session, file, request.stream, size)
+        except UploadBusy as e:
+            return self.offset_response(
+                session, {"message": str(e)}, status=status.HTTP_409_CONFLICT
+            )
+        except UploadSession.DoesNotExist:
+            raise NotFound()
+
+        return self.offset_response(session, status=status.HTTP_204_NO_CONTENT)
+
+    def destroy(self, request, pk=None):
+        delete_session(self.get_object())
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=["post"])
+    def finalize(self, request, pk=None):
+        """
+        Creates the workbook from the complete upload, optionally checking the sha256 of the pdf.
+        """
+        params_serializer = self.get_serializer(data=request.data)
+        params_serializer.is_valid(raise_exception=True)
+
+        session = self.get_object()
+
+        # Claimed until it's deleted, a concurrent finalize (or chunk) gets a conflict, and a 404 once it's done.
+        try:
+            with lock_upload(session):
+                workbook, data = self.create_workbook(
+                    session, params_serializer.validated_data.get("sha256")
+                )
+        except UploadBusy as e:
+            return self.offset_response(
+                session, {"message": str(e)}, status=status.HTTP_409_CONFLICT
+            )
+        except UploadSession.DoesNotExist:
+            raise NotFound()
+        except IncompleteUpload as e:
+            return self.offset_response(
+                session, {"message": str(e)}, status=status.HTTP_409_CONFLICT
+            )
+        except ChecksumMismatch as e:
+            return Response({"sha256": [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+
+        schedule_processing(workbook)
+
+        response = Response(data, status=status.HTTP_201_CREATED)
+        response.headers["Location"] = reverse("workbook-detail", args=[workbook.id])
+        return response
+
+    def create_workbook(self, session, sha256):
+        """
+        Creates the workbook of the complete upload and deletes the session, the upload must be locked.
+        """
+        with open_upload(session, sha256) as pdf:
+            # Same checks as a direct upload, the catalog may have changed since the session started.
+            serializer = WorkbookCreateSerializer(
+                data={
+                    "number": session.number,
+                    "collection": session.collection_id,
+                    "chapters": session.chapters,
+                    "pdf": pdf,
+                },
+                context=self.get_serializer_context(),
+            )
+            serializer.is_valid(raise_exception=True)
+            workbook = serializer.save()
+
+        delete_session(session)
+        return workbook, serializer.data
+
+
+class SyncView(APIView):
+    """
+    Returns what changed in the catalog since the client's last sync.
+
+    Clients send back the token of their previous sync (?since=) and get the collections and workbooks
+    (chapters included) that were created, changed or released since, plus the ids of those that were
+    deleted or unreleased (the workbooks of an unreleased collection included), and a new token.
+    Without a token, or with a token we don't know, the whole catalog is returned with reset set.
+    """
+
+    permission_classes = [AllowAny]
+    serializer_class = None
+
+    def get(self, request):
+        params_serializer = SyncQueryParamsSerializer(data=request.query_params)
+        if not params_serializer.is_valid():
+            raise ValidationError(params_serializer.errors)
+
+        since = params_serializer.validated_data.get("since")
+
+        token = self.get_token()
+
+        collections = Collection.objects.all()
+        workbooks = Workbook.objects.prefetch_related("artifacts")
+
+        # Same visibility rules as the collection and workbook endpoints.
+        if not request.user.is_authenticated:
+            collections = collections.filter(is_released=True)
+            workbooks = workbooks.filter(collection__is_released=True)
+
+        reset = since is None or since > token
+
+        if not reset:
+            changes = self.get_changes(since)
+            collections = collections.filter(id__in=changes["collections"])
+            workbooks = workbooks.filter(id__in=changes["workbooks"])
+
+        collections = list(collections)
+        workbooks = list(workbooks)
+
+        removed_collection_ids = []
+        removed_workbook_ids = []
+        if not reset:
+            # Only what was deleted or unreleased, drafts changing out of sight aren't anyone's business.
+            removed_collection_ids = sorted(
+                changes["removed_collections"]
+                - {collection.id for collection in collections}
+            )
+            removed_workbook_ids = sorted(
+                changes["removed_workbooks"] - {workbook.id for workbook in workbooks}
+            )
+
+        context = {"request": request}
+
+        return Response(
+            {
+                "token": str(token),
+                "reset": reset,
+                "collections": CollectionListSerializer(
+                    collections, many=True, context=context
+                ).data,
+                "workbooks": WorkbookRetrieveSerializer(
+                    workbooks, many=True, context=context
+                ).data,
+                "removed": {
+                    "collections": removed_collection_ids,
+                    "workbooks": removed_workbook_ids,
+                },
+            }
+        )
+
+    def get_token(self):
+        """
+        Returns the id up to which every change is committed, the token clients resume from.
+
+        Ids are handed out when a change is logged, not when its transaction commits, so the latest id can be
+        visible while a lower one isn't yet. The token stops before the first missing id logged in the last
+        SYNC_TRANSACTION_WINDOW seconds, rolled back ids only hold it back that long.
+        """
+        settled_before = timezone.now() - timedelta(
+            seconds=settings.SYNC_TRANSACTION_WINDOW
+        )
+
+        token = CatalogChange.objects.filter(created_at__lt=settled_before).aggregate(
+            token=Max("id")
+        )["token"]
+        recent_ids = list(
+            CatalogChange.objects.filter(
+                created_at__gte=settled_before, id__gt=token or 0
+            ).values_list("id", flat=True)
+        )
+
+        if token is None:
+            # Nothing logged before the window, the log starts at its lowest id.
+            token = recent_ids[0] - 1 if recent_ids else 0
+
+        for change_id in recent_ids:
+            if change_id != token + 1:
+                break
+            token = change_id
+
+        return token
+
+    def get_changes(self, since):
+        """
+        Returns the ids of the collections and workbooks changed since the token, and among them those
+        that were deleted or unreleased ("removed_collections" and "removed_workbooks"). Only those can have
+        disappeared for a client that saw them before: visibility only changes with a delete or an unrelease.
+        """
+        # Changes past the token are included too, they are sent again with the next sync.
+        changes = CatalogChange.objects.filter(id__gt=since).values_list(
+            "kind", "action", "object_id"
+        )
+
+        collection_ids = set()
+        workbook_ids = set()
+        removed_collection_ids = set()
+        removed_workbook_ids = set()
+        release_changed_collection_ids = set()
+        unreleased_collection_ids = set()
+
+        for kind, action, object_id in changes:
+            if kind == CatalogChange.Kind.COLLECTION:
+                collection_ids.add(object_id)
+
+                if action in [
+                    CatalogChange.Action.RELEASED,
+                    CatalogChange.Action.UNRELEASED,
+                ]:
+                    release_changed_collection_ids.add(object_id)
+                if action in [
+                    CatalogChange.Action.UNRELEASED,
+                    CatalogChange.Action.DELETED,
+                ]:
+                    removed_collection_ids.add(object_id)
+                if action == CatalogChange.Action.UNRELEASED:
+                    unreleased_collection_ids.add(object_id)
+            else:
+                workbook_ids.add(object_id)
+
+                # Deleting a collection deletes (and logs) its workbooks.
+                if action == CatalogChange.Action.DELETED:
+                    removed_workbook_ids.add(object_id)
+
+        # Releasing (or unreleasing) a collection changes the visibility of all of its workbooks.
+        for workbook_id, collection_id in Workbook.objects.filter(
+            collection_id__in=release_changed_collection_ids
+        ).values_list("id", "collection_id"):
+            workbook_ids.add(workbook_id)
+            if collection_id in unreleased_collection_ids:
+                removed_workbook_ids.add(workbook_id)
+
+        return {
+            "collections": collection_ids,
+            "workbooks": workbook_ids,
+            "removed_collections": removed_collection_ids,
+            "removed_workbooks": removed_workbook_ids,
+        }
+
 
 # TODO:
 # Currently we use google app specific password to send emails which limits the number of emails we can send.
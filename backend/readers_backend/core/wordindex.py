@@ -0,0 +1,295 @@
+"""
+Precomputed word index of a workbook, built once at ingest and downloaded by the apps for offline search
+(instead of building PDFWordsIndex on device).
+
+Like the app, words are runs of letters and digits, lowercased, and words in the header and footer of a page are skipped.
+Every word keeps its position on the page so the apps can highlight matches.
+
+Format (little endian, version 1):
+
+    header        magic "KRWI", version u16, reserved u16, page count u32, term count u32,
+                  term offsets offset u32, postings offsets offset u32, page table offset u32
+    term offsets  (term count + 1) u32, offsets of the terms in the term blob
+    term blob     utf-8 terms, sorted, each term is stored once and referenced by its id (position) elsewhere
+    postings      (term count + 1) u32 offsets into the postings blob, then the blob:
+                  per term, varint page count then varint page deltas (pages are 0 based)
+    page table    per page: width f32, height f32 (points), words offset u32
+    words         per page: varint word count, then per word in reading order:
+                  varint term id, zigzag varint deltas of left and bottom to the previous word, varint width and height.
+                  Coordinates are tenths of a point, from the bottom left corner of the page.
+"""
+
+import re
+import struct
+
+import pypdfium2
+
+from core.artifacts import save_artifact
+from core.models import WorkbookArtifact
+from core.search import decode_varint, encode_varint
+from core.storage import open_stored
+
+MAGIC = b"KRWI"
+VERSION = 1
+
+HEADER = struct.Struct("<4sHHIIIII")
+OFFSET = struct.Struct("<I")
+PAGE_ENTRY = struct.Struct("<ffI")
+
+WORD_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+# Same as PDFBoundsConstants in the iOS app, share of the page height (from the bottom).
+HEADER_CUTOFF = 0.90
+FOOTER_CUTOFF = 0.10
+
+# Coordinates are stored as integers in tenths of a point.
+SCALE = 10
+
+
+def zigzag(value):
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def unzigzag(value):
+    return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+
+def extract_words(file):
+    """
+    Returns [(width, height, [(word, (left, bottom, right, top)), ...]), ...] per page.
+    file is a path, bytes or a file object.
+    """
+    document = pypdfium2.PdfDocument(file)
+    pages = []
+
+    try:
+        for page in document:
+            width, height = page.get_size()
+            text_page = page.get_textpage()
+            text = text_page.get_text_range()
+
+            words = []
+            for match in WORD_RE.finditer(text):
+                boxes = [
+                    text_page.get_charbox(index)
+                    for index in range(match.start(), match.end())
+                ]
+                box = (
+                    min(box[0] for box in boxes),
+                    min(box[1] for box in boxes),
+                    max(box[2] for box in boxes),
+                    max(box[3] for box in boxes),
+                )
+
+                middle = (box[1] + box[3]) / 2
+                if not FOOTER_CUTOFF * height < middle < HEADER_CUTOFF * height:
+                    continue
+
+                words.append((match.group().lower(), box))
+
+            pages.append((width, height, words))
+    finally:
+        document.close()
+
+    return pages
+
+
+def build_word_index(pages):
+    """
+    Builds the word index (bytes) from the output of extract_words.
+    """
+    terms = sorted(
+        {word for _, _, words in pages for word, _ in words},
+        key=lambda term: term.encode(),
+    )
+    term_ids = {term: term_id for term_id, term in enumerate(terms)}
+
+    term_blob = bytearray()
+    term_offsets = []
+    for term in terms:
+        term_offsets.append(len(term_blob))
+        term_blob += term.encode()
+    term_offsets.append(len(term_blob))
+
+    term_pages = [[] for _ in terms]
+    words_blob = bytearray()
+    words_offsets = []
+
+    for page, (_, _, words) in enumerate(pages):
+        words_offsets.append(len(words_blob))
+        encode_varint(len(words), words_blob)
+
+        previous_left, previous_bottom = 0, 0
+        for word, (left, bottom, right, top) in words:
+            term_id = term_ids[word]
+            if not term_pages[term_id] or term_pages[term_id][-1] != page:
+                term_pages[term_id].append(page)
+
+            left, bottom = round(left * SCALE), round(bottom * SCALE)
+            right, top = round(right * SCALE), round(top * SCALE)
+
+            encode_varint(term_id, words_blob)
+            encode_varint(zigzag(left - previous_left), words_blob)
+            encode_varint(zigzag(bottom - previous_bottom), words_blob)
+            encode_varint(max(right - left, 0), words_blob)
+            encode_varint(max(top - bottom, 0), words_blob)
+            previous_left, previous_bottom = left, bottom
+
+    postings_blob = bytearray()
+    postings_offsets = []
+    for page_numbers in term_pages:
+        postings_offsets.append(len(postings_blob))
+        encode_varint(len(page_numbers), postings_blob)
+        previous_page = 0
+        for page in page_numbers:
+            encode_varint(page - previous_page, postings_blob)
+            previous_page = page
+    postings_offsets.append(len(postings_blob))
+
+    term_offsets_offset = HEADER.size
+    term_blob_offset = term_offsets_offset + OFFSET.size * len(term_offsets)
+    postings_offsets_offset = term_blob_offset + len(term_blob)
+    postings_blob_offset = postings_offsets_offset + OFFSET.size * len(postings_offsets)
+    page_table_offset = postings_blob_offset + len(postings_blob)
+    words_blob_offset = page_table_offset + PAGE_ENTRY.size * len(pages)
+
+    output = bytearray(
+        HEADER.pack(
+            MAGIC,
+            VERSION,
+            0,
+            len(pages),
+            len(terms),
+            term_offsets_offset,
+            postings_offsets_offset,
+            page_table_offset,
+        )
+    )
+    for offset in term_offsets:
+        output += OFFSET.pack(offset)
+    output += term_blob
+    for offset in postings_offsets:
+        output += OFFSET.pack(offset)
+    output += postings_blob
+    for (width, height, _), offset in zip(pages, words_offsets):
+        output += PAGE_ENTRY.pack(width, height, words_blob_offset + offset)
+    output += words_blob
+
+    return bytes(output)
+
+
+def index_workbook_words(workbook):
+    """
+    Builds the word index of the workbook pdf and stores it as an artifact.
+    """
+    with open_stored(workbook.pdf) as file:
+        data = build_word_index(extract_words(file))
+
+    return save_artifact(workbook, WorkbookArtifact.Kind.WORD_INDEX, data, "words")
+
+
+class WordIndex:
+    """
+    Reader for the word index, mostly used by tests and as a reference for the apps.
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+        (
+            magic,
+            version,
+            _,
+            self.page_count,
+            self.term_count,
+            term_offsets_offset,
+            postings_offsets_offset,
+            page_table_offset,
+        ) = HEADER.unpack_from(data, 0)
+
+        if magic != MAGIC:
+            raise ValueError("Not a word index.")
+        if version != VERSION:
+            raise ValueError(f"Unsupported word index version {version}.")
+
+        term_offsets = self._offsets(term_offsets_offset, self.term_count + 1)
+        term_blob_offset = term_offsets_offset + OFFSET.size * (self.term_count + 1)
+        self.terms = [
+            bytes(data[term_blob_offset + start : term_blob_offset + end]).decode()
+            for start, end in zip(term_offsets, term_offsets[1:])
+        ]
+        self.term_ids = {term: term_id for term_id, term in enumerate(self.terms)}
+
+        self.postings_offsets = self._offsets(
+            postings_offsets_offset, self.term_count + 1
+        )
+        self.postings_blob_offset = postings_offsets_offset + OFFSET.size * (
+            self.term_count + 1
+        )
+
+        self.page_table = [
+            PAGE_ENTRY.unpack_from(data, page_table_offset + PAGE_ENTRY.size * page)
+            for page in range(self.page_count)
+        ]
+
+    def _offsets(self, start, count):
+        return [
+            OFFSET.unpack_from(self.data, start + OFFSET.size * index)[0]
+            for index in range(count)
+        ]
+
+    def pages(self, term):
+        """
+        Returns the (0 based) pages a lowercased word appears on.
+        """
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            return []
+
+        position = self.postings_blob_offset + self.postings_offsets[term_id]
+        count, position = decode_varint(self.data, position)
+
+        pages = []
+        page = 0
+        for _ in range(count):
+            delta, position = decode_varint(self.data, position)
+            page += delta
+            pages.append(page)
+
+        return pages
+
+    def page_size(self, page):
+        width, height, _ = self.page_table[page]
+        return width, height
+
+    def words(self, page):
+        """
+        Returns [(word, (left, bottom, right, top)), ...] of a page in reading order, in points.
+        """
+        position = self.page_table[page][2]
+        count, position = decode_varint(self.data, position)
+
+        words = []
+        left, bottom = 0, 0
+        for _ in range(count):
+            term_id, position = decode_varint(self.data, position)
+            left_delta, position = decode_varint(self.data, position)
+            bottom_delta, position = decode_varint(self.data, position)
+            width, position = decode_varint(self.data, position)
+            height, position = decode_varint(self.data, position)
+
+            left += unzigzag(left_delta)
+            bottom += unzigzag(bottom_delta)
+            words.append(
+                (
+                    self.terms[term_id],
+                    (
+                        left / SCALE,
+                        bottom / SCALE,
+                        (left + width) / SCALE,
+                        (bottom + height) / SCALE,
+                    ),
+                )
+            )
+
+        return words
@@ -1,10 +1,19 @@
 from datetime import datetime
+import gzip
 import uuid
 import json
 import logging
+from core import fastjson
+from django.core.cache import cache
 from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
 import traceback
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 
 request_logger = logging.getLogger("readers.requests")
 response_logger = logging.getLogger("readers.responses")
@@ -66,7 +75,7 @@ class LoggingMiddleware:
                 "Remote-Addr": request.headers.get("Remote-Addr"),
             }
 
-            request_logger.info("Request: " + json.dumps(request_message, indent=2))
+            request_logger.info("Request: " + fastjson.dumps(request_message, default=str).decode())
 
         except Exception as e:
             # Logging should never cause request to fail...
@@ -84,11 +93,11 @@ class LoggingMiddleware:
             if response.status_code >= 400 and hasattr(response, "content"):
 
                 try:
-                    response_message["content"] = json.loads(response.content)
+                    response_message["content"] = fastjson.loads(response.content)
                 except json.JSONDecodeError:
                     response_message["content"] = str(response.content)
 
-            response_logger.info("Response: " + json.dumps(response_message, indent=2))
+            response_logger.info("Response: " + fastjson.dumps(response_message, default=str).decode())
 
         except Exception as e:
             # Logging should never cause request to fail...
@@ -109,3 +118,117 @@ class LoggingMiddleware:
         # TODO: Some sort of notifcation to the dev team.
 
         return None
+
+
+class CompressionMiddleware:
+    """
+    Compresses API responses with brotli or gzip, whichever the client prefers (brotli only if installed).
+
+    Responses with an ETag are compressed once, at the highest level, and kept in the cache under their ETag.
+    The ETag changes with the representation, so the next request for the same representation
+    (a released collection, a workbook and its chapters, ...) is served without compressing again.
+    Other responses are compressed per request at a cheaper level.
+    """
+
+    MIN_SIZE = 200
+
+    COMPRESSIBLE_TYPES = (
+        "application/json",
+        "application/vnd.oai.openapi",
+        "application/javascript",
+        "text/",
+    )
+
+    CACHE_KEY_PREFIX = "compressed"
+    CACHE_TIMEOUT = 60 * 60 * 24
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        # Only reads, never compress secrets sent back to the client along with its own input (BREACH).
+        if request.method not in ("GET", "HEAD"):
+            return response
+
+        if (
+            response.streaming
+            or response.status_code != 200
+            or response.has_header("Content-Encoding")
+            or not response.get("Content-Type", "").startswith(self.COMPRESSIBLE_TYPES)
+        ):
+            return response
+
+        patch_vary_headers(response, ["Accept-Encoding"])
+
+        content = response.content
+        if len(content) < self.MIN_SIZE:
+            return response
+
+        encoding = self.negotiate(request.headers.get("Accept-Encoding", ""))
+        if encoding is None:
+            return response
+
+        etag = response.get("ETag")
+        if etag and not etag.startswith("W/"):
+            compressed = self.get_or_compress(etag, encoding, content)
+            # The compressed body is a different representation, same as django's GZipMiddleware.
+            response.headers["ETag"] = "W/" + etag
+        else:
+            compressed = self.compress(encoding, content, best=False)
+
+        response.content = compressed
+        response.headers["Content-Length"] = str(len(compressed))
+        response.headers["Content-Encoding"] = encoding
+
+        return response
+
+    def negotiate(self, accept_encoding):
+        """
+        Returns the encoding to use ("br" or "gzip") or None.
+        """
+        qualities = {}
+        for coding in accept_encoding.split(","):
+            name, _, parameters = coding.partition(";")
+            name = name.strip().lower()
+            if not name:
+                continue
+
+            quality = 1.0
+            parameters = parameters.strip()
+            if parameters.startswith("q="):
+                try:
+                    quality = float(parameters[2:])
+                except ValueError:
+                    quality = 0.0
+
+            qualities[name] = quality
+
+        available = ["br", "gzip"] if brotli is not None else ["gzip"]
+
+        best = None
+        for encoding in available:
+            quality = qualities.get(encoding, qualities.get("*", 0.0))
+            if quality > 0 and (best is None or quality > best[1]):
+                best = (encoding, quality)
+
+        return best[0] if best else None
+
+    def compress(self, encoding, content, best):
+        if encoding == "br":
+            return brotli.compress(content, quality=11 if best else 5)
+        return gzip.compress(content, compresslevel=9 if best else 6, mtime=0)
+
+    def get_or_compress(self, etag, encoding, content):
+        key = f"{self.CACHE_KEY_PREFIX}:{encoding}:{etag}"
+
+        cached = cache.get(key)
+        # The length guards against a view that (wrongly) reuses an ETag for another body.
+        if cached is not None and cached[0] == len(content):
+            return cached[1]
+
+        compressed = self.compress(encoding, content, best=True)
+        cache.set(key, (len(content), compressed), self.CACHE_TIMEOUT)
+
+        return compressed
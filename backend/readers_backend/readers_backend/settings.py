@@ -64,6 +64,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    # Above every middleware that reads the response body.
+    "readers_backend.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -100,6 +102,65 @@ STORAGES = {
     "staticfiles": {
         "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
     },
+    # Workbook pdfs, stored by content hash so identical pdfs are stored once (see core/storage.py).
+    "workbooks": {
+        "BACKEND": "core.storage.ContentAddressedFileSystemStorage",
+    },
+}
+
+# Workbook pdfs can instead live in an S3 compatible bucket (AWS, or MinIO in development, see docker-development).
+# Credentials come from the usual AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY environment variables.
+WORKBOOKS_S3_BUCKET = os.environ.get("WORKBOOKS_S3_BUCKET")
+
+if WORKBOOKS_S3_BUCKET:
+    STORAGES["workbooks"] = {
+        "BACKEND": "core.storage.ContentAddressedS3Storage",
+        "OPTIONS": {
+            "bucket_name": WORKBOOKS_S3_BUCKET,
+            "endpoint_url": os.environ.get("WORKBOOKS_S3_ENDPOINT_URL"),
+            "region_name": os.environ.get("WORKBOOKS_S3_REGION"),
+            # Downloads are redirects to presigned urls valid this many seconds.
+            "presigned_url_expiry": int(
+                os.environ.get("WORKBOOKS_S3_URL_EXPIRY", "300")
+            ),
+        },
+    }
+
+# Size cap in bytes of the local disk copies of workbook pdfs read from S3 (see CachedStorage in core/storage.py),
+# so pipeline stages and bundles don't download a pdf again for every read. 0 disables the cache.
+STORAGE_CACHE_MAX_SIZE = int(
+    os.environ.get("STORAGE_CACHE_MAX_SIZE", str(10 * 1024 * 1024 * 1024))
+)
+
+if WORKBOOKS_S3_BUCKET and STORAGE_CACHE_MAX_SIZE:
+    STORAGES["workbooks"] = {
+        "BACKEND": "core.storage.CachedStorage",
+        "OPTIONS": {
+            "backend": STORAGES["workbooks"]["BACKEND"],
+            "options": STORAGES["workbooks"]["OPTIONS"],
+            "max_size": STORAGE_CACHE_MAX_SIZE,
+        },
+    }
+
+# Processes computing derived data of uploaded workbooks (see core/pipeline.py).
+# 0 processes workbooks in the web process as soon as they are committed (tests, debugging).
+PIPELINE_WORKERS = int(os.environ.get("PIPELINE_WORKERS", "2"))
+
+# Jobs are lost when the web process restarts. Workbooks pending or processing for longer than this many seconds
+# are processed again by manage.py process_workbooks --stale, meant to be run from cron (e.g. every 15 minutes).
+PIPELINE_STALE_AFTER = int(os.environ.get("PIPELINE_STALE_AFTER", "3600"))
+
+# Runs tests with PIPELINE_WORKERS = 0, worker processes wouldn't see the test database.
+TEST_RUNNER = "core.tests.runner.TestRunner"
+
+# Cache backend.
+# Holds pre-serialized catalog payloads, see core/cache.py.
+# Local memory is per process, which is fine with our single gunicorn worker.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "readers",
+    }
 }
 
 # Media files storage directory.
@@ -110,6 +171,34 @@ MEDIA_ROOT = os.path.join(BASE_DIR, "files")
 if not DEBUG:
     MEDIA_ROOT = get_required_env_var("MEDIA_ROOT")
 
+# Downloads can be sent by the front proxy once Django checked access (see core/downloads.py and nginx/readers.conf),
+# so file bytes don't tie up gunicorn threads: "x-accel-redirect" (nginx) or "x-sendfile" (Apache, lighttpd).
+DOWNLOAD_OFFLOAD = os.environ.get("DOWNLOAD_OFFLOAD") or None
+
+if DOWNLOAD_OFFLOAD not in (None, "x-accel-redirect", "x-sendfile"):
+    raise EnvironmentError(
+        f"DOWNLOAD_OFFLOAD must be x-accel-redirect or x-sendfile, not {DOWNLOAD_OFFLOAD}"
+    )
+
+# With x-accel-redirect, the internal nginx location serving MEDIA_ROOT.
+DOWNLOAD_OFFLOAD_LOCATION = os.environ.get("DOWNLOAD_OFFLOAD_LOCATION", "/protected/")
+
+# Without a front proxy, the most downloaded files stay memory mapped in each process up to this many bytes
+# (see core/hotcache.py). 0 turns it off.
+HOT_FILE_CACHE_MAX_SIZE = int(os.environ.get("HOT_FILE_CACHE_MAX_SIZE", "0"))
+
+# Local disk caches of files built on request (see core/filecache.py), MEDIA_ROOT/cache unless set.
+FILE_CACHE_DIR = os.environ.get("FILE_CACHE_DIR")
+
+# Size cap in bytes of the cache of chapter and page range pdfs (see core/extracts.py).
+EXTRACTS_CACHE_MAX_SIZE = int(
+    os.environ.get("EXTRACTS_CACHE_MAX_SIZE", str(1024 * 1024 * 1024))
+)
+
+# Seconds a transaction logging catalog changes may stay open. Sync tokens are held back before ids missing for
+# less than this, which may still be committed (see SyncView in core/views.py).
+SYNC_TRANSACTION_WINDOW = int(os.environ.get("SYNC_TRANSACTION_WINDOW", "300"))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -153,7 +242,13 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # DJANGO REST FRAMEWORK
 REST_FRAMEWORK = {
-    "DEFAULT_RENDERER_CLASSES": ("rest_framework.renderers.JSONRenderer",),
+    # orjson when installed, see core/fastjson.py.
+    "DEFAULT_RENDERER_CLASSES": ("core.renderers.JSONRenderer",),
+    "DEFAULT_PARSER_CLASSES": (
+        "core.renderers.JSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework.authentication.TokenAuthentication",
     ),
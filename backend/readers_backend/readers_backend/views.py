@@ -1,5 +1,6 @@
 from django.views.generic import TemplateView
 from core.models import Collection
+from core.serializers import workbook_images
 
 
 class IndexView(TemplateView):
@@ -14,7 +15,7 @@ class IndexView(TemplateView):
         try:
             latest = (
                 Collection.objects.filter(is_released=True, localization="en_US")
-                .prefetch_related("workbooks")
+                .prefetch_related("workbooks__artifacts")
                 .latest()
             )
         except Collection.DoesNotExist:
@@ -22,6 +23,24 @@ class IndexView(TemplateView):
                 "latest_us_collection": None,
             }
 
+        # Rendered covers (see core/thumbnails.py), the static ones are used until they exist.
+        workbooks = []
+        for workbook in latest.workbooks.all():
+            images = workbook_images(workbook, self.request)
+            covers = images["covers"] if images else []
+
+            cover = None
+            if covers:
+                cover = {
+                    "src": covers[len(covers) // 2]["url"],
+                    "srcset": ", ".join(
+                        f"{cover['url']} {cover['width']}w" for cover in covers
+                    ),
+                }
+
+            workbooks.append((workbook, cover))
+
         return {
             "latest_us_collection": latest,
+            "workbooks": workbooks,
         }
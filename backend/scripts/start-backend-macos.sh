@@ -28,8 +28,8 @@ if [ ! -d "venv" ]; then
 fi
 source venv/bin/activate
 
-# 3.) Install requirements.txt in the virtual environment.
-pip install -r requirements.txt
+# 3.) Install requirements-dev.txt (requirements.txt and test dependencies) in the virtual environment.
+pip install -r requirements-dev.txt
 
 
 # Start the postgres DB for developemtn